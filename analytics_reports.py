@@ -0,0 +1,388 @@
+#Report tables behind the analytics charts, and their exports.
+#Each chart on the analytics page is drawn from one of the report functions below, and
+#the export dropdowns download the same report straight from the server:
+#
+#    GET /exports/<report>.<format>?bin_id=12&month=2025-05&week=2025-05-06
+#
+#The browser only sends the chart's filters (ui.start_export in assets/clientside.js), so the
+#chart callbacks don't have to ship their data to the browser just in case it is exported.
+#CSV is streamed in chunks, Excel is written row by row with xlsxwriter's constant memory
+#mode, Parquet needs pyarrow and PDF needs reportlab.
+#At most MAX_EXPORT_JOBS exports are built at once on the machine (see background_jobs.py).
+#All the reports of a bin and month are worked out from one bundle of its rollups (see
+#analytics_bundle and rollups.py), fetched once and shared by the charts and the exports.
+import io
+import json
+import os
+import re
+import tempfile
+from datetime import datetime, timedelta
+from collections import namedtuple
+from contextlib import ExitStack
+
+import pandas as pd
+from dash import clientside_callback, Input, Output, State
+from flask import Response, request, stream_with_context
+
+from rollups import read_period
+from background_jobs import job_slot, shared_result, JobSlotsBusy, MAX_EXPORT_JOBS
+from live_updates import current_version
+
+#Rows per chunk when streaming a CSV
+CSV_CHUNK_ROWS = 5000
+#Bytes per chunk when streaming a finished file
+FILE_CHUNK_BYTES = 64 * 1024
+#Most rows printed in a PDF report, the rest are left to the other formats
+PDF_MAX_ROWS = 1000
+
+EXPORT_FORMATS = {
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "Excel"),
+    "csv": ("text/csv", "CSV"),
+    "parquet": ("application/vnd.apache.parquet", "Parquet"),
+    "pdf": ("application/pdf", "PDF"),
+}
+
+#Options for the export dropdowns
+EXPORT_OPTIONS = [{"label": f"Export to {label}", "value": fmt} for fmt, (_, label) in EXPORT_FORMATS.items()]
+
+
+###################################################################
+# Report tables of a period
+# Derived from the rollup tables of a period (rollups.read_period), for
+# one or more bins, each with a bin_id column. Used by the analytics
+# bundle below and by the fleet report (fleet_reports.py)
+###################################################################
+DAY_ORDER = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+#Daily avg, min and max fill level
+def daily_fill_levels(daily):
+    return (
+        daily.assign(avg=daily['fill_sum'] / daily['readings'])
+        .rename(columns={'day': 'date', 'fill_min': 'min', 'fill_max': 'max'})
+        [['bin_id', 'date', 'avg', 'min', 'max']]
+    )
+
+#Number of collections in each week, by the Monday the week starts on
+def weekly_collections(hourly):
+    df = hourly[hourly['collections'] > 0]
+    week_start = df['hour_start'].dt.normalize() - pd.to_timedelta(df['hour_start'].dt.weekday, unit='d')
+    return df.assign(week_start=week_start).groupby(['bin_id', 'week_start'])['collections'].sum().reset_index()
+
+#Number of collections in each hour of the day, all 24 hours for every bin with collections
+def hourly_collections(hourly):
+    df = hourly[hourly['collections'] > 0]
+    counts = df.groupby(['bin_id', df['hour_start'].dt.hour.rename('hour')])['collections'].sum()
+    if counts.empty:
+        return pd.DataFrame(columns=['bin_id', 'hour', 'collections'])
+    all_hours = pd.MultiIndex.from_product([counts.index.levels[0], range(24)], names=['bin_id', 'hour'])
+    return counts.reindex(all_hours, fill_value=0).reset_index(name='collections')
+
+#Average fill increase by day of week and hour
+def hourly_fill_activity(hourly):
+    df = hourly[hourly['increase_count'] > 0]
+    df = df.assign(
+        day_of_week=pd.Categorical(df['hour_start'].dt.day_name(), categories=DAY_ORDER, ordered=True),
+        hour=df['hour_start'].dt.hour,
+    )
+    sums = df.groupby(['bin_id', 'day_of_week', 'hour'], observed=True)[['increase_sum', 'increase_count']].sum()
+    return (
+        (sums['increase_sum'] / sums['increase_count']).round(1) #average of the single increases, like AVG() over the readings
+        .reset_index(name='avg_fill_change')
+        .sort_values(['bin_id', 'day_of_week', 'hour'])
+    )
+
+
+###################################################################
+# Analytics bundle
+# Everything the analytics charts show for one bin and month: its hourly
+# and daily rollups and its fill cycles (see rollups.py). Bundles are
+# shared through the jobs cache for the current bin_data version, so the
+# five chart jobs and the exports of a bin and month only fetch it once
+###################################################################
+#How long (seconds) an unused bundle is kept
+BUNDLE_EXPIRE_SECONDS = 600
+
+#First moment of a month (YYYY-MM) and of the month after it
+def month_period(month):
+    start = datetime.strptime(month, "%Y-%m")
+    return start, (start + timedelta(days=32)).replace(day=1)
+
+#{"hourly": ..., "daily": ..., "cycles": ...} of a bin in a month
+def build_bundle(bin_id, month):
+    return read_period([bin_id], *month_period(month))
+
+#Bundle of a bin and month, None when no bin is selected or it has no readings that month
+def analytics_bundle(bin_id, month):
+    if bin_id in (None, "") or not month:
+        return None
+    bin_id = int(bin_id)
+
+    #Read the version before the data, so a bundle is never older than the version it's kept as
+    version = current_version("bin_data")
+    if version is None:
+        bundle = build_bundle(bin_id, month)
+    else:
+        bundle = shared_result(("analytics-bundle", bin_id, month, version), lambda: build_bundle(bin_id, month), BUNDLE_EXPIRE_SECONDS)
+    return bundle if not bundle["daily"].empty else None
+
+#Only the rows of df whose column falls in the week starting week_start (e.g. '2025-05-06')
+def _in_week(df, column, week_start):
+    week_start = pd.to_datetime(week_start)
+    return df[(df[column] >= week_start) & (df[column] < week_start + timedelta(days=7))]
+
+
+###################################################################
+# Reports
+# Each returns None when the bin has no readings in the selected month,
+# and an empty DataFrame when there's nothing to show for it (or the week)
+###################################################################
+
+#Daily avg, min and max fill level of a bin in a month (or one week of it)
+def weekly_fill_stats(bin_id, month, week_start=None):
+    bundle = analytics_bundle(bin_id, month)
+    if bundle is None:
+        return None
+
+    df = daily_fill_levels(bundle["daily"]).drop(columns=['bin_id'])
+    if week_start:
+        df = _in_week(df, 'date', week_start)
+    return df.sort_values("date")
+
+#Daily average time (minutes) a bin took to reach 80% full in a month (or one week of it)
+def time_to_80_stats(bin_id, month, week_start=None):
+    bundle = analytics_bundle(bin_id, month)
+    if bundle is None:
+        return None
+
+    #Group the cycles by the day the bin got full
+    df = bundle["cycles"].assign(date=bundle["cycles"]['full_at'].dt.normalize())
+    if week_start:
+        df = _in_week(df, 'date', week_start)
+
+    #Find the avg times for bins to get full each day
+    return (
+        df.groupby("date")['time_to_fill'] #Group values by each date
+        .mean() #Find the avg in each group of time to 80% values per date
+        .reset_index() #groupby() makes the 'date' column the index, reset it to normal for plotting the graph
+        .sort_values("date") #Sort date ascending
+    )
+
+#Number of collections of a bin in each week of a month
+def collections_per_week(bin_id, month, week_start=None):
+    bundle = analytics_bundle(bin_id, month)
+    if bundle is None:
+        return None
+    return weekly_collections(bundle["hourly"]).drop(columns=['bin_id']).sort_values("week_start")
+
+#Number of collections of a bin in each hour of the day (0-23) in a month
+#All 24 hours are listed when there were any collections, so the chart shows every hour
+def collections_per_hour(bin_id, month, week_start=None):
+    bundle = analytics_bundle(bin_id, month)
+    if bundle is None:
+        return None
+    return hourly_collections(bundle["hourly"]).drop(columns=['bin_id'])
+
+#Average hourly fill increase of a bin by day of week and hour in a month
+def fill_activity_heatmap(bin_id, month, week_start=None):
+    bundle = analytics_bundle(bin_id, month)
+    if bundle is None:
+        return None
+    return hourly_fill_activity(bundle["hourly"]).drop(columns=['bin_id'])
+
+
+Report = namedtuple("Report", ["build", "title", "filename"])
+
+#Report name (used in the export URL) -> Report
+REPORTS = {
+    "weekly-fill-levels": Report(weekly_fill_stats, "Daily Avg Fill Level", "fill_level_report"),
+    "time-to-80": Report(time_to_80_stats, "Avg Time to Reach 80% Full", "time_to_80_report"),
+    "collections": Report(collections_per_week, "Weekly Collections", "collections_report"),
+    "collection-times": Report(collections_per_hour, "Collection Times of Day", "time_bins_emptied_report"),
+    "fill-activity": Report(fill_activity_heatmap, "Hourly Fill Activity", "fill_activity_report"),
+}
+
+
+###################################################################
+# Writers
+# Each yields the file in chunks, for a streamed response
+###################################################################
+def _stream_file(path):
+    try:
+        with open(path, "rb") as file:
+            while True:
+                chunk = file.read(FILE_CHUNK_BYTES)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
+
+def _temp_path(suffix):
+    handle, path = tempfile.mkstemp(suffix=suffix)
+    os.close(handle)
+    return path
+
+def write_csv(df, title):
+    yield df.head(0).to_csv(index=False)
+    for start in range(0, len(df), CSV_CHUNK_ROWS):
+        yield df.iloc[start:start + CSV_CHUNK_ROWS].to_csv(index=False, header=False)
+
+#Excel written row by row in constant memory mode, so only the current row is held in memory
+def write_xlsx(df, title):
+    import xlsxwriter
+
+    path = _temp_path(".xlsx")
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True, "default_date_format": "dd/mm/yyyy hh:mm"})
+    try:
+        sheet = workbook.add_worksheet(title[:31]) #Excel sheet names are at most 31 characters
+        sheet.write_row(0, 0, [str(column) for column in df.columns])
+        for row, values in enumerate(df.itertuples(index=False, name=None), start=1):
+            sheet.write_row(row, 0, [excel_value(value) for value in values])
+    finally:
+        workbook.close()
+    return _stream_file(path)
+
+#Blank for missing values, plain Python numbers instead of numpy ones
+def excel_value(value):
+    if pd.isna(value):
+        return None
+    return value.item() if hasattr(value, "item") else value
+
+def write_parquet(df, title):
+    path = _temp_path(".parquet")
+    #Parquet needs string column names
+    df.rename(columns=str).to_parquet(path, index=False)
+    return _stream_file(path)
+
+#PDF report: title, filters, summary of the numeric columns and the data table
+def write_pdf(df, title, filters):
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+
+    styles = getSampleStyleSheet()
+    story = [
+        Paragraph(title, styles["Title"]),
+        Paragraph(" | ".join(f"{name}: {value}" for name, value in filters.items() if value), styles["Normal"]),
+        Paragraph(f"Generated {datetime.now().strftime('%d/%m/%Y %H:%M')}", styles["Normal"]),
+        Spacer(1, 12),
+    ]
+
+    numeric = df.select_dtypes("number")
+    if not numeric.empty:
+        summary = numeric.agg(["min", "mean", "max"]).round(2)
+        rows = [[""] + [str(column) for column in summary.columns]]
+        rows += [[stat] + [str(value) for value in summary.loc[stat]] for stat in summary.index]
+        story += [Paragraph("Summary", styles["Heading2"]), pdf_table(rows, Table, TableStyle, colors), Spacer(1, 12)]
+
+    shown = df.head(PDF_MAX_ROWS)
+    rows = [[str(column) for column in df.columns]]
+    rows += [["" if pd.isna(value) else pdf_value(value) for value in values] for values in shown.itertuples(index=False, name=None)]
+    story += [Paragraph("Data", styles["Heading2"]), pdf_table(rows, Table, TableStyle, colors)]
+    if len(df) > PDF_MAX_ROWS:
+        story.append(Paragraph(f"First {PDF_MAX_ROWS} of {len(df)} rows, export to CSV or Excel for all rows.", styles["Italic"]))
+
+    buffer = io.BytesIO()
+    SimpleDocTemplate(buffer, pagesize=A4, title=title).build(story)
+    return iter([buffer.getvalue()])
+
+def pdf_value(value):
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    if hasattr(value, "strftime"):
+        return value.strftime("%d/%m/%Y %H:%M") if getattr(value, "hour", 0) or getattr(value, "minute", 0) else value.strftime("%d/%m/%Y")
+    return str(value)
+
+def pdf_table(rows, Table, TableStyle, colors):
+    table = Table(rows, repeatRows=1)
+    table.setStyle(TableStyle([
+        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#542978")), #purple header
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+        ("FONTSIZE", (0, 0), (-1, -1), 8),
+        ("GRID", (0, 0), (-1, -1), 0.25, colors.HexColor("#CCCCCC")),
+        ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, colors.HexColor("#F9F7FA")]),
+    ]))
+    return table
+
+
+###################################################################
+# Export route
+###################################################################
+def _export_error(message, status=400):
+    return Response(message, status=status, mimetype="text/plain")
+
+#Add the /exports route to the Flask server
+def register_exports(server):
+    @server.route("/exports/<report>.<fmt>")
+    def export_report(report, fmt):
+        if report not in REPORTS or fmt not in EXPORT_FORMATS:
+            return _export_error("Unknown report or format", 404)
+
+        bin_id = request.args.get("bin_id", type=int)
+        month = request.args.get("month", "")
+        week = request.args.get("week") or None
+        if bin_id is None or not re.fullmatch(r"\d{4}-\d{2}", month):
+            return _export_error("bin_id and month (YYYY-MM) are required")
+        if week and not re.fullmatch(r"\d{4}-\d{2}-\d{2}", week):
+            return _export_error("week must be a date (YYYY-MM-DD)")
+
+        spec = REPORTS[report]
+        title = f"{spec.title} for Bin #{bin_id}"
+        #Exports have their own slots and are turned away when they're all taken,
+        #so they can't pile up in the workers or hold up the charts' background jobs.
+        #The slot is held until the response is closed: CSVs are written while they stream
+        slot = ExitStack()
+        try:
+            slot.enter_context(job_slot("exports", MAX_EXPORT_JOBS, wait=False))
+            df = spec.build(bin_id, month, week)
+            if df is None:
+                df = pd.DataFrame()
+
+            if fmt == "csv":
+                chunks = write_csv(df, title)
+            elif fmt == "xlsx":
+                chunks = write_xlsx(df, title)
+            elif fmt == "parquet":
+                chunks = write_parquet(df, title)
+            else:
+                chunks = write_pdf(df, title, {"Bin": f"#{bin_id}", "Month": month, "Week starting": week})
+        except JobSlotsBusy:
+            response = _export_error("Too many exports are being prepared, please try again in a moment", 503)
+            response.headers["Retry-After"] = "10"
+            return response
+        except ImportError as error:
+            slot.close()
+            return _export_error(f"{EXPORT_FORMATS[fmt][1]} exports are not available on this server ({error.name} is not installed)", 501)
+        except BaseException:
+            slot.close()
+            raise
+
+        filename = f"{spec.filename}_{bin_id}_{week or month}.{fmt}"
+        response = Response(
+            stream_with_context(chunks),
+            mimetype=EXPORT_FORMATS[fmt][0],
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
+        response.call_on_close(slot.close)
+        return response
+    return export_report
+
+
+###################################################################
+# Export dropdowns
+###################################################################
+
+#Download report when a format is picked in dropdown_id, with the filters from the chart's dropdowns
+#filter_ids: {"bin_id": ..., "month": ..., "week": ...} dropdown IDs (week is optional)
+def register_export_dropdown(dropdown_id, report, filter_ids):
+    names = list(filter_ids)
+    clientside_callback(
+        f"""function(fmt, ...values) {{
+            return window.dash_clientside.ui.start_export({json.dumps(report)}, fmt, {json.dumps(names)}, values);
+        }}""",
+        Output(dropdown_id, "value"), #Cleared after the download starts, so the same format can be picked again
+        Input(dropdown_id, "value"),
+        *[State(filter_ids[name], "value") for name in names],
+        prevent_initial_call=True,
+    )
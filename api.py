@@ -0,0 +1,221 @@
+#Read-only JSON API (/api/v1) for other systems, e.g. the driver tablet app and BI tools,
+#so they don't have to scrape the Dash callbacks.
+#
+#    GET /api/v1/fleet                          latest state of every bin
+#    GET /api/v1/bins/<bin_id>/history          fill readings, ?start=&end= (ISO dates)
+#    GET /api/v1/bins/<bin_id>/collections      recent collections of a bin
+#    GET /api/v1/alerts                         alerts, ?status=Active
+#    GET /api/v1/alerts/summary                 number of alerts by status and type
+#
+#Every list takes ?fields=a,b (only those columns) and ?page=&per_page= (default 100, max 1000).
+#Responses are read from the same shared caches as the dashboard and carry an ETag built
+#from the dataset versions. Send it back in If-None-Match to get an empty 304 until the
+#data changes, which costs a version lookup and no query. Bodies are gzipped when the
+#client accepts it.
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+from flask import Blueprint, Response, request
+
+from data_utils import get_bin_data, get_complete_bin_table, get_collection_history, get_alerts_data, get_bin_fill_history_range
+from live_updates import current_version
+
+api = Blueprint("api", __name__, url_prefix="/api/v1")
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+#Most readings one history request returns
+MAX_HISTORY_ROWS = 20000
+#Smaller bodies aren't worth compressing
+GZIP_MIN_BYTES = 1024
+#How many built tables (one per resource, arguments and version) each process keeps
+MAX_CACHED_TABLES = 64
+
+_tables_lock = threading.Lock()
+_tables = OrderedDict() #(resource, args, version) -> DataFrame, least recently used first
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+@api.errorhandler(ApiError)
+def api_error(error):
+    return Response(json.dumps({"error": error.message}), status=error.status, mimetype="application/json")
+
+
+###################################################################
+# Helpers
+###################################################################
+
+#Version of the data behind a response, None if the shared cache can't tell
+#Read before the data, so a response is never tagged with a newer version than it holds
+def data_version(*datasets):
+    versions = [current_version(name) for name in datasets]
+    if any(version is None for version in versions):
+        return None
+    return ".".join(str(version) for version in versions)
+
+#Weak ETag for this URL (path and query string) at version
+#Weak, so the gzipped and plain bodies share it
+def make_etag(version):
+    query = "&".join(f"{key}={value}" for key, value in sorted(request.args.items(multi=True)))
+    return hashlib.blake2b(f"{request.path}?{query}@{version}".encode(), digest_size=12).hexdigest()
+
+#Built table for (resource, args, version), only calls build() when it isn't cached
+#Without a version nothing is cached, the table is always rebuilt
+def cached_table(resource, args, version, build):
+    if version is None:
+        return build()
+
+    key = (resource, args, version)
+    with _tables_lock:
+        if key in _tables:
+            _tables.move_to_end(key)
+            return _tables[key]
+
+    table = build()
+    with _tables_lock:
+        _tables[key] = table
+        _tables.move_to_end(key)
+        while len(_tables) > MAX_CACHED_TABLES:
+            _tables.popitem(last=False)
+    return table
+
+def int_arg(name, default, minimum, maximum=None):
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ApiError(400, f"{name} must be a whole number")
+    if value < minimum or (maximum is not None and value > maximum):
+        limit = f"between {minimum} and {maximum}" if maximum is not None else f"at least {minimum}"
+        raise ApiError(400, f"{name} must be {limit}")
+    return value
+
+def datetime_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return pd.Timestamp(value).to_pydatetime()
+    except ValueError:
+        raise ApiError(400, f"{name} must be an ISO date or datetime, e.g. 2024-05-01T08:00")
+
+#Only the columns listed in ?fields=
+def project(df):
+    fields = request.args.get("fields")
+    if not fields:
+        return df
+    columns = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [column for column in columns if column not in df.columns]
+    if unknown:
+        raise ApiError(400, f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(df.columns)}")
+    return df[columns]
+
+#JSON response, compressed if the client accepts gzip, conditional on etag
+def json_response(body, etag):
+    body = body.encode()
+    response = Response(mimetype="application/json")
+    response.headers["Cache-Control"] = "no-cache" #always revalidate, the ETag makes that cheap
+    response.headers["Vary"] = "Accept-Encoding"
+    if len(body) >= GZIP_MIN_BYTES and "gzip" in request.accept_encodings:
+        body = gzip.compress(body, compresslevel=6)
+        response.headers["Content-Encoding"] = "gzip"
+    response.set_data(body)
+    response.set_etag(etag, weak=True)
+    return response.make_conditional(request)
+
+#304 Not Modified for a client that already has this version
+def not_modified(etag):
+    response = Response(status=304)
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["Vary"] = "Accept-Encoding"
+    response.set_etag(etag, weak=True)
+    return response
+
+#Paginated list response of build()'s table: {"version", "total", "page", "per_page", "data": [...]}
+#datasets: shared datasets the table is built from, their versions make the ETag
+def list_response(resource, args, datasets, build):
+    version = data_version(*datasets)
+    if version is not None:
+        etag = make_etag(version)
+        if request.if_none_match.contains_weak(etag):
+            return not_modified(etag)
+
+    page = int_arg("page", 1, 1)
+    per_page = int_arg("per_page", DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE)
+    table = project(cached_table(resource, args, version, build))
+    rows = table.iloc[(page - 1) * per_page:page * per_page]
+
+    records = rows.to_json(orient="records", date_format="iso")
+    body = (
+        f'{{"version":{json.dumps(version)},"total":{len(table)},"page":{page},'
+        f'"per_page":{per_page},"data":{records}}}'
+    )
+    if version is None:
+        #Unknown version, tag the body itself so repeat requests can still get a 304
+        etag = hashlib.blake2b(body.encode(), digest_size=12).hexdigest()
+    return json_response(body, etag)
+
+
+###################################################################
+# Endpoints
+###################################################################
+
+#Latest state of every bin: fill level, location, coordinates, type, status and last collection
+@api.route("/fleet")
+def fleet():
+    def build():
+        positions = get_bin_data()[['bin_id', 'latitude', 'longitude', 'timestamp']]
+        table = get_complete_bin_table().drop(columns=['fill_level_display'])
+        return table.merge(positions, on='bin_id', how='left').rename(columns={'timestamp': 'last_reading'})
+    return list_response("fleet", (), ["complete_bin_table", "bin_data"], build)
+
+#Fill readings of one bin, newest first. Readings only arrive with new sensor data,
+#so the bin_data version (latest reading of every bin) tells whether they changed
+@api.route("/bins/<int:bin_id>/history")
+def bin_history(bin_id):
+    start, end = datetime_arg("start"), datetime_arg("end")
+    if start and end and start >= end:
+        raise ApiError(400, "start must be before end")
+
+    def build():
+        return get_bin_fill_history_range(bin_id, start, end, limit=MAX_HISTORY_ROWS)
+    return list_response("history", (bin_id, start, end), ["bin_data"], build)
+
+#Recent collections of one bin (emptied after reaching 80%), newest first
+@api.route("/bins/<int:bin_id>/collections")
+def bin_collections(bin_id):
+    def build():
+        return get_collection_history(bin_id)[['bin_id', 'collection_timestamp', 'fill_level', 'time_since_full']]
+    return list_response("collections", (bin_id,), ["bin_data"], build)
+
+#Alerts, newest first, optionally only one status (e.g. ?status=Active)
+@api.route("/alerts")
+def alerts():
+    status = request.args.get("status")
+
+    def build():
+        df = get_alerts_data().drop(columns=['triggered_time_string', 'resolved_time_string'])
+        if status:
+            df = df[df['status'].str.lower() == status.lower()]
+        return df.reset_index(drop=True)
+    return list_response("alerts", (status,), ["alerts_data"], build)
+
+#Number of alerts by status and alert type
+@api.route("/alerts/summary")
+def alerts_summary():
+    def build():
+        df = get_alerts_data()
+        counts = df.groupby(['status', 'alert_type']).size().reset_index(name='count')
+        return counts.sort_values(['status', 'alert_type']).reset_index(drop=True)
+    return list_response("alerts_summary", (), ["alerts_data"], build)
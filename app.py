@@ -1,38 +1,65 @@
 from dash import Dash, html, dcc, page_container, page_registry
 import dash_bootstrap_components as dbc
-import callbacks
-from layouts import sidebar, floating_bins_menu, CONTENT_STYLE
-
-#Dash constructor: initialises the app
-app = Dash(
-    __name__, #Tells Dash this is the main script
-    use_pages=True, #Enables multi-page support
-    suppress_callback_exceptions=True, #Suppresses errors in callback components when not found as they'll show up later ater loading
-    external_stylesheets=[
-        dbc.themes.FLATLY, 
-        "https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.3/font/bootstrap-icons.min.css",
-    ]
-)
+from data_utils import no_database_access
+from refresher import start_refresher, REFRESHER_IN_WORKERS
+from live_updates import register_live_updates, version_stores
+from reference_data import register_reference_data
+from api import api
+from analytics_reports import register_exports
+from serialization import register_serializer
+
+#Importing the callbacks and pages must not touch the database, so workers boot without waiting on MySQL
+with no_database_access("importing the app modules"):
+    import callbacks
+    from layouts import sidebar, floating_bins_menu, CONTENT_STYLE, LAYOUT_STYLES
+
+    #Dash constructor: initialises the app (and imports the pages folder)
+    app = Dash(
+        __name__, #Tells Dash this is the main script
+        use_pages=True, #Enables multi-page support
+        suppress_callback_exceptions=True, #Suppresses errors in callback components when not found as they'll show up later ater loading
+        external_stylesheets=[
+            dbc.themes.FLATLY, 
+            "https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.3/font/bootstrap-icons.min.css",
+        ]
+    )
 app.title = "Smart Bin Dashboard"
 
 #Run server on Render
 server = app.server
 
+#Keep the shared dashboard datasets fresh in the background (see refresher.py)
+#Started on the first request rather than here so each forked gunicorn worker gets its own thread
+if REFRESHER_IN_WORKERS:
+    @server.before_request
+    def ensure_refresher_running():
+        start_refresher() #returns nothing, a before_request return value would replace the response
+
+#Encode callback responses and figures with orjson (see serialization.py)
+register_serializer(server)
+
+#Server push of dataset versions to the browser (/events), replaces per-widget polling intervals
+register_live_updates(server)
+#Fleet reference data for the browser's localStorage cache (/reference/fleet)
+register_reference_data(server)
+#Read-only JSON API for other systems (/api/v1, see api.py)
+server.register_blueprint(api)
+#Analytics report downloads (/exports, see analytics_reports.py)
+register_exports(server)
+
 #App layout
 def serve_layout():
     return html.Div([
         dcc.Store(id="sidebar-state", data={"collapsed": False}, storage_type="session"), #Keeps track of if the sidebar is collapsed
         dcc.Store(id="bins-submenu-state", data={"open": False}), #Keeps track of if the bins submenu is open
+        dcc.Store(id="layout-styles-store", data=LAYOUT_STYLES), #Sidebar/content styles for the clientside sidebar callback
         dcc.Location(id="url", refresh=False), #Keeps track of the current URL     
         sidebar, #Sidebar component
         floating_bins_menu, #Floating bins submenu component
         
-        #Auto update the alerts data store every 15 min
-        dcc.Interval(
-            id="alerts-data-update-interval",
-            interval=900000,  #15 minutes in milliseconds
-            n_intervals=0 #updates on every page refresh, resets n_intervals back to 0
-        ),
+        #Latest version of each live dataset, pushed by the server (see live_updates.py)
+        *version_stores(),
+        dcc.Store(id="live-updates-connection"), #Output of the clientside callback that opens the push stream
         #Store for the get_alerts_data() results shared with alerts.py
         dcc.Store(id="alerts-data-store", storage_type="session"),
         
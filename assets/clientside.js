@@ -0,0 +1,619 @@
+//Clientside callbacks for pure UI state (sidebar, submenu, legends, comment box, paging buttons)
+//and for redrawing charts from data already in the browser (analytics weeks)
+//These run in the browser so they don't need a round trip to the server.
+//Registered in Python with clientside_callback(ClientsideFunction("ui", "<function name>"), ...)
+
+//Wait this long after the last keystroke before searching
+const SEARCH_DEBOUNCE_MS = 250;
+//Pending debounce timers by store ID
+const searchTimers = {};
+//Most options shown in a search dropdown (SEARCH_LIMIT in search_index.py)
+const SEARCH_LIMIT = 50;
+//Fleet reference data (bin IDs, addresses, bin types, coordinates) kept in localStorage (see reference_data.py)
+const REFERENCE_STORAGE_KEY = "fleet-reference";
+//The cached reference data, its search keys by column and the download in progress
+const fleetReference = {version: null, columns: null, searchKeys: {}, loading: null};
+//Server push connection and the last dataset versions it delivered
+const liveUpdates = {source: null, versions: {}, started: false};
+//A tab counts as idle after this long without keyboard, mouse or touch input
+const IDLE_AFTER_MS = 10 * 60 * 1000;
+//How often each tab reports whether it is active, idle or hidden (HEARTBEAT_SECONDS in live_updates.py)
+const HEARTBEAT_MS = 60 * 1000;
+//This tab's activity: ID for the heartbeats, time of the last input and the state last reported
+const tabActivity = {sessionId: null, lastInput: Date.now(), state: null};
+//How often the "x minutes ago" texts of the map popups are brought up to date
+const RELATIVE_AGE_REFRESH_MS = 30 * 1000;
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    ui: {
+        ///////////////////////////////////////////////////////////////////
+        //Sidebar collapse to just icons (was toggle_or_load_sidebar in callbacks.py)
+        //styles = layout-styles-store data, holds the sidebar/content style dicts from layouts.py
+        toggle_or_load_sidebar: function(sidebar_state, n, styles) {
+            const triggered_id = triggeredId();
+            let collapsed = (sidebar_state && sidebar_state.collapsed) || false;
+
+            if (triggered_id === "btn-collapse") {
+                collapsed = !collapsed;
+            }
+
+            const class_name = collapsed ? "sidebar collapsed" : "sidebar";
+            const sidebar_style = collapsed ? styles.sidebar_collapsed : styles.sidebar;
+            const content_style = collapsed ? styles.content_collapsed : styles.content;
+
+            return [sidebar_style, content_style, {collapsed: collapsed}, class_name];
+        },
+
+        ///////////////////////////////////////////////////////////////////
+        //Bins submenu show/hide, caret rotation and floating box when sidebar collapsed
+        //(was toggle_bins_submenu in callbacks.py)
+        toggle_bins_submenu: function(n, sidebar_state, pathname, outside_clicks, current_class, bins_submenu_state) {
+            const triggered_id = triggeredId();
+
+            const submenu_was_open = bins_submenu_state.open;
+            const collapsed = sidebar_state.collapsed;
+
+            const caret_closed = "bi bi-caret-down-fill caret-icon";
+            const hidden = {display: "none"};
+
+            //Overlay used to hide the floating submenu when clicking outside of it
+            function getOverlayStyle(submenu_open) {
+                return {
+                    display: submenu_open ? "block" : "none",
+                    position: "fixed",
+                    top: 0, left: 0, width: "100vw", height: "100vh",
+                    zIndex: 999, backgroundColor: "transparent"
+                };
+            }
+
+            // === CASE: Click outside floating submenu (outside overlay clicked) ===
+            if (triggered_id === "outside-click-overlay" && submenu_was_open) {
+                return ["slide-toggle", caret_closed, hidden, {open: false}, hidden];
+            }
+
+            // === CASE: URL changed, close floating submenu ===
+            if (triggered_id === "url" && submenu_was_open) {
+                return ["slide-toggle", caret_closed, hidden, {open: false}, hidden];
+            }
+
+            // === CASE: Sidebar expanded while floating submenu was open ===
+            if (triggered_id === "sidebar-state" && submenu_was_open && !collapsed) {
+                return ["slide-toggle open", caret_closed + " rotate", hidden, {open: true}, hidden];
+            }
+
+            // === CASE: Toggle button clicked ===
+            if (triggered_id === "bins-toggle") {
+                const submenu_open = !submenu_was_open;
+
+                //Determine caret icon rotation class
+                let caret_class = caret_closed;
+                if (submenu_open) {
+                    caret_class += !collapsed ? " rotate" : " rotate-right";
+                }
+
+                //Handle floating submenu based on sidebar state (collapsed)
+                if (collapsed) {
+                    const floating_style = {
+                        display: submenu_open ? "block" : "none",
+                        position: "fixed", //make the submenu anchor to screen
+                        top: "17.8rem", //Vertical position next to Bin icon
+                        left: "5rem",
+                        zIndex: 9000,
+                        backgroundColor: "#542978",
+                        padding: "0.5rem 1rem",
+                        boxShadow: "2px 4px 10px rgba(0, 0, 0, 0.3)",
+                        borderRadius: "10px", //rounded border
+                        minWidth: "200px"
+                    };
+                    //Show overlay when submenu is open
+                    return ["slide-toggle", caret_class, floating_style, {open: submenu_open}, getOverlayStyle(submenu_open)];
+                }
+
+                //If sidebar is expanded, hide the floating submenu
+                return [submenu_open ? "slide-toggle open" : "slide-toggle", caret_class, hidden, {open: submenu_open}, hidden];
+            }
+
+            //Default fallback (return current state)
+            return ["slide-toggle", caret_closed, hidden, {open: submenu_was_open}, hidden];
+        },
+
+        ///////////////////////////////////////////////////////////////////
+        //Collapse/expand button for the map legends (index.py and bin-map.py)
+        toggle_legend: function(n_clicks) {
+            if (n_clicks % 2 === 1) {
+                //If odd clicks: hide content
+                return [{display: "none"}, "+"];
+            }
+            //If even clicks: show content
+            return [{marginTop: "3px"}, "-"];
+        },
+
+        ///////////////////////////////////////////////////////////////////
+        //Alerts comment box character count, disables Save button if over 100 characters
+        update_character_count: function(value) {
+            //If nothing entered in the comment box
+            if (!value) {
+                return ["0 / 100 characters", false]; //and don't disable Save button
+            }
+            //Count characters the same way Python's len() does (code points, not UTF-16 units)
+            const length = Array.from(value).length;
+            return [length + " / 100 characters", length > 100];
+        },
+
+        ///////////////////////////////////////////////////////////////////
+        //"Cancel" button of the alerts comment popover closes it
+        close_popover: function(n_clicks) {
+            return false;
+        },
+
+        ///////////////////////////////////////////////////////////////////
+        //Debounce a search dropdown's typing into its "<dropdown id>-search" store
+        //so the server search (search_index.register_search_dropdown) runs once typing pauses
+        //With the fleet reference data cached, searches the cached column directly and sets the options
+        //(reference_column: "bin_id" or "bin_location", null for searches only the server can run)
+        debounce_search: function(search_value, selected, reference_column, as_text) {
+            const dropdown_id = triggeredId();
+            const store_id = dropdown_id + "-search";
+            clearTimeout(searchTimers[store_id]);
+            if (!search_value || !search_value.trim()) {
+                return window.dash_clientside.no_update;
+            }
+
+            const values = reference_column ? searchFleetReference(reference_column, search_value) : null;
+            if (values) {
+                const options = values.map(function(value) { return as_text ? String(value) : value; });
+                //Keep the selected value(s) in the options so the dropdown can still show them
+                (Array.isArray(selected) ? selected : [selected]).forEach(function(value) {
+                    if (value !== null && value !== undefined && options.indexOf(value) === -1) {
+                        options.push(value);
+                    }
+                });
+                window.dash_clientside.set_props(dropdown_id, {
+                    options: options.map(function(value) { return {label: String(value), value: value}; })
+                });
+                return window.dash_clientside.no_update;
+            }
+
+            //Not cached (yet), debounce into the store for the server side search
+            searchTimers[store_id] = setTimeout(function() {
+                window.dash_clientside.set_props(store_id, {data: search_value});
+            }, SEARCH_DEBOUNCE_MS);
+            return window.dash_clientside.no_update;
+        },
+
+        ///////////////////////////////////////////////////////////////////
+        //Start live updates once the app has rendered (see live_updates.py)
+        //The /events stream is only open while the tab is visible and in use. Hidden or idle
+        //tabs close it, so nothing refreshes in them, and reopen it when they are looked at again
+        start_live_updates: function(pathname) {
+            if (!liveUpdates.started) {
+                liveUpdates.started = true;
+                ["keydown", "mousemove", "pointerdown", "wheel", "touchstart"].forEach(function(event) {
+                    document.addEventListener(event, markTabInput, {passive: true});
+                });
+                document.addEventListener("visibilitychange", updateTabActivity);
+                setInterval(updateTabActivity, HEARTBEAT_MS);
+                updateTabActivity();
+                //Load the cached reference data and check it is still current (a 304 if it is)
+                loadFleetReference();
+                revalidateFleetReference(null);
+                startRelativeAges();
+            }
+            return window.dash_clientside.no_update;
+        },
+
+        ///////////////////////////////////////////////////////////////////
+        //Expand a columnar payload (columnar.py) into DataTable records
+        //Datetime columns come as epoch ms (delta encoded or not) and are shown as ISO strings
+        expand_columns: function(payload) {
+            if (!payload) {
+                return window.dash_clientside.no_update;
+            }
+            const columns = decodeColumns(payload);
+            const records = new Array(payload.length);
+            for (let row = 0; row < payload.length; row++) {
+                const record = {};
+                for (let index = 0; index < columns.length; index++) {
+                    record[payload.columns[index]] = columns[index][row];
+                }
+                records[row] = record;
+            }
+            return records;
+        },
+
+        ///////////////////////////////////////////////////////////////////
+        //Analytics fill level trends graph for the selected week (or the whole month)
+        //data: the month's daily avg/min/max fill levels from the server (pages/analytics.py)
+        weekly_fill_figure: function(data, week_start) {
+            if (!data) {
+                return window.dash_clientside.no_update;
+            }
+            if (!data.series) {
+                return noDataFigure();
+            }
+            const days = weekFilter(seriesColumns(data.series), "date", week_start);
+            const layout = {
+                xaxis: {title: {text: "Date"}, tickformat: "%d %b"},
+                yaxis: {title: {text: "Fill Level (%)"}, range: [0, 100]},
+                plot_bgcolor: "#F9F7FA",
+            };
+            if (!days.date.length) {
+                return {data: [], layout: Object.assign({title: {text: "No data available for selected filters."}}, layout)};
+            }
+            const line = function(column, name, color) {
+                return {
+                    type: "scatter", x: days.date, y: days[column], mode: "lines+markers", name: name,
+                    line: {color: color, shape: "spline", smoothing: 1.3},
+                };
+            };
+            return {
+                data: [line("avg", "Avg Fill", "#F08A07"), line("min", "Min Fill", "#79C3F0"), line("max", "Max Fill", "#A981F0")],
+                layout: Object.assign(layout, {
+                    title: {text: "Fill Level Trends for Bin: #" + data.bin_id},
+                    hovermode: "x unified",
+                    margin: {l: 40, r: 20, t: 50, b: 40},
+                }),
+            };
+        },
+
+        ///////////////////////////////////////////////////////////////////
+        //Analytics avg time to 80% full graph for the selected week (or the whole month)
+        //data: the month's daily average times (minutes) from the server (pages/analytics.py)
+        time_to_80_figure: function(data, week_start) {
+            if (!data) {
+                return window.dash_clientside.no_update;
+            }
+            if (!data.series) {
+                return noDataFigure();
+            }
+            const days = weekFilter(seriesColumns(data.series), "date", week_start);
+            const layout = {
+                xaxis: {title: {text: "Date"}, tickformat: "%d %b"},
+                yaxis: {title: {text: "Duration (days)"}, rangemode: "tozero"},
+                plot_bgcolor: "#F9F7FA",
+            };
+            if (!days.date.length) {
+                return {data: [], layout: Object.assign({title: {text: "No data available for selected filters."}}, layout)};
+            }
+            return {
+                data: [{
+                    type: "scatter",
+                    x: days.date,
+                    //There are 1440 minutes per day, divide by this to get days instead of minutes
+                    y: days.time_to_fill.map(function(minutes) { return Math.round(minutes / 1440 * 100) / 100; }),
+                    mode: "lines+markers",
+                    name: "Avg Time to 80%",
+                    line: {color: "#22960B", shape: "spline", smoothing: 1.3},
+                    hovertemplate: "Duration: %{y} days<extra></extra>",
+                }],
+                layout: Object.assign(layout, {
+                    title: {text: "Avg Time to Reach 80% Full for Bin: #" + data.bin_id},
+                    hovermode: "x unified",
+                    margin: {l: 40, r: 20, t: 50, b: 40},
+                }),
+            };
+        },
+
+        ///////////////////////////////////////////////////////////////////
+        //Width in pixels of a chart, for downsampling its series (see downsample.py)
+        //store_id: "<graph id>-width"
+        chart_width: function(pathname, store_id) {
+            const graph = document.getElementById(store_id.replace(/-width$/, ""));
+            if (!graph || !graph.clientWidth) {
+                return window.dash_clientside.no_update;
+            }
+            return graph.clientWidth;
+        },
+
+        ///////////////////////////////////////////////////////////////////
+        //Download an analytics report in the picked format (see analytics_reports.py)
+        //The server regenerates it from the chart's filters, names/values: the filter names and values
+        start_export: function(report, format, names, values) {
+            if (!format) {
+                return window.dash_clientside.no_update;
+            }
+            const params = new URLSearchParams();
+            names.forEach(function(name, index) {
+                if (values[index] !== null && values[index] !== undefined && values[index] !== "") {
+                    params.set(name, values[index]);
+                }
+            });
+            const link = document.createElement("a");
+            link.href = "/exports/" + report + "." + format + "?" + params.toString();
+            link.download = "";
+            document.body.appendChild(link);
+            link.click();
+            link.remove();
+            return null; //Clear the dropdown so the same format can be picked again
+        },
+
+        ///////////////////////////////////////////////////////////////////
+        //Disable the Previous button on the filtered bins card when on page 0
+        disable_prev_button: function(page) {
+            return page === 0;
+        }
+    }
+});
+
+//ID of the component that triggered the current clientside callback, like ctx.triggered_id
+function triggeredId() {
+    const triggered = window.dash_clientside.callback_context.triggered;
+    if (!triggered || !triggered.length || !triggered[0].prop_id || triggered[0].prop_id === ".") {
+        return null;
+    }
+    const prop_id = triggered[0].prop_id;
+    return prop_id.slice(0, prop_id.lastIndexOf("."));
+}
+
+//Values of each column of a columnar payload (columnar.py), in column order
+//Datetime columns come as epoch ms (delta encoded or not) and are returned as ISO strings
+function decodeColumns(payload) {
+    const times = payload.times || {};
+    return payload.columns.map(function(column, index) {
+        let values = payload.values[index];
+        if (times[column]) {
+            let previous = 0;
+            values = values.map(function(value) {
+                if (value === null) {
+                    return null;
+                }
+                previous = times[column] === "delta" ? previous + value : value;
+                return new Date(previous).toISOString().slice(0, 19);
+            });
+        }
+        return values;
+    });
+}
+
+//{column: values} of a columnar payload
+function seriesColumns(payload) {
+    const columns = {};
+    decodeColumns(payload).forEach(function(values, index) {
+        columns[payload.columns[index]] = values;
+    });
+    return columns;
+}
+
+//Rows of series ({column: values}) whose column falls in the week starting on week_start
+//("YYYY-MM-DD"), all of them when no week is picked
+function weekFilter(series, column, week_start) {
+    if (!week_start) {
+        return series;
+    }
+    const week_end = new Date(Date.parse(week_start + "T00:00:00Z") + 7 * 24 * 60 * 60 * 1000).toISOString().slice(0, 10);
+    const keep = series[column].map(function(value) { return value >= week_start && value < week_end; });
+    const filtered = {};
+    Object.keys(series).forEach(function(name) {
+        filtered[name] = series[name].filter(function(value, row) { return keep[row]; });
+    });
+    return filtered;
+}
+
+//Empty graph for a bin/month without data
+function noDataFigure() {
+    return {
+        data: [],
+        layout: {
+            title: {text: "No data available."},
+            xaxis: {visible: false},
+            yaxis: {visible: false},
+            plot_bgcolor: "#F9F7FA",
+        },
+    };
+}
+
+//Whether this tab is "active", "idle" (visible but unused) or "hidden"
+function tabState() {
+    if (document.hidden) {
+        return "hidden";
+    }
+    return Date.now() - tabActivity.lastInput > IDLE_AFTER_MS ? "idle" : "active";
+}
+
+function markTabInput() {
+    tabActivity.lastInput = Date.now();
+    if (tabActivity.state !== "active") {
+        updateTabActivity();
+    }
+}
+
+//Open or close the push stream to match the tab's state, and send the heartbeat
+function updateTabActivity() {
+    const state = tabState();
+    if (state === "active") {
+        openLiveUpdates();
+    } else {
+        closeLiveUpdates();
+    }
+    tabActivity.state = state;
+    sendHeartbeat(state);
+}
+
+//Open the /events stream. Each "versions" event holds {dataset name: version}, changed versions
+//are copied into the "dataset-version-<name>" stores so only the widgets using that data refresh.
+//The versions seen before a pause are kept, so reopening refreshes each widget whose data
+//changed in the meantime once, and nothing else
+function openLiveUpdates() {
+    if (liveUpdates.source || !window.EventSource) {
+        return;
+    }
+    liveUpdates.source = new EventSource("/events");
+    liveUpdates.source.addEventListener("versions", function(event) {
+        const versions = JSON.parse(event.data);
+        revalidateFleetReference(versions.bin_metadata);
+        Object.keys(versions).forEach(function(name) {
+            if (liveUpdates.versions[name] !== versions[name]) {
+                liveUpdates.versions[name] = versions[name];
+                window.dash_clientside.set_props("dataset-version-" + name, {data: versions[name]});
+            }
+        });
+    });
+    //EventSource reconnects by itself after errors and when the server closes the stream
+}
+
+function closeLiveUpdates() {
+    if (liveUpdates.source) {
+        liveUpdates.source.close();
+        liveUpdates.source = null;
+    }
+}
+
+//Report this tab's state to /sessions/heartbeat for the active vs idle session counts
+function sendHeartbeat(state) {
+    if (!tabActivity.sessionId) {
+        tabActivity.sessionId = window.sessionStorage.getItem("dashboard-session-id");
+        if (!tabActivity.sessionId) {
+            tabActivity.sessionId = Date.now().toString(36) + Math.random().toString(36).slice(2);
+            window.sessionStorage.setItem("dashboard-session-id", tabActivity.sessionId);
+        }
+    }
+    const body = JSON.stringify({session_id: tabActivity.sessionId, state: state});
+    //sendBeacon still gets through while the tab is being hidden or closed
+    if (!(navigator.sendBeacon && navigator.sendBeacon("/sessions/heartbeat", new Blob([body], {type: "application/json"})))) {
+        fetch("/sessions/heartbeat", {method: "POST", headers: {"Content-Type": "application/json"}, body: body, keepalive: true})
+            .catch(function() {});
+    }
+}
+
+//Lowercase and collapse whitespace, like normalise() in search_index.py
+function normaliseSearch(text) {
+    return String(text).replace(/\s+/g, " ").trim().toLowerCase();
+}
+
+function setFleetReference(reference) {
+    fleetReference.version = reference.version;
+    fleetReference.columns = reference.columns;
+    fleetReference.searchKeys = {};
+}
+
+//Use the copy saved by an earlier visit, if any
+function loadFleetReference() {
+    try {
+        const saved = window.localStorage.getItem(REFERENCE_STORAGE_KEY);
+        if (saved) {
+            setFleetReference(JSON.parse(saved));
+        }
+    } catch (error) {
+        //localStorage unavailable or the saved copy is unreadable, it will be downloaded again
+    }
+}
+
+//Download the reference data unless the cached copy is already at version
+//(version null: ask the server, which answers 304 if the cached copy is current)
+function revalidateFleetReference(version) {
+    if (fleetReference.loading || (version !== null && version !== undefined && version === fleetReference.version)) {
+        return;
+    }
+    const headers = {};
+    if (fleetReference.columns && fleetReference.version !== null) {
+        headers["If-None-Match"] = '"fleet-' + fleetReference.version + '"';
+    }
+    fleetReference.loading = fetch("/reference/fleet", {headers: headers, cache: "no-store"})
+        .then(function(response) {
+            if (response.status !== 200) {
+                return null; //304: the cached copy is current
+            }
+            return response.json().then(function(reference) {
+                setFleetReference(reference);
+                try {
+                    window.localStorage.setItem(REFERENCE_STORAGE_KEY, JSON.stringify(reference));
+                } catch (error) {
+                    //Storage full or disabled, keep the copy in memory for this tab
+                }
+            });
+        })
+        .catch(function() {})
+        .then(function() {
+            fleetReference.loading = null;
+        });
+}
+
+//Distinct values of a cached column with their normalised search keys
+function fleetSearchKeys(column) {
+    if (!fleetReference.searchKeys[column]) {
+        const seen = new Set();
+        const keys = [];
+        (fleetReference.columns[column] || []).forEach(function(value) {
+            if (value === null || seen.has(value)) {
+                return;
+            }
+            seen.add(value);
+            const key = normaliseSearch(value);
+            if (key) {
+                keys.push({value: value, key: key});
+            }
+        });
+        fleetReference.searchKeys[column] = keys;
+    }
+    return fleetReference.searchKeys[column];
+}
+
+//Best SEARCH_LIMIT values of a cached column containing query, ranked like SearchIndex in search_index.py:
+//exact, prefix, word start, anywhere, then shortest, then alphabetical. null if nothing is cached
+function searchFleetReference(column, query) {
+    if (!fleetReference.columns || !fleetReference.columns[column]) {
+        return null;
+    }
+    const search = normaliseSearch(query);
+    const matches = [];
+    fleetSearchKeys(column).forEach(function(entry) {
+        let start = entry.key.indexOf(search);
+        if (start === -1) {
+            return;
+        }
+        let rank = entry.key === search ? 0 : (start === 0 ? 1 : 3);
+        while (rank === 3 && start !== -1) {
+            if (!/[a-z0-9]/.test(entry.key[start - 1])) {
+                rank = 2;
+            }
+            start = entry.key.indexOf(search, start + 1);
+        }
+        matches.push({value: entry.value, key: entry.key, rank: rank});
+    });
+    matches.sort(function(a, b) {
+        return a.rank - b.rank || a.key.length - b.key.length || (a.key < b.key ? -1 : (a.key > b.key ? 1 : 0));
+    });
+    return matches.slice(0, SEARCH_LIMIT).map(function(match) { return match.value; });
+}
+
+//"x minutes/hours/days ago" for a reading at epoch ms updated, like format_relative_ages in map_markers.py
+function formatRelativeAge(updated) {
+    const plural = function(count, unit) { return count + " " + unit + (count !== 1 ? "s" : ""); };
+    const minutes = Math.trunc((Date.now() - updated) / 60000);
+    const hours = Math.trunc(minutes / 60);
+    const days = Math.trunc(hours / 24);
+    if (minutes < 60) {
+        return plural(minutes, "minute") + " ago";
+    }
+    if (hours < 24) {
+        return plural(hours, "hour") + " ago";
+    }
+    return plural(days, "day") + (hours % 24 > 0 ? " " + plural(hours % 24, "hour") : "") + " ago";
+}
+
+//Rewrite the text of every element with a data-updated time (the map popups, see map_markers.py)
+function refreshRelativeAges() {
+    document.querySelectorAll(".relative-age[data-updated]").forEach(function(element) {
+        const text = formatRelativeAge(Number(element.dataset.updated));
+        if (element.textContent !== text) {
+            element.textContent = text;
+        }
+    });
+}
+
+//Markers are only resent when their reading changes, so their ages are kept current here:
+//on a timer, and as soon as a popup is opened or a marker is patched in
+function startRelativeAges() {
+    let pending = false;
+    new MutationObserver(function(mutations) {
+        const added = mutations.some(function(mutation) { return mutation.addedNodes.length > 0; });
+        if (added && !pending) {
+            pending = true;
+            requestAnimationFrame(function() {
+                pending = false;
+                refreshRelativeAges();
+            });
+        }
+    }).observe(document.body, {childList: true, subtree: true});
+    setInterval(refreshRelativeAges, RELATIVE_AGE_REFRESH_MS);
+}
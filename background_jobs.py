@@ -0,0 +1,169 @@
+#Background jobs for slow callbacks (the analytics charts).
+#A normal callback holds a gunicorn worker until it returns. A heavy callback registered with
+#@heavy_callback runs as a Dash background callback instead: the request returns straight away,
+#the job runs in its own process and the browser polls for the result, so the workers stay free
+#for the interactive callbacks.
+#
+#- Jobs and results are kept in a diskcache folder (JOBS_CACHE_DIR) shared by all workers.
+#- Results are cached by the callback's inputs and the versions of the datasets it reads, so
+#  opening the same chart again is served from the cache until new data arrives.
+#- When the inputs change while a job is running, Dash cancels the old job and starts a new
+#  one. Leaving the page cancels it too.
+#- A job runs in a fresh process, so it never sees what earlier requests left in module
+#  globals. Anything a job must remember between runs goes in the shared cache (shared_cache.py).
+#- Interactive callbacks (e.g. update_large_map, which every filter change and map move runs)
+#  stay normal callbacks, so they never queue behind the jobs.
+#- At most MAX_HEAVY_JOBS jobs run at once on the machine, the rest wait for a slot and show
+#  "Queued" in their progress indicator. Exports (analytics_reports.py) have their own
+#  MAX_EXPORT_JOBS slots and are turned away rather than queued, so a burst of exports never
+#  holds up the charts or ties up the workers.
+#
+#Needs diskcache, multiprocess and psutil (pip install "dash[diskcache]").
+import fcntl
+import functools
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+from dash import html, callback, DiskcacheManager, Input, Output
+
+from data_utils import engine
+from shared_cache import dataset_versions
+
+JOBS_CACHE_DIR = os.getenv(
+    "JOBS_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), "smart-bin-dashboard-cache", "jobs"),
+)
+#Heavy jobs running at once on this machine, each is a process with a database connection
+MAX_HEAVY_JOBS = int(os.getenv("MAX_HEAVY_JOBS", "4"))
+#Exports being built at once on this machine
+MAX_EXPORT_JOBS = int(os.getenv("MAX_EXPORT_JOBS", "2"))
+#How long (seconds) finished results stay cached
+RESULT_EXPIRE_SECONDS = 3600
+#A job computing a shared result holds its lock at most this long (seconds)
+LOCK_EXPIRE_SECONDS = 60
+#How often (ms) the browser polls for a job's result
+POLL_INTERVAL_MS = 500
+#How often (seconds) a queued job checks for a free slot
+SLOT_WAIT_SECONDS = 0.2
+
+_cache = None
+
+
+class JobSlotsBusy(Exception):
+    pass
+
+#Disk cache holding the jobs and their results, opened on first use
+def jobs_cache():
+    global _cache
+    if _cache is None:
+        import diskcache
+        os.makedirs(JOBS_CACHE_DIR, mode=0o700, exist_ok=True)
+        _cache = diskcache.Cache(JOBS_CACHE_DIR)
+    return _cache
+
+
+#Value of key in the jobs cache, computed with compute() by only one job when several ask for it at once
+#Shares data between the jobs (separate processes) of one page, e.g. the analytics bundle
+def shared_result(key, compute, expire=RESULT_EXPIRE_SECONDS):
+    import diskcache
+
+    cache = jobs_cache()
+    value = cache.get(key)
+    if value is None:
+        #Expires in case the job holding it is cancelled (killed) before releasing it
+        with diskcache.Lock(cache, ("lock",) + tuple(key), expire=LOCK_EXPIRE_SECONDS):
+            value = cache.get(key)
+            if value is None:
+                value = compute()
+                cache.set(key, value, expire=expire)
+    return value
+
+
+###################################################################
+# Job slots
+# One lock file per slot, shared by every process on the machine. The
+# lock is released by the OS when its process ends, so a cancelled
+# (killed) job never keeps its slot.
+###################################################################
+
+#Hold one of the pool's slots for the duration of the with block
+#wait=False: raise JobSlotsBusy instead of waiting when all slots are taken
+#on_wait(): called once when the job has to wait
+@contextmanager
+def job_slot(pool, slots, wait=True, on_wait=None):
+    os.makedirs(JOBS_CACHE_DIR, mode=0o700, exist_ok=True)
+    waiting = False
+    while True:
+        for slot in range(slots):
+            fd = os.open(os.path.join(JOBS_CACHE_DIR, f"{pool}-slot-{slot}.lock"), os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+            try:
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+            return
+
+        if not wait:
+            raise JobSlotsBusy(pool)
+        if not waiting and on_wait:
+            on_wait()
+        waiting = True
+        time.sleep(SLOT_WAIT_SECONDS)
+
+
+###################################################################
+# Heavy callbacks
+###################################################################
+VISIBLE = {"display": "block"}
+HIDDEN = {"display": "none"}
+
+def progress_id(widget_id):
+    return f"{widget_id}-job-progress"
+
+#Progress indicator of a heavy callback, place it next to the widget
+def job_progress(widget_id):
+    return html.Div(id=progress_id(widget_id), className="text-muted small", style=HIDDEN)
+
+#Versions of the datasets a job reads, part of the result cache key
+def _versions(datasets):
+    versions = dataset_versions(datasets)
+    return tuple(versions[name] for name in datasets)
+
+#@callback for a heavy callback, run as a background job
+#widget_id: the job_progress(widget_id) next to the widget shows the job's progress
+#datasets: shared datasets the result depends on, results are cached until one of their
+#versions changes. None: don't cache the results (e.g. callbacks that read State)
+def heavy_callback(*dependencies, widget_id, datasets=None, **kwargs):
+    manager = DiskcacheManager(
+        jobs_cache(),
+        cache_by=[functools.partial(_versions, list(datasets))] if datasets is not None else None,
+        expire=RESULT_EXPIRE_SECONDS,
+    )
+
+    def decorator(func):
+        @functools.wraps(func)
+        def job(set_progress, *args):
+            #The job process is forked from a worker, it mustn't reuse the worker's connections
+            engine.dispose(close=False)
+            with job_slot("heavy", MAX_HEAVY_JOBS, on_wait=lambda: set_progress("Queued, waiting for other reports to finish...")):
+                set_progress("Loading...")
+                return func(*args)
+
+        return callback(
+            *dependencies,
+            background=True,
+            manager=manager,
+            progress=Output(progress_id(widget_id), "children"),
+            running=[(Output(progress_id(widget_id), "style"), VISIBLE, HIDDEN)],
+            cancel=[Input("url", "pathname")], #leaving the page cancels the job
+            interval=POLL_INTERVAL_MS,
+            **kwargs,
+        )(job)
+    return decorator
@@ -0,0 +1,125 @@
+#Serialization benchmark: how long our largest callback responses take to encode as JSON
+#with plotly's standard engine and with the orjson serializer (serialization.py).
+#The responses are built from synthetic fleet data shaped like the real tables:
+#- the bin table's columnar store (update_bin_data_table)
+#- the same table as DataTable records
+#- the large map's marker layer (update_large_map, full layer)
+#- the fill history line chart over a whole year of readings, before downsampling
+#Each one is wrapped like a Dash callback response and encoded --runs times with each serializer.
+#Both must give the same JSON (after parsing), the run fails otherwise. Datetimes are compared
+#as times: plotly writes zero microseconds out in arrays (".000000"), orjson leaves them off.
+#
+#Run from the repo root:
+#    python benchmarks/serialization_benchmark.py
+#    python benchmarks/serialization_benchmark.py --bins 5000 --runs 20
+#No database is needed.
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from columnar import to_columns
+from lazy_imports import go
+from map_markers import build_map_markers, LARGE_MAP_POPUP_FIELDS
+from serialization import SERIALIZERS, dumps, resolve_serializer
+
+BIN_TYPES = ["General Waste", "Recycling", "Organics"]
+ZERO_MICROSECONDS = re.compile(r"^(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)\.0+$")
+
+
+#Latest reading of each bin, like data_utils.get_bin_data merged with the bin types
+def fleet_table(bins, seed=0):
+    rng = np.random.default_rng(seed)
+    now = pd.Timestamp.now().floor("min")
+    return pd.DataFrame({
+        "bin_id": np.arange(1, bins + 1),
+        "bin_location": [f"{number} Example Street, Maribyrnong VIC 3032" for number in range(1, bins + 1)],
+        "fill_level": rng.integers(0, 101, bins).astype(float),
+        "latitude": -37.7749 + rng.normal(0, 0.01, bins),
+        "longitude": 144.8930 + rng.normal(0, 0.01, bins),
+        "timestamp": now - pd.to_timedelta(rng.integers(0, 48 * 60, bins), unit="min"),
+        "bin_type": rng.choice(BIN_TYPES, bins),
+        "last_emptied_string": (now - pd.to_timedelta(rng.integers(0, 14, bins), unit="D")).strftime("%d/%m/%Y"),
+    })
+
+#A year of readings of one bin every 15 minutes
+def fill_history_figure(seed=0):
+    rng = np.random.default_rng(seed)
+    timestamps = pd.date_range(end=pd.Timestamp.now().floor("15min"), periods=365 * 96, freq="15min")
+    fill = np.cumsum(rng.uniform(0, 0.6, len(timestamps))) % 100
+    figure = go.Figure()
+    figure.add_trace(go.Scatter(x=timestamps, y=fill, name="Fill Level", mode="lines"))
+    figure.add_trace(go.Scatter(x=timestamps[1:], y=np.diff(fill), name="Δ Fill Level", mode="lines"))
+    return figure
+
+#{name: response} like the body of a Dash callback response
+def build_responses(bins):
+    table = fleet_table(bins)
+    records = table.assign(timestamp=table["timestamp"].dt.strftime("%d/%m/%Y %H:%M")).to_dict("records")
+    markers = build_map_markers(table, LARGE_MAP_POPUP_FIELDS, popup_width=("180px", "220px"))
+    outputs = {
+        "bin table (columnar)": {"bin-data-table-columns": {"data": to_columns(table)}},
+        "bin table (records)": {"bin-data-table": {"data": records}},
+        "large map markers": {"large-map-marker-layer": {"children": markers}},
+        "fill history (1 year)": {"fill-history-line-chart": {"figure": fill_history_figure()}},
+    }
+    return {name: {"multi": True, "response": output} for name, output in outputs.items()}
+
+#Parsed JSON with datetimes written the same way
+def normalise(value):
+    if isinstance(value, dict):
+        return {key: normalise(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [normalise(item) for item in value]
+    if isinstance(value, str):
+        return ZERO_MICROSECONDS.sub(r"\1", value)
+    return value
+
+#Median seconds to encode response with the serializer, and the JSON text
+def time_serializer(response, name, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        text = dumps(response, name)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), text
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the JSON serializers on the largest callback responses")
+    parser.add_argument("--bins", type=int, default=2000, help="number of bins in the synthetic fleet")
+    parser.add_argument("--runs", type=int, default=10, help="encodings per response and serializer")
+    args = parser.parse_args()
+
+    serializers = list(dict.fromkeys(resolve_serializer(name) for name in SERIALIZERS))
+    if serializers == ["plotly"]:
+        print("orjson is not installed (pip install orjson), only plotly's encoder can be timed")
+
+    failed = False
+    print(f"{'response':<24}{'size':>10}" + "".join(f"{name:>12}" for name in serializers) + f"{'speedup':>10}")
+    for response_name, response in build_responses(args.bins).items():
+        results = {name: time_serializer(response, name, args.runs) for name in serializers}
+        texts = [normalise(json.loads(text)) for _, text in results.values()]
+        if any(text != texts[0] for text in texts[1:]):
+            print(f"FAIL: {response_name} encodes differently with {' and '.join(serializers)}")
+            failed = True
+
+        size = len(results["plotly"][1].encode())
+        timings = "".join(f"{results[name][0] * 1000:>10.1f}ms" for name in serializers)
+        speedup = f"{results['plotly'][0] / max(results[serializers[0]][0], 1e-9):>9.1f}x" if len(serializers) > 1 else ""
+        print(f"{response_name:<24}{size / 1024:>8.0f}kB{timings}{speedup}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
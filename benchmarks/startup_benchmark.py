@@ -0,0 +1,102 @@
+#Cold start benchmark: how long a freshly started worker takes to import the app.
+#Each run imports app.py in a new Python process (like a new gunicorn worker) and the
+#median wall time is checked against the import budget. It also fails if any module in
+#lazy_imports.DEFERRED_MODULES was imported during startup.
+#
+#Run from the repo root:
+#    python benchmarks/startup_benchmark.py
+#    python benchmarks/startup_benchmark.py --runs 10 --budget 2.5 --top 15
+#No database is needed, app.py blocks database access while it imports the pages.
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#Default import budget in seconds (median over the runs), override with --budget or STARTUP_BUDGET_SECONDS
+DEFAULT_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "3.0"))
+
+#Runs inside the child process: time `import app` and report which deferred modules got loaded
+CHILD_CODE = """
+import json, sys, time
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+from lazy_imports import DEFERRED_MODULES
+print(json.dumps({"seconds": elapsed, "loaded": [name for name in DEFERRED_MODULES if name in sys.modules]}))
+"""
+
+
+def run_child(extra_args=()):
+    result = subprocess.run(
+        [sys.executable, *extra_args, "-c", CHILD_CODE],
+        cwd=REPO_ROOT, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr)
+        raise SystemExit(f"Importing the app failed (exit code {result.returncode})")
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+#Slowest imports made by app.py itself (its direct children: data_utils, callbacks, ...)
+#from `python -X importtime` output, as (cumulative seconds, module)
+#Dash runs the pages/ modules itself (use_pages) rather than importing them, so importtime
+#doesn't list them: their own time is in app's self time, reported as "app (incl. pages)",
+#and the modules they import are listed as app's children.
+def slowest_imports(importtime_output, top):
+    rows = []
+    children = []
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_time, cumulative, module = line[len("import time:"):].split("|")
+        #The module column is indented two spaces per level, and a module is listed after
+        #everything it imported, so the level 2 rows just before `app` are app's own imports
+        depth = (len(module) - len(module.lstrip()) + 1) // 2
+        if depth == 2:
+            children.append((int(cumulative) / 1e6, module.strip()))
+        elif depth == 1:
+            if module.strip() == "app":
+                rows = children + [(int(self_time) / 1e6, "app (incl. pages)")]
+            children = []
+    return sorted(rows, reverse=True)[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the app's cold start import time")
+    parser.add_argument("--runs", type=int, default=5, help="number of fresh processes to time")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET_SECONDS, help="max median import time in seconds")
+    parser.add_argument("--top", type=int, default=10, help="number of slowest imports to list")
+    args = parser.parse_args()
+
+    timings = []
+    loaded_deferred = set()
+    for _ in range(args.runs):
+        report, _ = run_child()
+        timings.append(report["seconds"])
+        loaded_deferred.update(report["loaded"])
+
+    median = statistics.median(timings)
+    print(f"app import over {args.runs} runs: median {median:.3f}s, min {min(timings):.3f}s, max {max(timings):.3f}s")
+
+    #One more run with -X importtime to show where the time goes
+    _, importtime_output = run_child(["-X", "importtime"])
+    print("\nSlowest imports made by app.py:")
+    for seconds, module in slowest_imports(importtime_output, args.top):
+        print(f"  {seconds:7.3f}s  {module}")
+
+    failed = False
+    if loaded_deferred:
+        print(f"\nFAIL: deferred modules imported at startup: {', '.join(sorted(loaded_deferred))}")
+        failed = True
+    if median > args.budget:
+        print(f"\nFAIL: median import time {median:.3f}s is over the {args.budget:.3f}s budget")
+        failed = True
+    if not failed:
+        print(f"\nOK: within the {args.budget:.3f}s budget")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
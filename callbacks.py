@@ -1,13 +1,18 @@
-from dash import Dash, Input, Output, State, dcc, html, callback, callback_context, ctx 
-from layouts import sidebar, CONTENT_STYLE, SIDEBAR_STYLE, SIDEBAR_COLLAPSED, CONTENT_COLLAPSED
+from dash import Dash, Input, Output, State, dcc, html, callback, clientside_callback, ClientsideFunction
 
 from data_utils import get_alerts_data
+from live_updates import version_store_id
+from columnar import to_columns
 import pandas as pd
 
 
 
+#Sidebar and bins submenu callbacks only change UI state, so they run in the browser
+#See ui.toggle_or_load_sidebar and ui.toggle_bins_submenu in assets/clientside.js
+
 #Callback for sidebar collapse to just icons
-@callback(
+clientside_callback(
+	ClientsideFunction(namespace="ui", function_name="toggle_or_load_sidebar"),
 	#Change the sidebar's width and padding
 	Output("sidebar", "style"),
 	#Change the content's margin-left
@@ -19,22 +24,12 @@ import pandas as pd
 
 	Input("sidebar-state", "data"),
 	Input("btn-collapse", "n_clicks"),
+	State("layout-styles-store", "data"), #Sidebar/content styles from layouts.py
 )
-def toggle_or_load_sidebar(sidebar_state, n):
-    triggered_id = ctx.triggered_id
-    collapsed = sidebar_state.get("collapsed", False)
-
-    if triggered_id == "btn-collapse":
-        collapsed = not collapsed
-
-    class_name = "sidebar collapsed" if collapsed else "sidebar"
-    sidebar_style = SIDEBAR_COLLAPSED if collapsed else SIDEBAR_STYLE
-    content_style = CONTENT_COLLAPSED if collapsed else CONTENT_STYLE
-
-    return sidebar_style, content_style, {"collapsed": collapsed}, class_name
 
 #Callback for bin submenu to show/hide the links, rotate caret icon, floating box when sidebar collapsed
-@callback(
+clientside_callback(
+	ClientsideFunction(namespace="ui", function_name="toggle_bins_submenu"),
 	Output("bins-collapse", "className"), #Change the class of the bins submenu to show/hide it
 	Output("bins-toggle-icon", "className"), #Change the class of the caret icon to rotate it
 	Output("bins-floating-submenu", "style"), #Change the style of the floating box to show/hide it
@@ -49,66 +44,17 @@ def toggle_or_load_sidebar(sidebar_state, n):
 	State("bins-collapse", "className"), #Get the current class of the bins submenu
 	State("bins-submenu-state", "data") #Get the current bins submenu state
 )
-def toggle_bins_submenu(n, sidebar_state, pathname, outside_clicks, current_class, bins_submenu_state):
-    ctx = callback_context  #Get the context of the callback
-    triggered_id = ctx.triggered_id
-
-    submenu_was_open = bins_submenu_state["open"]
-    collapsed = sidebar_state["collapsed"]
-
-    #Function to set the overlay visibility
-	#Used to hide the floating submenu when clicking outside of it
-    def get_overlay_style(submenu_open):
-        return {"display": "block" if submenu_open else "none",
-                "position": "fixed",
-                "top": 0, "left": 0, "width": "100vw", "height": "100vh",
-                "zIndex": 999, "backgroundColor": "transparent"}
-
-    # === CASE: Click outside floating submenu (outside overlay clicked) ===
-    if triggered_id == "outside-click-overlay" and submenu_was_open:
-        return "slide-toggle", "bi bi-caret-down-fill caret-icon", {"display": "none"}, {"open": False}, {"display": "none"}
 
-    # === CASE: URL changed, close floating submenu ===
-    if triggered_id == "url" and submenu_was_open:
-        return "slide-toggle", "bi bi-caret-down-fill caret-icon", {"display": "none"}, {"open": False}, {"display": "none"}
 
-    # === CASE: Sidebar expanded while floating submenu was open ===
-    if triggered_id == "sidebar-state" and submenu_was_open and not collapsed:
-        return "slide-toggle open", "bi bi-caret-down-fill caret-icon rotate", {"display": "none"}, {"open": True}, {"display": "none"}
-
-    # === CASE: Toggle button clicked ===
-    if triggered_id == "bins-toggle":
-        submenu_open = not submenu_was_open
-
-        #Determine caret icon rotation class
-        caret_class = "bi bi-caret-down-fill caret-icon"
-        if submenu_open:
-            caret_class += " rotate" if not collapsed else " rotate-right"
-
-        #Handle floating submenu based on sidebar state (collapsed)
-        if collapsed:
-            floating_style = {
-                "display": "block" if submenu_open else "none",
-                "position": "fixed", #make the submenu anchor to screen
-                "top": "17.8rem", #Vertical position next to Bin icon
-                "left": "5rem",
-                "zIndex": 9000,
-                "backgroundColor": "#542978",
-                "padding": "0.5rem 1rem",
-                "boxShadow": "2px 4px 10px rgba(0, 0, 0, 0.3)",
-                "borderRadius": "10px", #rounded border
-                "minWidth": "200px"
-            }
-            #Show overlay when submenu is open
-            overlay_style = get_overlay_style(submenu_open)
-            return "slide-toggle", caret_class, floating_style, {"open": submenu_open}, overlay_style
-
-        #If sidebar is expanded, hide the floating submenu
-        return "slide-toggle open" if submenu_open else "slide-toggle", caret_class, {"display": "none"}, {"open": submenu_open}, {"display": "none"}
-
-    #Default fallback (return current state)
-    return "slide-toggle", "bi bi-caret-down-fill caret-icon", {"display": "none"}, {"open": submenu_was_open}, {"display": "none"}
 
+###################################################################
+# Open the server push stream for dataset versions once the app has loaded (see live_updates.py)
+###################################################################
+clientside_callback(
+	ClientsideFunction(namespace="ui", function_name="start_live_updates"),
+	Output("live-updates-connection", "data"),
+	Input("url", "pathname"),
+)
 
 
 ###################################################################
@@ -116,9 +62,9 @@ def toggle_bins_submenu(n, sidebar_state, pathname, outside_clicks, current_clas
 ###################################################################
 @callback(
         Output("alerts-data-store", "data"),
-        Input("alerts-data-update-interval", "n_intervals"), #Auto update every 15 minutes
+        Input(version_store_id("alerts_data"), "data"), #On load and whenever the alerts change
 )
 def store_alerts_data(_): #don't care about actual parameter values
     df = get_alerts_data()
-    return df.to_dict("records")
+    return to_columns(df, "alerts-data-store") #Sent in columns, read back with columnar.from_columns
 
@@ -0,0 +1,136 @@
+#Columnar wire format for large table payloads.
+#df.to_dict("records") repeats every column name in every row, so the big tables and
+#stores are sent as one array per column instead:
+#
+#    {"columns": ["bin_id", "timestamp", ...], "values": [[1, 2, ...], [1714550400000, 60000, ...], ...],
+#     "length": 2, "times": {"timestamp": "delta"}}
+#
+#Datetime columns are sent as epoch milliseconds. "delta" columns hold the first value and
+#then the difference to the previous value, so regular readings become small repeated numbers.
+#DataTables get their data from a "<table id>-columns" store that the browser expands
+#(ui.expand_columns in assets/clientside.js), stores read by server callbacks are expanded
+#with from_columns().
+#
+#Set PAYLOAD_MEASURE=1 to log the size of each payload as records and as columns.
+import json
+import logging
+import os
+
+import pandas as pd
+from dash import dcc, clientside_callback, ClientsideFunction, Input, Output
+
+logger = logging.getLogger(__name__)
+
+#Log records vs columnar bytes for every payload
+PAYLOAD_MEASURE = os.getenv("PAYLOAD_MEASURE", "0") == "1"
+#name -> [payloads, records bytes, columnar bytes] measured by this process
+PAYLOAD_SIZES = {}
+
+
+###################################################################
+# Encoding
+###################################################################
+
+#Epoch milliseconds of a datetime column, None for missing values
+def _epoch_ms(series):
+    if getattr(series.dt, "tz", None) is not None:
+        series = series.dt.tz_convert("UTC").dt.tz_localize(None)
+    missing = series.isna().to_numpy()
+    ms = series.to_numpy(dtype="datetime64[ns]").astype("int64") // 1_000_000
+    return [None if gone else int(value) for value, gone in zip(ms, missing)]
+
+#Difference of each value to the previous non-missing one (the first is kept as is)
+def _delta(values):
+    encoded, previous = [], 0
+    for value in values:
+        if value is None:
+            encoded.append(None)
+        else:
+            encoded.append(value - previous)
+            previous = value
+    return encoded
+
+def _undelta(values):
+    decoded, previous = [], 0
+    for value in values:
+        if value is None:
+            decoded.append(None)
+        else:
+            previous += value
+            decoded.append(previous)
+    return decoded
+
+#Columnar payload of df. delta_times: delta encode datetime columns
+#name: label for PAYLOAD_MEASURE
+def to_columns(df, name=None, delta_times=True):
+    columns, values, times = [], [], {}
+    for column in df.columns:
+        series = df[column]
+        columns.append(str(column))
+        if pd.api.types.is_datetime64_any_dtype(series):
+            ms = _epoch_ms(series)
+            times[str(column)] = "delta" if delta_times else "epoch"
+            values.append(_delta(ms) if delta_times else ms)
+        else:
+            series = series.astype(object)
+            values.append(series.where(series.notna(), None).tolist())
+
+    payload = {"columns": columns, "values": values, "length": len(df), "times": times}
+    if PAYLOAD_MEASURE:
+        measure(name or "unnamed", df, payload)
+    return payload
+
+#DataFrame back from a columnar payload (datetime columns come back as datetimes)
+#Also accepts records, for data saved before the columnar format
+def from_columns(payload):
+    if not payload:
+        return pd.DataFrame()
+    if isinstance(payload, list):
+        return pd.DataFrame(payload)
+
+    data = {}
+    for column, values in zip(payload["columns"], payload["values"]):
+        encoding = payload["times"].get(column)
+        if encoding:
+            ms = _undelta(values) if encoding == "delta" else values
+            values = pd.to_datetime(pd.Series(ms, dtype="float64"), unit="ms")
+        data[column] = values
+    return pd.DataFrame(data, columns=payload["columns"])
+
+
+###################################################################
+# Measurement (PAYLOAD_MEASURE=1)
+###################################################################
+def _json_bytes(value):
+    return len(json.dumps(value, default=str, separators=(",", ":")).encode())
+
+def measure(name, df, payload):
+    records = _json_bytes(df.to_dict("records"))
+    columnar = _json_bytes(payload)
+    totals = PAYLOAD_SIZES.setdefault(name, [0, 0, 0])
+    totals[0] += 1
+    totals[1] += records
+    totals[2] += columnar
+    logger.info(
+        "%s: %d rows, %d bytes as records, %d bytes as columns (%.1fx smaller)",
+        name, len(df), records, columnar, records / max(columnar, 1),
+    )
+
+
+###################################################################
+# DataTables fed from a columnar store
+###################################################################
+def columns_store_id(table_id):
+    return f"{table_id}-columns"
+
+#Put this next to the DataTable in the layout, callbacks output to_columns(df) to it
+def columnar_store(table_id):
+    return dcc.Store(id=columns_store_id(table_id))
+
+#Expand the store into the DataTable's data in the browser
+def register_columnar_table(table_id):
+    clientside_callback(
+        ClientsideFunction(namespace="ui", function_name="expand_columns"),
+        Output(table_id, "data"),
+        Input(columns_store_id(table_id), "data"),
+    )
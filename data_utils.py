@@ -1,8 +1,11 @@
 import pandas as pd
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from datetime import datetime, timedelta
+from contextlib import contextmanager
 import os
 
+from shared_cache import shared_dataset
+
 #MySQL credentials
 username = os.getenv('DB_USER')
 password = os.getenv('DB_PASSWORD')
@@ -17,9 +20,51 @@ engine = create_engine(
     pool_pre_ping=True  #auto-check if connection is still alive
 )
 
+########################################################
+# Guard against database access while the app is starting up
+# Page modules are imported by every worker on boot, so a query there would make
+# startup wait on MySQL. app.py imports the pages inside no_database_access(), and
+# any connection or query attempted inside it raises DatabaseAccessBlocked.
+########################################################
+class DatabaseAccessBlocked(RuntimeError):
+    pass
+
+_database_blocked_reason = None
+
+@contextmanager
+def no_database_access(reason):
+    global _database_blocked_reason
+    previous_reason = _database_blocked_reason
+    _database_blocked_reason = reason
+    try:
+        yield
+    finally:
+        _database_blocked_reason = previous_reason
+
+#Runs before a new connection is opened and before every query
+def _check_database_access(*args, **kwargs):
+    if _database_blocked_reason is not None:
+        raise DatabaseAccessBlocked(
+            f"Database accessed while {_database_blocked_reason}. "
+            "Load data inside a callback or layout function instead."
+        )
+
+event.listen(engine, "do_connect", _check_database_access)
+event.listen(engine, "before_cursor_execute", _check_database_access)
+
+########################################################
+# Datasets marked @shared_dataset are cached in shared_cache.py for all workers and
+# kept fresh by the background refresher (refresher.py) on these cadences (seconds),
+# so callbacks read the latest snapshot instead of querying
+########################################################
+LIVE_DATA_REFRESH = 60 #latest fill levels, fill stats, alerts
+SLOW_DATA_REFRESH = 300 #recently emptied bins, sensor health, bin metadata
+WEEKLY_STATS_REFRESH = 3600 #weekly collection stats
+
 ########################################################
 # Get current fill level stats for home page widget
 ########################################################
+@shared_dataset("fill_level_stats", refresh_every=LIVE_DATA_REFRESH)
 def get_fill_level_stats():
     query = """
         WITH ranked_fill AS (
@@ -53,6 +98,7 @@ def get_fill_level_stats():
 #############################################################
 # Get bins recently emptied for home page widget
 #############################################################
+@shared_dataset("recently_emptied_bins", refresh_every=SLOW_DATA_REFRESH)
 def get_recently_emptied_bins():
     query = """
     WITH fill_changes AS (
@@ -106,11 +152,33 @@ def get_recently_emptied_bins():
     return df   
 
 
+#############################################################
+# Bin metadata (IDs, addresses, coordinates) without sensor readings
+# Cheap query used to build the bin ID/address search index and the browser's reference cache
+#############################################################
+@shared_dataset("bin_metadata", refresh_every=SLOW_DATA_REFRESH)
+def get_bin_metadata():
+    query = """
+    SELECT DISTINCT
+        b.bin_id,
+        b.bin_location,
+        b.bin_type,
+        b.bin_latitude AS latitude,
+        b.bin_longitude AS longitude
+    FROM bin_table b
+    WHERE EXISTS (SELECT 1 FROM sensor_table r WHERE r.bin_id = b.bin_id) -- Same bins as get_bin_data()
+    ORDER BY b.bin_id
+    """
+    df = pd.read_sql(query, engine)
+    return df
+
+
 #############################################################
 # Mini Map card
 #############################################################
 
 #Create the function to fetch bin locations and fill levels from database
+@shared_dataset("bin_data", refresh_every=LIVE_DATA_REFRESH)
 def get_bin_data():
     query = """
     WITH ranked_sensor_data AS (
@@ -228,6 +296,7 @@ def get_top_fullest_bins(n=5): #get 5 results by default
 #############################################################
 #Function for getting weekly bin collection stats
 #Where week=0 gets data for current week, -1 for last week
+@shared_dataset("weekly_collection_stats", refresh_every=WEEKLY_STATS_REFRESH, refresh_args=[(0,), (-1,)])
 def get_weekly_collection_stats(week=0):
     query = """
         WITH fill_changes AS (
@@ -300,6 +369,7 @@ def get_weekly_collection_stats(week=0):
 # To get following: bin id, fill level, location, bin type, last emptied
 # New columns: bin_status, bin height, temperature, 
 
+@shared_dataset("complete_bin_table", refresh_every=LIVE_DATA_REFRESH)
 def get_complete_bin_table():
     bin_data = get_bin_data() #fetches bin id, fill level, location, timestamp
 
@@ -434,10 +504,11 @@ def get_collection_history(bin_id):
 
     else: #if it's empty return the columns still
         df = pd.DataFrame(columns=[
-            'bin_id', 'collection_timestamp_string', 'fill_level', 'time_since_full_string', 'time_since_full'
+            'bin_id', 'collection_timestamp', 'collection_timestamp_string', 'fill_level', 'time_since_full_string', 'time_since_full'
         ])
 
-    return df[['bin_id', 'collection_timestamp_string', 'fill_level', 'time_since_full_string', 'time_since_full']]
+    #The raw collection_timestamp is kept for the JSON API (api.py), the tables show the string
+    return df[['bin_id', 'collection_timestamp', 'collection_timestamp_string', 'fill_level', 'time_since_full_string', 'time_since_full']]
 
 
 
@@ -480,10 +551,58 @@ def get_bin_fill_history(bin_id):
     return df[['bin_id', 'fill_level_change_string', 'timestamp_string', 'fill_level_display', 'fill_level', 'timestamp', 'fill_level_change']]
 
 
+#############################################################
+# Raw fill readings of a bin between two times (for the JSON API in api.py)
+#start/end: datetimes, None for no bound. Newest readings first, at most limit rows
+#############################################################
+def get_bin_fill_history_range(bin_id, start=None, end=None, limit=5000):
+    query = """
+        SELECT
+            bin_id,
+            timestamp,
+            fill_level
+        FROM sensor_table
+        WHERE bin_id = %s
+          AND timestamp >= %s
+          AND timestamp < %s
+        ORDER BY timestamp DESC
+        LIMIT %s
+    """
+    start = start if start is not None else datetime(1970, 1, 1)
+    end = end if end is not None else datetime(9999, 12, 31)
+    df = pd.read_sql(query, engine, params=(bin_id, start, end, int(limit)))
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    return df
+
+
+
+#############################################################
+# Raw fill readings of many bins between two times (for fleet_reports.py)
+#One query for a whole group of bins instead of one per bin and report, oldest first per bin
+#############################################################
+def get_fill_readings(bin_ids, start, end):
+    placeholders = ", ".join(["%s"] * len(bin_ids))
+    query = f"""
+        SELECT
+            bin_id,
+            timestamp,
+            fill_level
+        FROM sensor_table
+        WHERE bin_id IN ({placeholders})
+          AND timestamp >= %s
+          AND timestamp < %s
+        ORDER BY bin_id, timestamp
+    """
+    df = pd.read_sql(query, engine, params=(*[int(bin_id) for bin_id in bin_ids], start, end))
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    return df
+
+
 
 #############################################################
 # Get alerts table data
 #############################################################
+@shared_dataset("alerts_data", refresh_every=LIVE_DATA_REFRESH)
 def get_alerts_data():
     query = """
         SELECT
@@ -526,6 +645,7 @@ def get_alerts_data():
 #############################################################
 # Get Sensor Health data for alerts page
 #############################################################
+@shared_dataset("sensor_health", refresh_every=SLOW_DATA_REFRESH)
 def get_sensor_health_data():
     query = """
         SELECT 
@@ -560,152 +680,3 @@ def get_sensor_health_data():
     df['inactive_sensor'] = df['inactive_sensor'].astype(str).str.lower()
 
     return df[['bin_id', 'sensor_id', 'battery_voltage', 'temperature', 'last_seen', 'bin_status', 'inactive_sensor']]
-
-
-#############################################################
-# Get timestamps when bins reached 80% Fill level
-# Time from when bin was <= 10% full to 80% full
-#############################################################
-def get_time_to_80_data(bin_id):
-    query = """
-        WITH fill_changes AS (
-            SELECT 
-                bin_id,
-                timestamp,
-                fill_level,
-                LAG(fill_level) OVER (PARTITION BY bin_id ORDER BY timestamp) AS prev_fill,
-                LAG(timestamp) OVER (PARTITION BY bin_id ORDER BY timestamp) AS prev_time
-            FROM sensor_table
-            WHERE bin_id = %s
-        ),
-
-        empties AS (
-            SELECT 
-                bin_id,
-                timestamp AS start_time
-            FROM fill_changes
-            WHERE fill_level <= 10 AND (prev_fill IS NULL OR prev_fill > 10)
-        ),
-
-        fulls AS (
-            SELECT 
-                bin_id,
-                timestamp AS end_time
-            FROM fill_changes
-            WHERE fill_level >= 80 AND (prev_fill IS NULL OR prev_fill < 80)
-        ),
-
-        paired_events AS (
-            SELECT 
-                e.start_time,
-                MIN(f.end_time) AS full_time
-            FROM empties e
-            JOIN fulls f
-              ON f.end_time > e.start_time
-            GROUP BY e.start_time
-        )
-
-        SELECT 
-            start_time AS emptied_at,
-            full_time AS full_at,
-            TIMESTAMPDIFF(MINUTE, start_time, full_time) AS time_to_fill
-        FROM paired_events
-        ORDER BY full_at
-        LIMIT 100
-    """
-
-    df = pd.read_sql(query, engine, params=(bin_id,))
-
-    if not df.empty:
-        df['full_at'] = pd.to_datetime(df['full_at'])
-        #Get the date only to group by date
-        df['date'] = df['full_at'].dt.date
-
-    else:
-        df = pd.DataFrame(columns=["emptied_at", "full_at", "time_to_fill", "date"])
-
-    return df
-
-
-#############################################################
-# Get timestamps for each time bin was emptied
-# empty event = where current fill level is <=30 and prev_fill was >30%,
-# And is used to determine collections
-#############################################################
-def get_daily_bin_collections(bin_id):
-    query = """
-        WITH fill_changes AS (
-            SELECT
-                bin_id,
-                timestamp,
-                fill_level,
-                LAG(fill_level) OVER (PARTITION BY bin_id ORDER BY timestamp) AS prev_fill
-            FROM sensor_table
-            WHERE bin_id = %s
-        )
-        SELECT
-            bin_id,
-            timestamp
-        FROM fill_changes
-        WHERE fill_level <= 30 AND (prev_fill IS NULL OR prev_fill > 30)
-    """
-    df = pd.read_sql(query, engine, params=(bin_id,))
-
-    if not df.empty:
-        #Format timestamp column to datetime for handling
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        #Get the date only to group by date
-        df['date'] = df['timestamp'].dt.date
-
-    else:
-        df = pd.DataFrame(columns=['bin_id', 'timestamp', 'date'])
-
-    return df
-
-
-#############################################################
-# Get AVG fill level increase per hour for heat map
-# Grouped by each day of the week
-# Also filter df by month
-#############################################################
-def get_bin_fill_heatmap_data(bin_id, selected_month):
-    query = """
-        WITH fill_changes AS (
-            SELECT
-                bin_id,
-                timestamp,
-                fill_level,
-                LAG(fill_level) OVER (PARTITION BY bin_id ORDER BY timestamp) AS prev_fill
-            FROM sensor_table
-            WHERE bin_id = %s
-        ),
-        
-        hourly_changes AS (
-            SELECT
-                bin_id,
-                timestamp,
-                HOUR(timestamp) AS hour,
-                DAYNAME(timestamp) AS day_of_week,
-                (fill_level - prev_fill) AS fill_change
-            FROM fill_changes
-            WHERE prev_fill IS NOT NULL AND (fill_level - prev_fill) > 0 AND DATE_FORMAT(timestamp, '%%Y-%%m') = %s
-        )
-
-        SELECT 
-            day_of_week,
-            hour,
-            ROUND(AVG(fill_change), 1) AS avg_fill_change
-        FROM hourly_changes
-        GROUP BY day_of_week, hour
-    """
-    df = pd.read_sql(query, engine, params=(bin_id, selected_month))
-    
-    #Order days of the week properly (instead of alphabetical order)
-    day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-    #Make day_of_week column into categories and specify order
-    df['day_of_week'] = pd.Categorical(df['day_of_week'], categories=day_order, ordered=True)
-    
-    #Then sort the df rows by day of week first, then by hours ascending
-    df = df.sort_values(['day_of_week', 'hour'])
-
-    return df
\ No newline at end of file
@@ -0,0 +1,75 @@
+#Downsampling of long time series for the charts.
+#A bin sends a reading every few minutes, so a week is hundreds to thousands of points and a
+#year tens of thousands, more than a chart has pixels. Before plotting, the series is cut into one
+#time bucket per pixel column of the chart and only the lowest and highest reading of each
+#bucket are kept (min/max downsampling). Every fill peak and every emptying survives, so
+#the line looks the same as with all the points, and a chart never gets more than about
+#two points per pixel whatever the period.
+#
+#The only chart using it today is the one-week fill history line chart (pages/bin-fill-levels.py),
+#which only goes over the limit for bins reporting more often than every few minutes, so there
+#it is a guard against such bins rather than a saving on every draw.
+#
+#The chart's width in pixels comes from a "<graph id>-width" store that the browser fills in
+#(ui.chart_width in assets/clientside.js). Only the charts are downsampled, the exports and
+#the JSON API (api.py) still return every reading.
+import pandas as pd
+from dash import dcc, clientside_callback, ClientsideFunction, Input, Output
+
+#Width (pixels) assumed until the browser has reported the chart's width
+DEFAULT_CHART_WIDTH = 1000
+#Most buckets per chart, whatever its reported width (e.g. on a very wide screen)
+MAX_BUCKETS = 2000
+
+
+###################################################################
+# Downsampling
+###################################################################
+
+#Rows of df (sorted by x) keeping the lowest and highest value of each column in columns
+#in each of buckets equal time buckets, plus the first and last row, in x order
+#df is returned as is when it has no more rows than that already
+def minmax_downsample(df, x, columns, buckets):
+    buckets = max(1, min(int(buckets), MAX_BUCKETS))
+    if len(df) <= 2 * buckets * len(columns) + 2:
+        return df
+
+    df = df.reset_index(drop=True)
+    t = df[x].astype("int64") if pd.api.types.is_datetime64_any_dtype(df[x]) else df[x]
+    span = t.iloc[-1] - t.iloc[0]
+    #In float: (t - t0) * buckets overflows int64 nanoseconds over long spans
+    bucket = ((t - t.iloc[0]) / (span + 1) * buckets).astype(int).to_numpy()
+
+    keep = {0, len(df) - 1}
+    for column in columns:
+        #Missing values are left out, a bucket holding only those (e.g. the first fill level
+        #change, before which there is no reading) has no min or max to keep
+        values = df[column].dropna()
+        grouped = values.groupby(bucket[values.index])
+        keep.update(grouped.idxmin().astype(int))
+        keep.update(grouped.idxmax().astype(int))
+    return df.loc[sorted(keep)].reset_index(drop=True)
+
+
+###################################################################
+# Chart width reported by the browser
+###################################################################
+def chart_width_id(graph_id):
+    return f"{graph_id}-width"
+
+#Put this next to the dcc.Graph in the layout, callbacks read its data as the width in pixels
+def chart_width_store(graph_id):
+    return dcc.Store(id=chart_width_id(graph_id))
+
+#Fill the store with the graph's width when the page is opened
+def register_chart_width(graph_id):
+    clientside_callback(
+        ClientsideFunction(namespace="ui", function_name="chart_width"),
+        Output(chart_width_id(graph_id), "data"),
+        Input("url", "pathname"),
+        Input(chart_width_id(graph_id), "id"),
+    )
+
+#Buckets for a chart of this width (None: not reported yet)
+def chart_buckets(width):
+    return int(width) if width else DEFAULT_CHART_WIDTH
@@ -0,0 +1,43 @@
+#Process-wide cache of the fleet metadata (bin IDs, addresses, coordinates).
+#Page layouts and the search index read the bin list from here when they need it,
+#instead of querying the database when the page modules are imported.
+import threading
+import time
+
+from data_utils import get_bin_metadata
+from live_updates import current_version
+
+#How long (seconds) this process uses its copy before checking the shared cache again
+#(get_bin_metadata is a shared dataset, so this is a cheap read, not a query)
+METADATA_MAX_AGE_SECONDS = 30
+
+_metadata_lock = threading.Lock()
+_metadata = None
+_metadata_version = None
+_metadata_loaded_at = None
+
+
+#Return (metadata DataFrame, version), re-reading the metadata at most every METADATA_MAX_AGE_SECONDS
+#The version is the bin_metadata dataset version, which only changes when the metadata itself
+#changed, so callers can cache anything built from it
+def get_fleet_metadata():
+    global _metadata, _metadata_version, _metadata_loaded_at
+
+    with _metadata_lock:
+        now = time.monotonic()
+        if _metadata is None or now - _metadata_loaded_at > METADATA_MAX_AGE_SECONDS:
+            metadata = get_bin_metadata()
+            version = current_version("bin_metadata")
+            if version is None:
+                #Shared cache unreadable: a new version on every re-read, so nothing stays stale
+                version = ("unversioned", now)
+            if _metadata is None or version != _metadata_version:
+                _metadata = metadata
+                _metadata_version = version
+            _metadata_loaded_at = now
+        return _metadata, _metadata_version
+
+#Sorted distinct bin IDs of the fleet
+def get_fleet_bin_ids():
+    metadata, _ = get_fleet_metadata()
+    return sorted(metadata['bin_id'].dropna().unique().tolist())
@@ -0,0 +1,285 @@
+#Fleet-wide analytics report: the analytics page's reports (daily fill levels, time to 80% full,
+#weekly collections, collection times of day and hourly fill activity) for every bin, or the
+#bins of one suburb or bin type, over a period, in one Excel workbook or PDF bundle.
+#
+#    python fleet_reports.py --month 2025-05
+#    python fleet_reports.py --month 2025-05 --suburb Richmond --format pdf
+#    python fleet_reports.py --start 2025-04-01 --end 2025-07-01 --bin-type Recycling --workers 8
+#
+#The bins are split into chunks of CHUNK_BINS and each chunk is worked out in a process pool
+#from the rollup tables of all of its bins at once (rollups.read_period), so a long period
+#doesn't scan the raw readings. Every finished chunk is saved under CHECKPOINT_DIR, so an
+#interrupted run started again with the same options only works out the chunks that are
+#missing. The checkpoints are removed once the report is written. Progress is logged after
+#each chunk.
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from analytics_reports import excel_value, pdf_table, pdf_value
+from analytics_reports import daily_fill_levels, weekly_collections, hourly_collections, hourly_fill_activity
+from data_utils import engine, get_bin_metadata
+from rollups import read_period
+
+logger = logging.getLogger(__name__)
+
+#Bins per chunk, one query and one checkpoint each
+CHUNK_BINS = 25
+#Worker processes, each holds one database connection
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+#Finished chunks of unfinished runs, one folder per run (outside the repo, next to the other caches)
+CHECKPOINT_DIR = os.getenv(
+    "FLEET_REPORT_CHECKPOINTS",
+    os.path.join(tempfile.gettempdir(), "smart-bin-dashboard-cache", "fleet_reports"),
+)
+
+#Report name -> sheet/section title, in the order they are written
+REPORTS = {
+    "summary": "Summary",
+    "weekly_fill": "Daily Avg Fill Level",
+    "time_to_80": "Time to Reach 80% Full",
+    "collections": "Weekly Collections",
+    "collection_times": "Collection Times of Day",
+    "fill_activity": "Hourly Fill Activity",
+}
+
+
+###################################################################
+# Reports of a chunk of bins
+# Derived with the same functions as the analytics page's reports
+# (analytics_reports.py), for many bins at once
+###################################################################
+
+#One row per bin: readings, fill levels, collections and time to 80% over the period
+def summary(bins, period):
+    stats = period["daily"].groupby('bin_id').agg(readings=('readings', 'sum'), fill_sum=('fill_sum', 'sum'), max_fill=('fill_max', 'max'))
+    stats.insert(1, 'avg_fill', stats.pop('fill_sum') / stats['readings'])
+    stats['collections'] = period["hourly"].groupby('bin_id')['collections'].sum()
+    stats['avg_hours_to_80'] = period["cycles"].groupby('bin_id')['time_to_fill'].mean() / 60
+
+    by_hour = hourly_collections(period["hourly"])
+    if not by_hour.empty:
+        stats['busiest_collection_hour'] = by_hour.loc[by_hour.groupby('bin_id')['collections'].idxmax()].set_index('bin_id')['hour']
+
+    table = bins.merge(stats.reset_index(), on='bin_id', how='left')
+    table['readings'] = table['readings'].fillna(0).astype(int)
+    table['collections'] = table['collections'].fillna(0).astype(int)
+    return table.round({'avg_fill': 1, 'max_fill': 1, 'avg_hours_to_80': 1})
+
+
+#All reports of a chunk of bins (bins: bin_id, bin_location, bin_type), runs in a worker process
+def build_chunk(bins, start, end):
+    period = read_period(bins['bin_id'].tolist(), start, end)
+    return {
+        "summary": summary(bins, period),
+        "weekly_fill": daily_fill_levels(period["daily"]),
+        "time_to_80": period["cycles"],
+        "collections": weekly_collections(period["hourly"]),
+        "collection_times": hourly_collections(period["hourly"]),
+        "fill_activity": hourly_fill_activity(period["hourly"]),
+    }
+
+#Forked workers mustn't reuse the parent's database connections
+def _init_worker():
+    engine.dispose(close=False)
+
+
+###################################################################
+# Runs and checkpoints
+###################################################################
+
+#Bins to report on, filtered by suburb (part of the address) and bin type
+def select_bins(suburb=None, bin_type=None):
+    bins = get_bin_metadata()[['bin_id', 'bin_location', 'bin_type']]
+    if suburb:
+        bins = bins[bins['bin_location'].fillna("").str.contains(suburb, case=False, regex=False)]
+    if bin_type:
+        bins = bins[bins['bin_type'].fillna("").str.lower() == bin_type.lower()]
+    return bins.sort_values('bin_id').reset_index(drop=True)
+
+#Checkpoint folder of a run, the same options always get the same folder
+def run_dir(options):
+    key = hashlib.blake2b(json.dumps(options, sort_keys=True, default=str).encode(), digest_size=8).hexdigest()
+    return os.path.join(CHECKPOINT_DIR, key)
+
+def _chunk_path(folder, number):
+    return os.path.join(folder, f"chunk-{number:04d}.pkl")
+
+#Bins of the run, saved on the first start so a resumed run keeps the same chunks
+def _run_bins(folder, options):
+    manifest = os.path.join(folder, "manifest.json")
+    if os.path.exists(manifest):
+        with open(manifest) as file:
+            return pd.DataFrame(json.load(file)["bins"])
+
+    bins = select_bins(options["suburb"], options["bin_type"])
+    os.makedirs(folder, exist_ok=True)
+    with open(manifest + ".tmp", "w") as file:
+        json.dump({"options": options, "bins": bins.astype(object).where(bins.notna(), None).to_dict("records")}, file)
+    os.replace(manifest + ".tmp", manifest)
+    return bins
+
+#Reports of all selected bins, one table per report
+#progress(done, total): called after each finished chunk (done/total chunks)
+def build_fleet_reports(start, end, suburb=None, bin_type=None, workers=DEFAULT_WORKERS, restart=False, progress=None):
+    options = {"start": start, "end": end, "suburb": suburb, "bin_type": bin_type}
+    folder = run_dir(options)
+    if restart:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    bins = _run_bins(folder, options)
+    chunks = [bins.iloc[first:first + CHUNK_BINS] for first in range(0, len(bins), CHUNK_BINS)]
+    pending = [number for number in range(len(chunks)) if not os.path.exists(_chunk_path(folder, number))]
+    done = len(chunks) - len(pending)
+    if done:
+        logger.info("Resuming: %d of %d chunks already done", done, len(chunks))
+    logger.info("Reporting on %d bins in %d chunks with %d workers", len(bins), len(chunks), workers)
+
+    started = time.monotonic()
+    if pending:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending)), initializer=_init_worker) as pool:
+            futures = {pool.submit(build_chunk, chunks[number], start, end): number for number in pending}
+            for future in as_completed(futures):
+                number = futures[future]
+                path = _chunk_path(folder, number)
+                pd.to_pickle(future.result(), path + ".tmp")
+                os.replace(path + ".tmp", path) #only complete chunks are ever seen on resume
+
+                done += 1
+                finished = done - (len(chunks) - len(pending))
+                remaining = (time.monotonic() - started) / finished * (len(chunks) - done)
+                logger.info("%d/%d chunks done (%d bins), about %.0fs left", done, len(chunks), min(done * CHUNK_BINS, len(bins)), remaining)
+                if progress:
+                    progress(done, len(chunks))
+
+    parts = [pd.read_pickle(_chunk_path(folder, number)) for number in range(len(chunks))]
+    tables = {}
+    for name in REPORTS:
+        frames = [part[name] for part in parts if not part[name].empty]
+        tables[name] = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    return tables, folder
+
+
+###################################################################
+# Writers
+###################################################################
+
+#One sheet per report, in constant memory mode
+def write_workbook(tables, path):
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True, "default_date_format": "dd/mm/yyyy hh:mm"})
+    try:
+        for name, title in REPORTS.items():
+            df = tables[name]
+            sheet = workbook.add_worksheet(title[:31]) #Excel sheet names are at most 31 characters
+            sheet.write_row(0, 0, [str(column) for column in df.columns])
+            for row, values in enumerate(df.itertuples(index=False, name=None), start=1):
+                sheet.write_row(row, 0, [excel_value(value) for value in values])
+    finally:
+        workbook.close()
+
+#Rows of a table for pdf_table(), header first
+def _pdf_rows(df):
+    rows = [[str(column) for column in df.columns]]
+    rows += [["" if pd.isna(value) else pdf_value(value) for value in values] for values in df.itertuples(index=False, name=None)]
+    return rows
+
+#Cover page with the filters and the summary of every bin, then a page of reports per bin
+def write_pdf_bundle(tables, path, title, filters):
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
+
+    styles = getSampleStyleSheet()
+    story = [
+        Paragraph(title, styles["Title"]),
+        Paragraph(" | ".join(f"{name}: {value}" for name, value in filters.items() if value), styles["Normal"]),
+        Paragraph(f"Generated {datetime.now().strftime('%d/%m/%Y %H:%M')}", styles["Normal"]),
+        Spacer(1, 12),
+        Paragraph(REPORTS["summary"], styles["Heading2"]),
+        pdf_table(_pdf_rows(tables["summary"]), Table, TableStyle, colors),
+    ]
+
+    by_bin = {name: dict(tuple(df.groupby('bin_id'))) if not df.empty else {} for name, df in tables.items() if name != "summary"}
+    for bin_row in tables["summary"].itertuples(index=False):
+        location = "" if pd.isna(bin_row.bin_location) else bin_row.bin_location
+        bin_type = "" if pd.isna(bin_row.bin_type) else bin_row.bin_type
+        story += [PageBreak(), Paragraph(f"Bin #{bin_row.bin_id} - {location} ({bin_type})", styles["Heading1"])]
+        for name, groups in by_bin.items():
+            df = groups.get(bin_row.bin_id)
+            story.append(Paragraph(REPORTS[name], styles["Heading2"]))
+            if df is None or df.empty:
+                story.append(Paragraph("No data for this period.", styles["Italic"]))
+                continue
+            df = df.drop(columns=['bin_id'])
+            if name == "fill_activity":
+                #Day of week by hour, like the heatmap on the analytics page
+                df = df.pivot(index='day_of_week', columns='hour', values='avg_fill_change').reset_index()
+            story += [pdf_table(_pdf_rows(df), Table, TableStyle, colors), Spacer(1, 8)]
+
+    SimpleDocTemplate(path, pagesize=landscape(A4), title=title, leftMargin=36, rightMargin=36).build(story)
+
+
+#Previous calendar month, the default period
+def _last_month():
+    first = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return (first - timedelta(days=1)).strftime("%Y-%m")
+
+def _period(args):
+    if args.start or args.end:
+        if not (args.start and args.end):
+            raise SystemExit("--start and --end go together")
+        start, end = datetime.fromisoformat(args.start), datetime.fromisoformat(args.end)
+        label = f"{args.start} to {args.end}"
+    else:
+        month = args.month or _last_month()
+        start = datetime.strptime(month, "%Y-%m")
+        end = (start + timedelta(days=32)).replace(day=1)
+        label = month
+    if start >= end:
+        raise SystemExit("The period must start before it ends")
+    return start, end, label
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analytics reports for the whole fleet in one workbook or PDF")
+    parser.add_argument("--month", help="YYYY-MM, defaults to last month")
+    parser.add_argument("--start", help="first day of the period (YYYY-MM-DD), instead of --month")
+    parser.add_argument("--end", help="day after the period (YYYY-MM-DD)")
+    parser.add_argument("--suburb", help="only bins with this in their address")
+    parser.add_argument("--bin-type", help="only bins of this type")
+    parser.add_argument("--format", choices=["xlsx", "pdf"], default="xlsx")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="worker processes")
+    parser.add_argument("--out", help="output file, defaults to fleet_report_<period>.<format>")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoints of an earlier unfinished run")
+    args = parser.parse_args()
+
+    start, end, label = _period(args)
+    tables, folder = build_fleet_reports(start, end, args.suburb, args.bin_type, max(1, args.workers), args.restart)
+    if tables["summary"].empty:
+        raise SystemExit("No bins match the filters")
+
+    path = args.out or f"fleet_report_{label.replace(' ', '_')}.{args.format}"
+    if args.format == "xlsx":
+        write_workbook(tables, path)
+    else:
+        filters = {"Period": label, "Suburb": args.suburb, "Bin type": args.bin_type, "Bins": len(tables["summary"])}
+        write_pdf_bundle(tables, path, "Fleet Analytics Report", filters)
+    shutil.rmtree(folder, ignore_errors=True)
+    logger.info("Wrote %s", path)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    main()
@@ -0,0 +1,26 @@
+#Gunicorn settings, read automatically when gunicorn is started from the repo root
+#(e.g. the Render start command:  gunicorn app:server).
+#Each open tab keeps one /events stream open (live_updates.py) and a stream holds a thread
+#for up to MAX_STREAM_SECONDS, so sync workers would be used up by a handful of tabs.
+#Threaded workers give every stream its own thread. Idle stream threads only sleep, so each
+#worker gets a thread for every tab the deployment is sized for (MAX_OPEN_TABS) plus
+#CALLBACK_THREADS for the callbacks, the API and exports. Gunicorn doesn't spread the streams
+#evenly over the workers, so every worker is sized as if it held all of them.
+#
+#Limit: with more than MAX_OPEN_TABS tabs open, the streams can take the callback threads and
+#callbacks queue behind them. Raise MAX_OPEN_TABS (env) above the expected number of tabs.
+#Override with GUNICORN_WORKERS / MAX_OPEN_TABS / CALLBACK_THREADS, or on the command line.
+import os
+
+#Open tabs (each with one /events stream) every worker must be able to hold
+MAX_OPEN_TABS = int(os.getenv("MAX_OPEN_TABS", "200"))
+#Threads per worker kept for everything but the streams
+CALLBACK_THREADS = int(os.getenv("CALLBACK_THREADS", "16"))
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+worker_class = "gthread"
+threads = MAX_OPEN_TABS + CALLBACK_THREADS
+#A stream sends data at least every KEEPALIVE_SECONDS and closes after MAX_STREAM_SECONDS,
+#this only catches requests that hang
+timeout = 120
@@ -37,6 +37,14 @@ CONTENT_STYLE = {
 CONTENT_COLLAPSED = CONTENT_STYLE.copy()
 CONTENT_COLLAPSED["margin-left"] = "6rem"
 
+#All the sidebar/content styles, handed to the clientside sidebar callback through a dcc.Store
+LAYOUT_STYLES = {
+    "sidebar": SIDEBAR_STYLE,
+    "sidebar_collapsed": SIDEBAR_COLLAPSED,
+    "content": CONTENT_STYLE,
+    "content_collapsed": CONTENT_COLLAPSED,
+}
+
 ###########################################################
 #Component Creation
 ###########################################################
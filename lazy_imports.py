@@ -0,0 +1,37 @@
+#Deferred imports for heavy modules that are only needed inside callbacks.
+#plotly.express and plotly.graph_objects take a large share of a worker's cold start,
+#but no page draws a figure until its first callback runs. The proxies below import
+#the real module the first time one of its attributes is used, e.g. go.Figure().
+#Only plotly.express is kept out of startup: Dash itself imports plotly.graph_objects
+#(dash/dcc/Graph.py) when the app imports dcc, so deferring go saves nothing at startup.
+#go stays a proxy so the pages import both the same way.
+import importlib
+import threading
+
+#Modules that must not be imported while the app starts (checked by benchmarks/startup_benchmark.py)
+DEFERRED_MODULES = ["plotly.express"]
+
+
+class LazyModule:
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+px = LazyModule("plotly.express")
+go = LazyModule("plotly.graph_objects")
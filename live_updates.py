@@ -0,0 +1,172 @@
+#Server push of dataset versions over Server-Sent Events (/events).
+#Instead of every tab polling with its own dcc.Interval, each tab keeps one EventSource
+#open (ui.start_live_updates in assets/clientside.js). The server sends the version of
+#each live dataset whenever it changes, the browser copies changed versions into the
+#"dataset-version-<name>" stores in the app layout, and only the widgets with that store
+#as an Input refresh.
+#
+#Tabs only keep the stream open while they are visible and in use. Hidden tabs and tabs
+#without input for 10 minutes close it and reopen it when they are looked at again, which
+#refreshes whatever changed meanwhile once. Every tab also sends a heartbeat with its state
+#(active, idle or hidden) to /sessions/heartbeat, and GET /sessions returns the counts.
+#
+#A stream keeps a request open, so gunicorn runs threaded workers (gunicorn.conf.py) and
+#each stream holds one thread rather than a whole worker. The threads are sized for
+#MAX_OPEN_TABS open tabs, beyond that the streams can hold up the callbacks. Streams close after
+#MAX_STREAM_SECONDS and the browser reconnects by itself, so a thread is never held forever.
+import json
+import logging
+import sqlite3
+import time
+
+from dash import dcc, ctx
+from dash.exceptions import PreventUpdate
+from flask import Response, stream_with_context, request, jsonify
+
+from shared_cache import dataset_versions, record_session, session_counts
+
+logger = logging.getLogger(__name__)
+
+#Datasets (shared_dataset names in data_utils.py) whose versions are pushed to the browser
+LIVE_DATASETS = [
+    "bin_data", #latest fill level per bin (maps, fill history, collection history)
+    "complete_bin_table",
+    "fill_level_stats",
+    "recently_emptied_bins",
+    "weekly_collection_stats",
+    "alerts_data",
+    "sensor_health",
+    "bin_metadata", #bin IDs, addresses and coordinates, revalidates the browser's reference cache (reference_data.py)
+]
+#How often (seconds) a stream checks the shared cache for new versions
+POLL_SECONDS = 2
+#Send a comment line this often so proxies don't close an idle stream
+KEEPALIVE_SECONDS = 15
+#Close the stream after this long, the browser reconnects (and gets the current versions)
+MAX_STREAM_SECONDS = 300
+#How long (ms) the browser waits before reconnecting after the stream closes
+RECONNECT_MS = 3000
+#How often each tab sends a heartbeat (HEARTBEAT_MS in assets/clientside.js)
+HEARTBEAT_SECONDS = 60
+#Sessions without a heartbeat for this long are closed (browsers may slow timers in hidden tabs)
+SESSION_TIMEOUT_SECONDS = 5 * HEARTBEAT_SECONDS
+SESSION_STATES = ("active", "idle", "hidden")
+
+
+def version_store_id(name):
+    return f"dataset-version-{name}"
+
+#Stores for the app layout, set by the browser when a dataset's version changes
+def version_stores():
+    return [dcc.Store(id=version_store_id(name)) for name in LIVE_DATASETS]
+
+
+###################################################################
+# Version aware callbacks
+###################################################################
+#A widget keeps the version of the data it last rendered in its own store. When a pushed
+#version is one the widget already shows (e.g. the first push after the page loaded),
+#its callback stops at a version compare instead of querying and resending its data.
+#
+#    @callback(
+#        Output("my-table", "data"),
+#        Output(rendered_version_id("my-table"), "data"),
+#        Input("my-table", "id"),
+#        Input(version_store_id("bin_data"), "data"),
+#        State(rendered_version_id("my-table"), "data"),
+#    )
+#    def update_my_table(_, data_version, rendered_version):
+#        version = render_version("bin_data", data_version, rendered_version)
+#        return get_bin_data().to_dict("records"), version
+
+def rendered_version_id(widget_id):
+    return f"{widget_id}-rendered-version"
+
+#Store holding the dataset version a widget last rendered, place it next to the widget
+def rendered_version_store(widget_id):
+    return dcc.Store(id=rendered_version_id(widget_id))
+
+#Current version of a live dataset, numbered like the versions pushed to the browser
+#None if the shared cache can't be read, the widget then just re-renders on the next push
+def current_version(name):
+    try:
+        return dataset_versions([name])[name]
+    except sqlite3.Error:
+        logger.exception("Could not read the version of %s", name)
+        return None
+
+#Call at the top of a version aware callback, before reading the data
+#Raises PreventUpdate when the callback was triggered by a version push the widget has already
+#rendered, otherwise returns the version to store as rendered. The version is read before the
+#data, so the data is never older than the stored version and the next push still re-renders it
+def render_version(name, data_version, rendered_version):
+    if (
+        ctx.triggered_id == version_store_id(name)
+        and data_version is not None
+        and rendered_version is not None
+        and data_version <= rendered_version
+    ):
+        raise PreventUpdate
+    return current_version(name)
+
+
+#Text of one SSE event
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def event_stream():
+    yield f"retry: {RECONNECT_MS}\n\n"
+
+    started = last_sent = time.monotonic()
+    last_versions = None
+    while time.monotonic() - started < MAX_STREAM_SECONDS:
+        versions = dataset_versions(LIVE_DATASETS)
+        if versions != last_versions:
+            yield format_event("versions", versions)
+            last_versions = versions
+            last_sent = time.monotonic()
+        elif time.monotonic() - last_sent >= KEEPALIVE_SECONDS:
+            yield ": keep-alive\n\n"
+            last_sent = time.monotonic()
+        time.sleep(POLL_SECONDS)
+
+
+#Add the /events and /sessions routes to the Flask server
+def register_live_updates(server):
+    @server.route("/events")
+    def dataset_events():
+        return Response(
+            stream_with_context(event_stream()),
+            mimetype="text/event-stream",
+            headers={
+                "Cache-Control": "no-cache",
+                "X-Accel-Buffering": "no", #don't let nginx buffer the stream
+            },
+        )
+
+    @server.route("/sessions/heartbeat", methods=["POST"])
+    def session_heartbeat():
+        heartbeat = request.get_json(force=True, silent=True) or {}
+        session_id = heartbeat.get("session_id")
+        state = heartbeat.get("state")
+        if not isinstance(session_id, str) or not 0 < len(session_id) <= 64 or state not in SESSION_STATES:
+            return "", 400
+        try:
+            record_session(session_id, state)
+        except sqlite3.Error:
+            logger.exception("Could not record session heartbeat")
+        return "", 204
+
+    #Number of open tabs by state, e.g. {"active": 3, "idle": 5, "hidden": 12, "total": 20}
+    @server.route("/sessions")
+    def session_activity():
+        counts = dict.fromkeys(SESSION_STATES, 0)
+        try:
+            counts.update(session_counts(SESSION_TIMEOUT_SECONDS))
+        except sqlite3.Error:
+            logger.exception("Could not count sessions")
+        counts["total"] = sum(counts[state] for state in SESSION_STATES)
+        logger.info("Dashboard sessions: %s", counts)
+        return jsonify(counts)
+
+    return dataset_events
@@ -0,0 +1,286 @@
+#Shared map marker pipeline for the mini map (index.py) and large map (bin-map.py).
+#Everything that depends on the bin data (duplicate offsets, icon colours, "last updated"
+#text) is worked out column-wise on the DataFrame in one pass, then the markers are
+#emitted straight from the resulting column lists instead of looping with iterrows().
+#The "last updated" age in the popups is kept current by the browser (refreshRelativeAges in
+#assets/clientside.js) from the time of the reading, so a marker only has to be resent when
+#its reading changes.
+import hashlib
+import logging
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+import dash_leaflet as dl
+from dash import html, Patch, no_update
+
+from shared_cache import save_state, load_state
+
+logger = logging.getLogger(__name__)
+
+#Colour-coded icons from assets folder
+MARKER_ICON_URLS = {
+    'green': '/assets/bin_icon_green.png',
+    'yellow': '/assets/bin_icon_yellow.png',
+    'orange': '/assets/bin_icon_orange.png',
+    'red': '/assets/bin_icon_red.png',
+    'bright_red': '/assets/bin_icon_bright_red.png',
+    'black': '/assets/bin_icon_black.png',
+}
+
+#Longitude offset for each extra bin at the same position, about 5 metres per marker
+OFFSET_STEP = 0.00013
+
+#Popup text style shared by both maps
+POPUP_STYLE = {
+    "fontFamily": "'Segoe UI', 'Arial Unicode MS', 'Helvetica', sans-serif",
+    "fontSize": "1em",
+    "lineHeight": "1.4",
+    "padding": "2px",
+}
+
+#Popup rows for each map as (label, column in the marker frame, value text style)
+MINIMAP_POPUP_FIELDS = [
+    ("Bin ID: ", "bin_id", None),
+    ("Fill Level: ", "fill_level_text", None),
+    ("Address: ", "bin_location", {"fontSize": "0.9em"}),
+]
+LARGE_MAP_POPUP_FIELDS = [
+    ("Bin ID: ", "bin_id", None),
+    ("Fill Level: ", "fill_level_text", None),
+    ("Bin Type: ", "bin_type", None),
+    ("Last Emptied on: ", "last_emptied_string", None),
+    ("Address: ", "bin_location", {"fontSize": "0.9em"}),
+]
+
+
+###################################################################
+# Column-wise helpers
+###################################################################
+
+#Colour category for every fill level at once, same thresholds as data_utils.get_marker_colour
+#Missing or non-numeric fill levels are black
+def get_marker_colours(fill_levels):
+    fill = pd.to_numeric(pd.Series(fill_levels), errors='coerce').to_numpy(dtype=float)
+    conditions = [np.isnan(fill), fill < 60, fill < 70, fill < 80, fill < 90]
+    choices = ['black', 'green', 'yellow', 'orange', 'red']
+    return np.select(conditions, choices, default='bright_red')
+
+#"n unit(s)" text for a column of whole numbers
+def _plural_text(counts, unit):
+    return counts.astype(int).astype(str) + f" {unit}" + np.where(counts != 1, "s", "")
+
+#Seconds since every timestamp at once (NaN for missing timestamps)
+def reading_ages(timestamps, now=None):
+    now = now if now is not None else pd.Timestamp.now()
+    return (now - pd.to_datetime(pd.Series(timestamps))).dt.total_seconds()
+
+#"x minutes/hours/days ago" text for every timestamp at once
+#Same wording as formatRelativeAge in assets/clientside.js
+def format_relative_ages(timestamps, now=None):
+    seconds = reading_ages(timestamps, now)
+    missing = seconds.isna()
+
+    #Truncate towards zero like int() does
+    minutes = np.trunc(seconds.fillna(0) / 60)
+    hours = np.trunc(minutes / 60)
+    days = np.trunc(hours / 24)
+    remaining_hours = hours % 24
+
+    minutes_text = _plural_text(minutes, "minute") + " ago"
+    hours_text = _plural_text(hours, "hour") + " ago"
+    days_text = (
+        _plural_text(days, "day")
+        + np.where(remaining_hours > 0, " " + _plural_text(remaining_hours, "hour"), "")
+        + " ago"
+    )
+
+    text = np.where(minutes < 60, minutes_text, np.where(hours < 24, hours_text, days_text))
+    return pd.Series(np.where(missing, "unknown", text), index=seconds.index)
+
+
+###################################################################
+# Build the marker frame: one row per marker with everything needed to draw it
+###################################################################
+def build_marker_frame(bin_data, now=None):
+    frame = bin_data.reset_index(drop=True).copy()
+
+    #Offset bins that share the same position so their markers don't completely overlap
+    #cumcount gives 0 for the first bin at a position, 1 for the second, etc
+    offset_index = frame.groupby(
+        [frame['latitude'].round(6), frame['longitude'].round(6)], dropna=False, sort=False
+    ).cumcount()
+    frame['marker_lat'] = frame['latitude']
+    frame['marker_lon'] = frame['longitude'] + offset_index * OFFSET_STEP
+
+    #Icon colour and "last updated" text for every bin in one pass
+    frame['icon_url'] = pd.Series(get_marker_colours(frame['fill_level'])).map(MARKER_ICON_URLS).to_numpy()
+    frame['time_text'] = format_relative_ages(frame['timestamp'], now).to_numpy()
+    #Epoch ms of each reading by this server's clock, for the browser to keep the age current
+    ages = reading_ages(frame['timestamp'], now)
+    frame['updated_ms'] = ((time.time() - ages) * 1000).round().astype(object).where(ages.notna(), None).to_numpy()
+    frame['fill_level_text'] = frame['fill_level'].astype(str) + "%"
+
+    return frame
+
+
+###################################################################
+# Emit the dash-leaflet markers from the marker frame's columns
+###################################################################
+def build_marker(bin_id, lat, lon, icon_url, time_text, updated_ms, popup_values, popup_fields, popup_width):
+    min_width, max_width = popup_width
+    #The browser updates the age text of elements with data-updated (epoch ms of the reading)
+    age_props = {"data-updated": int(updated_ms)} if updated_ms is not None else {}
+    return dl.Marker(
+        #Give each map marker a unique ID (because multiple bin_ids can have same exact location)
+        id=f"bin-marker-{bin_id}",
+        position=[lat, lon],
+        icon=dict(iconUrl=icon_url, iconSize=[30, 30], iconAnchor=[15, 30]),
+        children=[
+            dl.Popup(html.Div([
+                *[
+                    html.Div([
+                        html.Span(label, style={"fontWeight": "bold", "fontSize": "0.9em"}),
+                        html.Span(f"{value}", style=value_style),
+                    ], style={"marginBottom": "4px"}) #space between each line
+                    for (label, _, value_style), value in zip(popup_fields, popup_values)
+                ],
+                html.Div(
+                    ["Last updated: ", html.Span(time_text, className="relative-age", **age_props)],
+                    style={"fontSize": "0.8em", "color": "#666", "marginTop": "6px"}
+                )
+            ], style={**POPUP_STYLE, "minWidth": min_width, "maxWidth": max_width}))
+        ],
+    )
+
+def build_markers_from_frame(frame, popup_fields, popup_width):
+    columns = [frame[column].tolist() for _, column, _ in popup_fields]
+    return [
+        build_marker(bin_id, lat, lon, icon_url, time_text, updated_ms, popup_values, popup_fields, popup_width)
+        for bin_id, lat, lon, icon_url, time_text, updated_ms, *popup_values in zip(
+            frame['bin_id'].tolist(),
+            frame['marker_lat'].tolist(),
+            frame['marker_lon'].tolist(),
+            frame['icon_url'].tolist(),
+            frame['time_text'].tolist(),
+            frame['updated_ms'].tolist(),
+            *columns,
+        )
+    ]
+
+#Build the markers for a DataFrame of bins (from get_bin_data, optionally merged with extra columns)
+def build_map_markers(bin_data, popup_fields, popup_width, now=None):
+    if bin_data.empty:
+        return []
+    return build_markers_from_frame(build_marker_frame(bin_data, now), popup_fields, popup_width)
+
+
+###################################################################
+# Incremental marker updates for the live maps
+# Each map keeps its marker state (fleet version) in a dcc.Store. The shared cache remembers
+# which markers (in which order) each version holds, so on the next refresh any worker or
+# background job can send a Patch with only the removed, changed and added markers instead
+# of the whole marker layer.
+###################################################################
+
+#If more than this share of markers would change, resend the whole layer instead of a diff
+FULL_REFRESH_RATIO = 0.5
+#Number of marker versions remembered in the shared cache (least recently used are dropped)
+MAX_MARKER_STATES = 256
+
+#Hash of everything shown for each marker (position, icon, popup text) so changed markers can be found
+#The reading's timestamp is signed rather than its age text, which changes on every refresh
+def marker_signatures(frame, popup_fields):
+    columns = ['marker_lat', 'marker_lon', 'icon_url', 'timestamp'] + [column for _, column, _ in popup_fields]
+    columns = list(dict.fromkeys(columns)) #drop duplicate columns, keep order
+    return pd.util.hash_pandas_object(frame[columns].astype(str), index=False).to_numpy(dtype=np.uint64)
+
+#Remember the markers shown for a version, the version ID covers both contents and order
+def _save_marker_state(bin_ids, signatures):
+    digest = hashlib.blake2b(digest_size=12)
+    digest.update("\x1f".join(map(str, bin_ids)).encode())
+    digest.update(np.asarray(signatures, dtype=np.uint64).tobytes())
+    version = digest.hexdigest()
+
+    try:
+        save_state("map-markers", version, (list(bin_ids), dict(zip(bin_ids, signatures))), keep=MAX_MARKER_STATES)
+    except sqlite3.Error:
+        #The next refresh won't find it and sends the whole layer
+        logger.exception("Could not save map marker state %s", version)
+    return version
+
+#(ordered bin IDs, {bin_id: signature}) of a version, None if it isn't known
+def _load_marker_state(version):
+    try:
+        return load_state("map-markers", version)
+    except sqlite3.Error:
+        logger.exception("Could not load map marker state %s", version)
+        return None
+
+#Build the marker layer children for bin_data, as either the full marker list or a Patch against
+#the markers the client already has (marker_state = the map's marker state dcc.Store data)
+#Returns (children or Patch, new marker state for the dcc.Store)
+def update_map_markers(bin_data, popup_fields, popup_width, marker_state=None, now=None):
+    if bin_data.empty:
+        frame, new_ids, new_signatures = None, [], {}
+    else:
+        frame = build_marker_frame(bin_data, now)
+        #A bin should only have one marker, keep the first if the data has duplicates
+        frame = frame.drop_duplicates(subset='bin_id', keep='first').reset_index(drop=True)
+        new_ids = frame['bin_id'].tolist()
+        new_signatures = dict(zip(new_ids, marker_signatures(frame, popup_fields)))
+
+    old_state = _load_marker_state(marker_state.get('version')) if marker_state else None
+
+    #No previous markers we know about: send the full layer
+    if old_state is None:
+        version = _save_marker_state(new_ids, [new_signatures[bin_id] for bin_id in new_ids])
+        markers = build_markers_from_frame(frame, popup_fields, popup_width) if new_ids else []
+        return markers, {"version": version, "count": len(new_ids)}
+
+    old_ids, old_signatures = old_state
+
+    #Positions (in the client's marker list) of markers that are no longer shown
+    removed_positions = [position for position, bin_id in enumerate(old_ids) if bin_id not in new_signatures]
+    #Markers kept in the same order they're in on the client, with new bins appended after them
+    kept_ids = [bin_id for bin_id in old_ids if bin_id in new_signatures]
+    added_ids = [bin_id for bin_id in new_ids if bin_id not in old_signatures]
+    changed_positions = [
+        position for position, bin_id in enumerate(kept_ids)
+        if old_signatures[bin_id] != new_signatures[bin_id]
+    ]
+
+    ordered_ids = kept_ids + added_ids
+    version = _save_marker_state(ordered_ids, [new_signatures[bin_id] for bin_id in ordered_ids])
+    new_state = {"version": version, "count": len(ordered_ids)}
+
+    #Nothing changed since the client's version
+    if not removed_positions and not added_ids and not changed_positions:
+        return no_update, new_state
+
+    #Every marker was removed
+    if not ordered_ids:
+        return [], new_state
+
+    #Too much has changed, a full layer is smaller and simpler than the diff
+    total_changes = len(removed_positions) + len(added_ids) + len(changed_positions)
+    if total_changes > FULL_REFRESH_RATIO * len(ordered_ids):
+        ordered_frame = frame.set_index('bin_id', drop=False).loc[ordered_ids].reset_index(drop=True)
+        return build_markers_from_frame(ordered_frame, popup_fields, popup_width), new_state
+
+    #Only build markers for bins that changed or were added
+    needed_ids = [kept_ids[position] for position in changed_positions] + added_ids
+    needed_frame = frame[frame['bin_id'].isin(needed_ids)]
+    markers_by_id = dict(zip(needed_frame['bin_id'].tolist(), build_markers_from_frame(needed_frame, popup_fields, popup_width)))
+
+    patch = Patch()
+    #Delete from the end so earlier positions don't shift
+    for position in reversed(removed_positions):
+        del patch[position]
+    for position in changed_positions:
+        patch[position] = markers_by_id[kept_ids[position]]
+    for bin_id in added_ids:
+        patch.append(markers_by_id[bin_id])
+
+    return patch, new_state
@@ -1,11 +1,13 @@
-from dash import Dash, html, register_page, dcc, callback, Input, Output, dash_table, exceptions, State, callback_context, no_update
+from dash import Dash, html, register_page, dcc, callback, Input, Output, dash_table, exceptions, State, callback_context, no_update, clientside_callback, ClientsideFunction, Patch
 import dash_bootstrap_components as dbc
 import pandas as pd
 from sqlalchemy import text #needed to insert raw SQL data from user editing table
 from datetime import datetime
-import plotly.express as px
 
-from data_utils import engine, get_sensor_health_data
+from data_utils import engine, get_sensor_health_data, get_alerts_data
+from shared_cache import expire
+from live_updates import version_store_id, rendered_version_id, rendered_version_store, render_version
+from columnar import to_columns, from_columns, columns_store_id, columnar_store, register_columnar_table
 
 
 #Register this file as a Dash page
@@ -237,7 +239,8 @@ def reusable_alerts_data_table(title, table_id, custom_card_style=None, header_s
 
                 ]
 
-            )
+            ),
+            columnar_store(table_id), #Table data in columns, expanded into the table in the browser
         ])
     #Card styling
     ], style={
@@ -412,15 +415,10 @@ def sensor_health_data_table(table_id="sensor-health-table"):
                     },
 
                 ]
-            )
+            ),
+            rendered_version_store(table_id), #Sensor health version shown in the table
+            columnar_store(table_id), #Table data in columns, expanded into the table in the browser
         ]),
-        #Update every 15 minutes
-        dcc.Interval(
-        id="update-sensor-health-table-interval",
-        interval=900000, #15 minutes
-        n_intervals=0
-        ),
-
     ], style={
             "backgroundColor": "#FFFFFF",
             "boxShadow": "0 4px 12px rgba(0, 0, 0, 0.1)",
@@ -430,17 +428,24 @@ def sensor_health_data_table(table_id="sensor-health-table"):
     )
 
 
+###################################################################
+# The table callbacks below send their rows in columns (columnar.py), expanded into the
+# DataTables in the browser
+for table_id in ["active-alerts-table", "ignored-alerts-table", "resolved-alerts-table", "sensor-health-table"]:
+    register_columnar_table(table_id)
+
+
 ###################################################################
 # Callback for loading ACTIVE alerts table data
 ###################################################################
 @callback(
-    Output("active-alerts-table", "data"),
+    Output(columns_store_id("active-alerts-table"), "data"),
     Input("active-alerts-table", "id"),  #triggers once on load (when card is instantiated)
     Input("alerts-data-store", "data"), #Get alerts data from dcc.Store in index.py
 
 )
 def load_active_alerts_table(_, data):
-    df_alerts = pd.DataFrame(data)
+    df_alerts = from_columns(data)
     #Filter for alerts with 'Active' status AND no resolved time
     df_active = df_alerts[(df_alerts['status'] == 'Active') & (df_alerts['resolved_time_string'] == '')]
     
@@ -463,18 +468,18 @@ def load_active_alerts_table(_, data):
         ), axis=1    
     )
 
-    return df_active.to_dict("records")
+    return to_columns(df_active, "active-alerts-table")
 
 ###################################################################
 # Callback for loading IGNORED alerts table data
 ###################################################################
 @callback(
-    Output("ignored-alerts-table", "data"),
+    Output(columns_store_id("ignored-alerts-table"), "data"),
     Input("ignored-alerts-table", "id"), #triggers once on load (when card is instantiated)
     Input("alerts-data-store", "data"), #Get alerts data from dcc.Store in index.py
 )
 def load_ignored_alerts(_, data):
-    df = pd.DataFrame(data)
+    df = from_columns(data)
 
     #Filter for records with 'Ignore' status
     df_ignored = df[df['status'] == 'Ignore']
@@ -498,18 +503,18 @@ def load_ignored_alerts(_, data):
         ), axis=1 
     )
 
-    return df_ignored.to_dict("records")
+    return to_columns(df_ignored, "ignored-alerts-table")
 
 ###################################################################
 # Callback for loading RESOLVED alerts table data
 ###################################################################
 @callback(
-    Output("resolved-alerts-table", "data"),
+    Output(columns_store_id("resolved-alerts-table"), "data"),
     Input("resolved-alerts-table", "id"), #triggers once on load (when card is instantiated)
     Input("alerts-data-store", "data"), #Get alerts data from dcc.Store in index.py
 )
 def load_resolved_alerts(_, data):
-    df = pd.DataFrame(data)
+    df = from_columns(data)
 
     #Filter for alerts where resolved time string is NOT empty
     #df_resolved = df[df['resolved_time_string'] != '']
@@ -535,7 +540,7 @@ def load_resolved_alerts(_, data):
         ), axis=1 
     )
 
-    return df_resolved.to_dict("records")
+    return to_columns(df_resolved, "resolved-alerts-table")
 
 
 
@@ -593,8 +598,12 @@ def update_alert_status(active_old, ignored_old, resolved_old,
     #Store the alert id corresponding to the edited status cell in list changed_rows
     changed_rows = []
 
+    #Cells the server changes in the edited table (resolved time), sent back as a Patch of only those rows
+    table_patch = Patch()
+    patched_cells = 0
+
     #Check for edits to the STATUS column
-    for old, new in zip(prev_data, current_data):
+    for row, (old, new) in enumerate(zip(prev_data, current_data)):
         alert_id = new["alert_id"]
         old_status = old["status"]
         new_status = new["status"]
@@ -610,9 +619,12 @@ def update_alert_status(active_old, ignored_old, resolved_old,
             #If the updated status is changed to RESOLVED auto-add current date
             if new_status == "Resolved":
                 #Get the current datetime to insert into Resolved Time column
-                resolved_time_now = datetime.now().strftime("%Y-%m-%d %H:%M")
+                resolved_at = datetime.now()
+                resolved_time_now = resolved_at.strftime("%Y-%m-%d %H:%M")
                 
                 changed_rows.append((alert_id, "resolved_time", resolved_time_now))
+                table_patch[row]["resolved_time_string"] = resolved_at.strftime("%d/%m/%Y %H:%M") #Same format as get_alerts_data
+                patched_cells += 1
                 status_update_text.append(
                     f"Resolved time has been set to '{resolved_time_now}'."
                 )
@@ -621,6 +633,8 @@ def update_alert_status(active_old, ignored_old, resolved_old,
             elif old_status == "Resolved" and new_status in ["Active", "Ignore"]:
                 #Insert value None (null)
                 changed_rows.append((alert_id, "resolved_time", None))
+                table_patch[row]["resolved_time_string"] = ""
+                patched_cells += 1
                 status_update_text.append(
                     f"Resolved time has been cleared."
                 )
@@ -650,15 +664,19 @@ def update_alert_status(active_old, ignored_old, resolved_old,
                 text(f"UPDATE alerts_table SET {column} = :val WHERE alert_id = :alert_id"),
                 {"val": new_value, "alert_id": alert_id}
             )
+    #Alerts changed, don't keep serving the cached alerts to other sessions
+    expire(get_alerts_data.dataset_name)
     
     #Return the status update message if it's defined
     status_toast = "\n".join(status_update_text) if status_update_text else None
 
-    #Return updated data only to the table that triggered it, for other tables don't update
+    #The edits are already in the triggering table, only send it the resolved times that changed
+    #Other tables don't update
+    table_update = table_patch if patched_cells else no_update
     return (
-        current_data if triggered == "active-alerts-table" else no_update,
-        current_data if triggered == "ignored-alerts-table" else no_update,
-        current_data if triggered == "resolved-alerts-table" else no_update,
+        table_update if triggered == "active-alerts-table" else no_update,
+        table_update if triggered == "ignored-alerts-table" else no_update,
+        table_update if triggered == "resolved-alerts-table" else no_update,
         status_toast #Save the message to dcc.Store
     )
 
@@ -751,49 +769,43 @@ def save_comment_to_db(n_clicks, alert_id, comment):
             text("UPDATE alerts_table SET user_notes = :val WHERE alert_id = :alert_id"),
             {"val": comment, "alert_id": alert_id}
         )
+    expire(get_alerts_data.dataset_name) #Alerts changed, next read re-queries them
     #return the toast message, and close popover
     return f"Comment updated for Alert #{alert_id}", False
 
 ###################################################################
-#Callback for "Cancel" button of popover to close it
-@callback(
+#Callback for "Cancel" button of popover to close it (runs in the browser, see assets/clientside.js)
+clientside_callback(
+    ClientsideFunction(namespace="ui", function_name="close_popover"), #change is_open to False (closes it)
     Output("comment-popover", "is_open", allow_duplicate=True),
     Input("cancel-comment-button", "n_clicks"),
     prevent_initial_call=True
 )
-def cancel_popover_button(n_clicks):
-    return False #change is_open to False (closes it)
 
 ###################################################################
 # Callback to update character count limit and disable Save button if goes over 100
-@callback(
+#Runs in the browser so the count keeps up with typing (see assets/clientside.js)
+clientside_callback(
+    ClientsideFunction(namespace="ui", function_name="update_character_count"),
     Output("character-count", "children"),
     Output("save-comment-button", "disabled"), #Disable save button
     Input("comment-box", "value"),
     prevent_initial_call=True
 )
-def update_character_count(value):
-    #If nothing entered in the comment box
-    if not value:
-        return "0 / 100 characters", False #and don't disable Save button
-    
-    #Find number of characters in the comment input
-    length = len(value)
-    #Set restriction to 100 characters
-    exceed_max = length > 100
-
-    return f"{length} / 100 characters", exceed_max
 
 
 ###################################################################
 # Callback for populating Sensor Health Table
 @callback(
-    Output("sensor-health-table", "data"),
+    Output(columns_store_id("sensor-health-table"), "data"),
+    Output(rendered_version_id("sensor-health-table"), "data"),
     Input("sensor-health-table", "sort_by"), #Sorting function
     Input("sensor-health-table", "id"), #Load the table on page load
-    Input("update-sensor-health-table-interval", "n_intervals") #Refresh data every 15 min
+    Input(version_store_id("sensor_health"), "data"), #Refresh whenever the sensor health data changes
+    State(rendered_version_id("sensor-health-table"), "data"), #Version the table already shows
 )
-def load_sensor_health_data(sort_by, _, n_intervals):
+def load_sensor_health_data(sort_by, _, data_version, rendered_version):
+    version = render_version("sensor_health", data_version, rendered_version)
     df = get_sensor_health_data()
 
     #Manual column sorting feature using Dash's sort_by prop
@@ -818,7 +830,7 @@ def load_sensor_health_data(sort_by, _, n_intervals):
         else:
             df = df.sort_values(by=col_id, ascending=ascending)
 
-    return df.to_dict("records")
+    return to_columns(df, "sensor-health-table"), version
 
 
 
@@ -1,11 +1,14 @@
-from dash import Dash, html, register_page, dcc, callback, Input, Output, State, exceptions, no_update
-import plotly.graph_objs as go
+from dash import Dash, html, register_page, dcc, callback, Input, Output, exceptions, clientside_callback, ClientsideFunction
+from lazy_imports import go #plotly.graph_objects is imported on first use
 import pandas as pd
 import dash_bootstrap_components as dbc
 from datetime import datetime, timedelta
-import io
 
-from data_utils import get_bin_data, get_bin_fill_history, get_time_to_80_data, get_daily_bin_collections, get_bin_fill_heatmap_data
+from search_index import first_bin_ids, search_bin_ids, search_store, register_search_dropdown
+from analytics_reports import weekly_fill_stats, time_to_80_stats, collections_per_week, collections_per_hour, fill_activity_heatmap
+from analytics_reports import EXPORT_OPTIONS, register_export_dropdown
+from background_jobs import heavy_callback, job_progress
+from columnar import to_columns
 
 
 #Register this file as a Dash page
@@ -15,9 +18,6 @@ register_page(__name__, path="/analytics", name="Data Analytics")
 ###################################################################
 # Create Trend: Avg Bin fill level (weekly, monthly) Time-series chart
 ###################################################################
-bin_df = get_bin_data()
-#Get distinct Bin IDs for Bin ID dropdown selector
-bin_ids = sorted(bin_df['bin_id'].unique())
 
 #Function for populating weekly dropdown filter with options (with their dates)
 def generate_week_options(n_weeks=4):
@@ -61,457 +61,379 @@ def get_current_month_value():
 
 
 ###################################################################
-#Create the card layout for avg fill level by week
-avg_fill_level_weekly_graph_card = html.Div([
-    dbc.Card([
-        dbc.CardHeader([
-            dbc.Row([
-                dbc.Col(html.H5("Daily Avg Fill Level by Week", className="card-title")) 
-            ])
-        ], style={
-            "backgroundColor": "#F9F7FA", #Header bg colour
-            "paddingTop": "15px",
-            "borderBottom": "none", #Remove the grey border under cardheader
-        }
-        ), 
-
+#Bin and month picked for the whole page, every chart below shows the same bin and month
+#All five charts are drawn from one data bundle per bin and month (see analytics_reports.py)
+def build_analytics_filters_card(bin_ids):
+    return dbc.Card(
         dbc.CardBody([
-            #Container for the 3 dropdowns
             html.Div([
                 #Bin ID text
                 html.Div("Bin ID:", style={"marginRight": "5px", "marginTop": "9px", "fontSize": "12px", "fontWeight": "bold"}),
                 #Bin ID dropdown
                 html.Div([
                     dcc.Dropdown(
-                        id="weekly-fill-level-bin-id-dropdown",
-                        options=[{"label": b, "value": b} for b in bin_ids], #Populate dropdown options from bin_ids df
+                        id="analytics-bin-id-dropdown",
+                        options=[{"label": b, "value": b} for b in bin_ids], #First bin IDs, the rest are found by typing
                         value=bin_ids[0], #by default first ID will be selected
                         style={"width": "120px"},
                         clearable=False,
                     ),
-                ], style={"flex": "auto", "marginRight": "20px"}),
+                    search_store("analytics-bin-id-dropdown"), #Debounced search text
+                ], style={"marginRight": "20px"}),
 
+                #Month text
+                html.Div("Month:", style={"marginRight": "5px", "marginTop": "9px", "fontSize": "12px", "fontWeight": "bold"}),
                 #Dropdown for month
                 html.Div([
                     dcc.Dropdown(
-                        id="weekly-fill-level-month-dropdown",
+                        id="analytics-month-dropdown",
                         options=generate_month_options(),
                         value=get_current_month_value(),
                         style={"width": "180px"},
                         clearable=False,
                     ),
-                ], style={"flex": "auto", "marginRight": "5px"}),
-
-                #Dropdown for week of month
-                html.Div([
-                    dcc.Dropdown(
-                        id="weekly-fill-level-week-dropdown",
-                        options=[], #To be populated via callback
-                        value=None, #Show the entire month if week not selected
-                        placeholder="Select week",
-                        style={"width": "200px"},
-                        clearable=True,
-                    ),
-                ], style={"flex": "auto", "marginRight": "5px"}),
-
-                #Dropdown for exporting avg fill level data -AN
-                html.Div([
-                    html.Div([
-                        dcc.Dropdown(
-                            id="export-dropdown",
-                            options=[
-                                {"label": "Export to Excel", "value": "excel"},
-                                #{"label": "Export to PDF", "value": "pdf"}
-                            ],
-                            placeholder="Export...",
-                            style={"width": "150px", "fontSize": "13px"},
-                            clearable=True
-                        ),
-                        dcc.Download(id="download-export"),
-                        dcc.Store(id="filtered-weekly-fill-data")
-                    ])
-                ], style={
-                    "display": "flex",
-                    "justifyContent": "flex-end",
-                    "marginBottom": "10px"
-                }),
+                ]),
 
             #Dropdowns container styling
             ], style={
                 "display": "flex",
                 "flexWrap": "wrap",
                 "gap": "5px",
-                #"alignItems": "center",
-                "marginBottom": "10px",
                 "fontFamily": "Arial",
                 "fontSize": "13px",
-            }
-            ),
-
-        #Create the time series graph
-        dcc.Graph(id="weekly-fill-level-time-graph", config={"displayModeBar": False}), #Hide the bar with settings
-        ])
-
+            }),
+        ]),
     #Card styling
-    ], style={
+    style={
         "backgroundColor": "#ffffff",
         "boxShadow": "0 4px 12px rgba(0,0,0,0.1)",
-        #"padding": "10px",
-        #"borderRadius": "8px",
-    }),
-])
+    })
 
 
 ###################################################################
-# Create Trend: Avg Time Taken For Bin to Get Full (80%) per Day
-avg_time_bin_get_full_chart_card = html.Div([
-    dbc.Card([
-        dbc.CardHeader([
-            dbc.Row([
-                dbc.Col(html.H5("Avg Time For Bins To Reach 80% Full", className="card-title")) 
-            ])
-        ], style={
-            "backgroundColor": "#F9F7FA", #Header bg colour
-            "paddingTop": "15px",
-            "borderBottom": "none", #Remove the grey border under cardheader
-        }),
-
-        dbc.CardBody([
-            #Container for the 3 dropdowns
-            html.Div([
-                #Bin ID text
-                html.Div("Bin ID:", style={"marginRight": "5px", "marginTop": "9px", "fontSize": "12px", "fontWeight": "bold"}),
-                #Bin ID dropdown
-                html.Div([
-                    dcc.Dropdown(
-                        id="to-80-full-bin-id-dropdown",
-                        options=[{"label": b, "value": b} for b in bin_ids], #Populate dropdown options from bin_ids df
-                        value=bin_ids[0], #by default first ID will be selected
-                        style={"width": "120px"},
-                        clearable=False,
-                    ),
-                ], style={"flex": "auto", "marginRight": "20px"}),
-
-                #Dropdown for month
-                html.Div([
-                    dcc.Dropdown(
-                        id="to-80-full-month-dropdown",
-                        options=generate_month_options(),
-                        value=get_current_month_value(),
-                        style={"width": "180px"},
-                        clearable=False,
-                    ),
-                ], style={"flex": "auto", "marginRight": "5px"}),
+#Create the card layout for avg fill level by week
+def build_avg_fill_level_weekly_graph_card():
+    return html.Div([
+        dbc.Card([
+            dbc.CardHeader([
+                dbc.Row([
+                    dbc.Col(html.H5("Daily Avg Fill Level by Week", className="card-title")) 
+                ])
+            ], style={
+                "backgroundColor": "#F9F7FA", #Header bg colour
+                "paddingTop": "15px",
+                "borderBottom": "none", #Remove the grey border under cardheader
+            }
+            ), 
 
-                #Dropdown for week of month
+            dbc.CardBody([
+                #Container for the week and export dropdowns (bin and month are picked at the top of the page)
                 html.Div([
-                    dcc.Dropdown(
-                        id="to-80-full-week-dropdown",
-                        options=[], #To be populated via callback
-                        value=None, #Show the entire month if week not selected
-                        placeholder="Select week",
-                        style={"width": "200px"},
-                        clearable=True,
-                    ),
-                ], style={"flex": "auto", "marginRight": "5px"}),
+                    #Dropdown for week of month
+                    html.Div([
+                        dcc.Dropdown(
+                            id="weekly-fill-level-week-dropdown",
+                            options=[], #To be populated via callback
+                            value=None, #Show the entire month if week not selected
+                            placeholder="Select week",
+                            style={"width": "200px"},
+                            clearable=True,
+                        ),
+                    ], style={"flex": "auto", "marginRight": "5px"}),
 
-                #Dropdown for exporting time to 80% data -AN
-                html.Div([
-                    dcc.Dropdown(
-                        id="export-80-dropdown",
-                        options=[
-                            {"label": "Export to Excel", "value": "excel"},
-                            #{"label": "Export to PDF", "value": "pdf"}
-                        ],
-                        placeholder="Export...",
-                        style={"width": "150px", "fontSize": "13px"},
-                        clearable=True
-                    ),
-                    dcc.Download(id="download-80-export"),
-                    dcc.Store(id="filtered-80-data")
+                    #Dropdown for exporting avg fill level data -AN
+                    html.Div([
+                        html.Div([
+                            dcc.Dropdown(
+                                id="export-dropdown",
+                                options=EXPORT_OPTIONS, #Made on the server from the chart's filters
+                                placeholder="Export...",
+                                style={"width": "150px", "fontSize": "13px"},
+                                clearable=True
+                            ),
+                        ])
+                    ], style={
+                        "display": "flex",
+                        "justifyContent": "flex-end",
+                        "marginBottom": "10px"
+                    }),
+
+                #Dropdowns container styling
                 ], style={
                     "display": "flex",
-                    "justifyContent": "flex-end",
-                    "marginBottom": "10px"
-                }),
-
-            #Dropdowns container styling
-            ], style={
-                "display": "flex",
-                "flexWrap": "wrap",
-                "gap": "5px",
-                #"alignItems": "center",
-                "marginBottom": "10px",
-                "fontFamily": "Arial",
-                "fontSize": "13px",
-            }
-            ),
+                    "flexWrap": "wrap",
+                    "gap": "5px",
+                    #"alignItems": "center",
+                    "marginBottom": "10px",
+                    "fontFamily": "Arial",
+                    "fontSize": "13px",
+                }
+                ),
 
-        #Create the time series graph
-        dcc.Graph(id="time-to-80-line-chart", config={"displayModeBar": False}), #Hide the bar with settings
-        ])
+            #Create the time series graph
+            job_progress("weekly-fill-level-time-graph"), #Shown while the chart is being worked out
+            dcc.Graph(id="weekly-fill-level-time-graph", config={"displayModeBar": False}), #Hide the bar with settings
+            dcc.Store(id="weekly-fill-level-series"), #The month's daily fill levels, filtered to the week in the browser
+            ])
 
-    #Card styling
-    ], style={
-        "backgroundColor": "#ffffff",
-        "boxShadow": "0 4px 12px rgba(0,0,0,0.1)",
-    }),
-])
+        #Card styling
+        ], style={
+            "backgroundColor": "#ffffff",
+            "boxShadow": "0 4px 12px rgba(0,0,0,0.1)",
+            #"padding": "10px",
+            #"borderRadius": "8px",
+        }),
+    ])
 
 
 ###################################################################
-# Create card for Total Daily Collections made per bin bar chart
-daily_collections_bar_chart_card = html.Div([
-    dbc.Card([
-        dbc.CardHeader([
-            dbc.Row([
-                dbc.Col(html.H5("Total Collections Per Week", className="card-title"))
-            ])
-        ], style={
-            "backgroundColor": "#F9F7FA", #Header bg colour
-            "paddingTop": "15px",
-            "borderBottom": "none", #Remove the grey border under cardheader
-        }),
+# Create Trend: Avg Time Taken For Bin to Get Full (80%) per Day
+def build_avg_time_bin_get_full_chart_card():
+    return html.Div([
+        dbc.Card([
+            dbc.CardHeader([
+                dbc.Row([
+                    dbc.Col(html.H5("Avg Time For Bins To Reach 80% Full", className="card-title")) 
+                ])
+            ], style={
+                "backgroundColor": "#F9F7FA", #Header bg colour
+                "paddingTop": "15px",
+                "borderBottom": "none", #Remove the grey border under cardheader
+            }),
 
-        dbc.CardBody([
-            #Container for the 2 dropdowns
-            html.Div([
-                #Bin ID text
-                html.Div("Bin ID:", style={"marginRight": "5px", "marginTop": "9px", "fontSize": "12px", "fontWeight": "bold"}),
-                #Bin ID dropdown
+            dbc.CardBody([
+                #Container for the week and export dropdowns (bin and month are picked at the top of the page)
                 html.Div([
-                    dcc.Dropdown(
-                        id="daily-collections-bin-id-dropdown",
-                        options=[{"label": b, "value": b} for b in bin_ids], #Populate dropdown options from bin_ids df
-                        value=bin_ids[0], #by default first ID will be selected
-                        style={"width": "120px"},
-                        clearable=False,
-                    ),
-                ], style={"flex": "auto", "marginRight": "20px"}),
+                    #Dropdown for week of month
+                    html.Div([
+                        dcc.Dropdown(
+                            id="to-80-full-week-dropdown",
+                            options=[], #To be populated via callback
+                            value=None, #Show the entire month if week not selected
+                            placeholder="Select week",
+                            style={"width": "200px"},
+                            clearable=True,
+                        ),
+                    ], style={"flex": "auto", "marginRight": "5px"}),
 
-                #Dropdown for month
-                html.Div([
-                    dcc.Dropdown(
-                        id="daily-collections-month-dropdown",
-                        options=generate_month_options(),
-                        value=get_current_month_value(),
-                        style={"width": "180px"},
-                        clearable=False,
-                    ),
-                ], style={"flex": "auto", "marginRight": "5px"}),
+                    #Dropdown for exporting time to 80% data -AN
+                    html.Div([
+                        dcc.Dropdown(
+                            id="export-80-dropdown",
+                            options=EXPORT_OPTIONS, #Made on the server from the chart's filters
+                            placeholder="Export...",
+                            style={"width": "150px", "fontSize": "13px"},
+                            clearable=True
+                        ),
+                    ], style={
+                        "display": "flex",
+                        "justifyContent": "flex-end",
+                        "marginBottom": "10px"
+                    }),
 
-                #Dropdown for exporting daily collections data -AN
-                html.Div([
-                    dcc.Dropdown(
-                        id="export-collections-dropdown",
-                        options=[
-                            {"label": "Export to Excel", "value": "excel"},
-                            #{"label": "Export to PDF", "value": "pdf"}
-                        ],
-                        placeholder="Export...",
-                        style={"width": "150px", "fontSize": "13px"},
-                        clearable=True
-                    ),
-                    dcc.Download(id="download-collections-export"),
-                    dcc.Store(id="filtered-collections-data")
+                #Dropdowns container styling
                 ], style={
                     "display": "flex",
-                    "justifyContent": "flex-end",
-                    "marginBottom": "10px"
-                }),
-
-            #Dropdowns container styling
-            ], style={
-                "display": "flex",
-                "flexWrap": "wrap",
-                "gap": "5px",
-                "marginBottom": "10px",
-                "fontFamily": "Arial",
-                "fontSize": "13px",
-            }
-            ),
-
-            dcc.Graph(id="daily-collections-bar-chart", config={"displayModeBar": False})
-        ])
-    #Card styling
-    ], style={
-        "backgroundColor": "#ffffff",
-        "boxShadow": "0 4px 12px rgba(0,0,0,0.1)",
-    })
-])
-
+                    "flexWrap": "wrap",
+                    "gap": "5px",
+                    #"alignItems": "center",
+                    "marginBottom": "10px",
+                    "fontFamily": "Arial",
+                    "fontSize": "13px",
+                }
+                ),
 
-###################################################################
-# Create card for Time Of Day Bins were Emptied
-bin_empty_times_bar_chart_card = html.Div([
-    dbc.Card([
-        dbc.CardHeader([
-            dbc.Row([
-                dbc.Col(html.H5("Time Of Day Bins Emptied", className="card-title"))
+            #Create the time series graph
+            job_progress("time-to-80-line-chart"), #Shown while the chart is being worked out
+            dcc.Graph(id="time-to-80-line-chart", config={"displayModeBar": False}), #Hide the bar with settings
+            dcc.Store(id="time-to-80-series"), #The month's daily times to 80% full, filtered to the week in the browser
             ])
+
+        #Card styling
         ], style={
-            "backgroundColor": "#F9F7FA", #Header bg colour
-            "paddingTop": "15px",
-            "borderBottom": "none", #Remove the grey border under cardheader
+            "backgroundColor": "#ffffff",
+            "boxShadow": "0 4px 12px rgba(0,0,0,0.1)",
         }),
+    ])
 
-        dbc.CardBody([
-            #Container for the 2 dropdowns
-            html.Div([
-                #Bin ID text
-                html.Div("Bin ID:", style={"marginRight": "5px", "marginTop": "9px", "fontSize": "12px", "fontWeight": "bold"}),
-                #Bin ID dropdown
-                html.Div([
-                    dcc.Dropdown(
-                        id="time-emptied-bin-id-dropdown",
-                        options=[{"label": b, "value": b} for b in bin_ids], #Populate dropdown options from bin_ids df
-                        value=bin_ids[0], #by default first ID will be selected
-                        style={"width": "120px"},
-                        clearable=False,
-                    ),
-                ], style={"flex": "auto", "marginRight": "20px"}),
 
-                #Dropdown for month
-                html.Div([
-                    dcc.Dropdown(
-                        id="time-emptied-month-dropdown",
-                        options=generate_month_options(),
-                        value=get_current_month_value(),
-                        style={"width": "180px"},
-                        clearable=False,
-                    ),
-                ], style={"flex": "auto", "marginRight": "5px"}),
+###################################################################
+# Create card for Total Daily Collections made per bin bar chart
+def build_daily_collections_bar_chart_card():
+    return html.Div([
+        dbc.Card([
+            dbc.CardHeader([
+                dbc.Row([
+                    dbc.Col(html.H5("Total Collections Per Week", className="card-title"))
+                ])
+            ], style={
+                "backgroundColor": "#F9F7FA", #Header bg colour
+                "paddingTop": "15px",
+                "borderBottom": "none", #Remove the grey border under cardheader
+            }),
 
-                #Dropdown for exporting Time of Day Bins EMptied data -AN
+            dbc.CardBody([
+                #Container for the export dropdown (bin and month are picked at the top of the page)
                 html.Div([
+                    #Dropdown for exporting daily collections data -AN
                     html.Div([
                         dcc.Dropdown(
-                            id="time-bins-emptied-export-dropdown",
-                            options=[
-                                {"label": "Export to Excel", "value": "excel"},
-                                #{"label": "Export to PDF", "value": "pdf"}
-                            ],
+                            id="export-collections-dropdown",
+                            options=EXPORT_OPTIONS, #Made on the server from the chart's filters
                             placeholder="Export...",
                             style={"width": "150px", "fontSize": "13px"},
                             clearable=True
                         ),
-                        dcc.Download(id="time-bins-emptied-download-export"),
-                        dcc.Store(id="time-bins-emptied-data")
-                    ])
+                    ], style={
+                        "display": "flex",
+                        "justifyContent": "flex-end",
+                        "marginBottom": "10px"
+                    }),
+
+                #Dropdowns container styling
                 ], style={
                     "display": "flex",
-                    "justifyContent": "flex-end",
-                    "marginBottom": "10px"
-                }),
+                    "flexWrap": "wrap",
+                    "gap": "5px",
+                    "marginBottom": "10px",
+                    "fontFamily": "Arial",
+                    "fontSize": "13px",
+                }
+                ),
 
-            #Dropdowns container styling
-            ], style={
-                "display": "flex",
-                "flexWrap": "wrap",
-                "gap": "5px",
-                "marginBottom": "10px",
-                "fontFamily": "Arial",
-                "fontSize": "13px",
-            }
-            ),
+                job_progress("daily-collections-bar-chart"), #Shown while the chart is being worked out
+                dcc.Graph(id="daily-collections-bar-chart", config={"displayModeBar": False})
+            ])
+        #Card styling
+        ], style={
+            "backgroundColor": "#ffffff",
+            "boxShadow": "0 4px 12px rgba(0,0,0,0.1)",
+        })
+    ])
 
-            dcc.Graph(id="time-emptied-bar-chart", config={"displayModeBar": False})
-        ])
-    #Card styling
-    ], style={
-        "backgroundColor": "#ffffff",
-        "boxShadow": "0 4px 12px rgba(0,0,0,0.1)",
-    })
-])
 
+###################################################################
+# Create card for Time Of Day Bins were Emptied
+def build_bin_empty_times_bar_chart_card():
+    return html.Div([
+        dbc.Card([
+            dbc.CardHeader([
+                dbc.Row([
+                    dbc.Col(html.H5("Time Of Day Bins Emptied", className="card-title"))
+                ])
+            ], style={
+                "backgroundColor": "#F9F7FA", #Header bg colour
+                "paddingTop": "15px",
+                "borderBottom": "none", #Remove the grey border under cardheader
+            }),
 
+            dbc.CardBody([
+                #Container for the export dropdown (bin and month are picked at the top of the page)
+                html.Div([
+                    #Dropdown for exporting Time of Day Bins EMptied data -AN
+                    html.Div([
+                        html.Div([
+                            dcc.Dropdown(
+                                id="time-bins-emptied-export-dropdown",
+                                options=EXPORT_OPTIONS, #Made on the server from the chart's filters
+                                placeholder="Export...",
+                                style={"width": "150px", "fontSize": "13px"},
+                                clearable=True
+                            ),
+                        ])
+                    ], style={
+                        "display": "flex",
+                        "justifyContent": "flex-end",
+                        "marginBottom": "10px"
+                    }),
+
+                #Dropdowns container styling
+                ], style={
+                    "display": "flex",
+                    "flexWrap": "wrap",
+                    "gap": "5px",
+                    "marginBottom": "10px",
+                    "fontFamily": "Arial",
+                    "fontSize": "13px",
+                }
+                ),
 
-###################################################################
-# Create card for Avg Hourly Fill Activity Heatmap
-fill_activity_heatmap_card = html.Div([
-    dbc.Card([
-        dbc.CardHeader([
-            dbc.Row([
-                dbc.Col(html.H5("Avg Hourly Fill Level Activity Heatmap", className="card-title"))
+                job_progress("time-emptied-bar-chart"), #Shown while the chart is being worked out
+                dcc.Graph(id="time-emptied-bar-chart", config={"displayModeBar": False})
             ])
+        #Card styling
         ], style={
-            "backgroundColor": "#F9F7FA", #Header bg colour
-            "paddingTop": "15px",
-            "borderBottom": "none", #Remove the grey border under cardheader
-        }),
+            "backgroundColor": "#ffffff",
+            "boxShadow": "0 4px 12px rgba(0,0,0,0.1)",
+        })
+    ])
 
-        dbc.CardBody([
-            #Container for the 2 dropdowns
-            html.Div([
-                #Bin ID text
-                html.Div("Bin ID:", style={"marginRight": "5px", "marginTop": "9px", "fontSize": "12px", "fontWeight": "bold"}),
-                #Bin ID dropdown
-                html.Div([
-                    dcc.Dropdown(
-                        id="fill-activity-heatmap-bin-id-dropdown",
-                        options=[{"label": b, "value": b} for b in bin_ids], #Populate dropdown options from bin_ids df
-                        value=bin_ids[0], #by default first ID will be selected
-                        style={"width": "120px"},
-                        clearable=False,
-                    ),
-                ], style={"flex": "auto", "marginRight": "20px"}),
 
-                #Dropdown for month
-                html.Div([
-                    dcc.Dropdown(
-                        id="fill-activity-heatmap-month-dropdown",
-                        options=generate_month_options(),
-                        value=get_current_month_value(),
-                        style={"width": "180px"},
-                        clearable=False,
-                    ),
-                ], style={"flex": "auto", "marginRight": "5px"}),
 
-                #Dropdown for exporting Fill Activity Heatmap data -AN
+###################################################################
+# Create card for Avg Hourly Fill Activity Heatmap
+def build_fill_activity_heatmap_card():
+    return html.Div([
+        dbc.Card([
+            dbc.CardHeader([
+                dbc.Row([
+                    dbc.Col(html.H5("Avg Hourly Fill Level Activity Heatmap", className="card-title"))
+                ])
+            ], style={
+                "backgroundColor": "#F9F7FA", #Header bg colour
+                "paddingTop": "15px",
+                "borderBottom": "none", #Remove the grey border under cardheader
+            }),
+
+            dbc.CardBody([
+                #Container for the export dropdown (bin and month are picked at the top of the page)
                 html.Div([
+                    #Dropdown for exporting Fill Activity Heatmap data -AN
                     html.Div([
-                        dcc.Dropdown(
-                            id="fill-activity-heatmap-export-dropdown",
-                            options=[
-                                {"label": "Export to Excel", "value": "excel"},
-                                #{"label": "Export to PDF", "value": "pdf"}
-                            ],
-                            placeholder="Export...",
-                            style={"width": "150px", "fontSize": "13px"},
-                            clearable=True
-                        ),
-                        dcc.Download(id="fill-activity-heatmap-download-export"),
-                        dcc.Store(id="fill-activity-heatmap-data")
-                    ])
+                        html.Div([
+                            dcc.Dropdown(
+                                id="fill-activity-heatmap-export-dropdown",
+                                options=EXPORT_OPTIONS, #Made on the server from the chart's filters
+                                placeholder="Export...",
+                                style={"width": "150px", "fontSize": "13px"},
+                                clearable=True
+                            ),
+                        ])
+                    ], style={
+                        "display": "flex",
+                        "justifyContent": "flex-end",
+                        "marginBottom": "10px"
+                    }),
+
+                #Dropdowns container styling
                 ], style={
                     "display": "flex",
-                    "justifyContent": "flex-end",
-                    "marginBottom": "10px"
-                }),
+                    "flexWrap": "wrap",
+                    "gap": "5px",
+                    "marginBottom": "10px",
+                    "fontFamily": "Arial",
+                    "fontSize": "13px",
+                }
+                ),
 
-            #Dropdowns container styling
-            ], style={
-                "display": "flex",
-                "flexWrap": "wrap",
-                "gap": "5px",
-                "marginBottom": "10px",
-                "fontFamily": "Arial",
-                "fontSize": "13px",
-            }
-            ),
+                job_progress("fill-activity-heatmap"), #Shown while the chart is being worked out
+                dcc.Graph(id="fill-activity-heatmap", config={"displayModeBar": False})
+            ])
+        #Card styling
+        ], style={
+            "backgroundColor": "#ffffff",
+            "boxShadow": "0 4px 12px rgba(0,0,0,0.1)",
+        })
+    ])
 
-            dcc.Graph(id="fill-activity-heatmap", config={"displayModeBar": False})
-        ])
-    #Card styling
-    ], style={
-        "backgroundColor": "#ffffff",
-        "boxShadow": "0 4px 12px rgba(0,0,0,0.1)",
-    })
-])
 
 
 
 
+###################################################################
+# Bin ID dropdown options, looked up in the in-memory search index as the user types
+###################################################################
+register_search_dropdown("analytics-bin-id-dropdown", search_bin_ids)
 
 ###################################################################
 # Callback for populating weekly fill level WEEK dropdown options
@@ -519,7 +441,7 @@ fill_activity_heatmap_card = html.Div([
 @callback(
     Output("weekly-fill-level-week-dropdown", "options"), #Week options in the filter
     Output("weekly-fill-level-week-dropdown", "value"),
-    Input("weekly-fill-level-month-dropdown", "value"), #Change week options based on month selected
+    Input("analytics-month-dropdown", "value"), #Change week options based on month selected
 )
 def update_week_dropdown_options(selected_month):
     #If no month selected, don't populate the week dropdown filter
@@ -554,115 +476,33 @@ def update_week_dropdown_options(selected_month):
 
 
 ###################################################################
-#Callback for building the Weekly Fill Level Time-series Graph
-@callback(
+#Callbacks for building the Weekly Fill Level Time-series Graph
+#The server sends the whole month's daily fill levels once per bin and month, the graph
+#for the selected week is drawn from them in the browser (ui.weekly_fill_figure in
+#assets/clientside.js), so changing the week doesn't call the server
+@heavy_callback(
+    Output("weekly-fill-level-series", "data"),
+    Input("analytics-bin-id-dropdown", "value"), #Bin ID
+    Input("analytics-month-dropdown", "value"), #Month
+    widget_id="weekly-fill-level-time-graph",
+    datasets=["bin_data"], #new readings change the charts
+)
+def load_weekly_fill_level_series(selected_bin_id, selected_month):
+    #Daily avg, min and max fill levels for the selected month
+    daily_fill_stats = weekly_fill_stats(selected_bin_id, selected_month)
+
+    #series is None when there is no data, the browser shows an empty graph
+    return {
+        "bin_id": selected_bin_id,
+        "series": to_columns(daily_fill_stats, "weekly-fill-level-series") if daily_fill_stats is not None else None,
+    }
+
+clientside_callback(
+    ClientsideFunction(namespace="ui", function_name="weekly_fill_figure"),
     Output("weekly-fill-level-time-graph", "figure"),
-    Output("filtered-weekly-fill-data", "data"), #Store the filtered data for exporting -AN
-
-    Input("weekly-fill-level-bin-id-dropdown", "value"), #Bin ID
-    Input("weekly-fill-level-month-dropdown", "value"), #Month
+    Input("weekly-fill-level-series", "data"),
     Input("weekly-fill-level-week-dropdown", "value"), #Week
 )
-def generate_weekly_fill_level_time_series(selected_bin_id, selected_month, selected_week_start):
-    #Fetch bin fill level data
-    df = get_bin_fill_history(selected_bin_id)
-
-    if df.empty:
-        #If no data, return empty graph
-        return go.Figure(
-            layout=go.Layout(
-                title="No data available.",
-                xaxis=dict(visible=False),
-                yaxis=dict(visible=False),
-                plot_bgcolor="#F9F7FA"
-            )
-        ), []#and return empty data for the data store for exports
-    
-    #Get timestamps and format to datetime for handling
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    #Create a 'date' column to group by day
-    df['date'] = df['timestamp'].dt.date #Get date only
-
-    #Filter df rows by the selected month only, and format into string YYYY-MM
-    df = df[df['timestamp'].dt.strftime("%Y-%m") == selected_month]
-
-    #Filter data to the selected week if selected
-    if selected_week_start:
-        #Convert selected week start string (e.g. '2025-05-06') into datetime object (to compare with df['date'])
-        week_start = pd.to_datetime(selected_week_start).date() #convert to Python datetime object to compare below
-        week_end = week_start + timedelta(days=7)
-
-        #Filter rows where date column is within week_start and end
-        df = df[(df['date'] >= week_start) & (df['date'] < week_end)]
-    
-    #Group by the date and calc AVG, min and max
-    daily_fill_stats = (
-        df.groupby("date")['fill_level'] #Group fill level values by each date
-        .agg(avg="mean", min="min", max="max") #Find the avg, min & max in each group of fill level values per date
-        .reset_index() #groupby() makes the 'date' column the index, reset it to normal for plotting the graph
-        .sort_values("date") #Sort date ascending
-    )
-
-    #If no data found AFTER filtering, return empty graph
-    if daily_fill_stats.empty:
-        return go.Figure(
-            layout=go.Layout(
-                title="No data available for selected filters.",
-                xaxis=dict(title="Date", tickformat="%d %b"),
-                yaxis=dict(title="Fill Level (%)", range=[0, 100]),
-                plot_bgcolor="#F9F7FA"
-            )
-        ), []#and return empty data for the data store for exports
-
-    #Build the time series graph
-    fig = go.Figure()
-
-    #AVG plots
-    fig.add_trace(
-        go.Scatter(
-            x=daily_fill_stats["date"],
-            y=daily_fill_stats["avg"],
-            mode="lines+markers",
-            name="Avg Fill",
-            line=dict(color="#F08A07", shape="spline", smoothing=1.3), #Make the line curved and orange
-        )
-    ) 
-
-    #MIN plots
-    fig.add_trace(
-        go.Scatter(
-            x=daily_fill_stats["date"],
-            y=daily_fill_stats["min"],
-            mode="lines+markers",
-            name="Min Fill",
-            line=dict(color="#79C3F0", shape="spline", smoothing=1.3), #Make the line curved
-        )
-    )
-
-    #MAX plots
-    fig.add_trace(
-        go.Scatter(
-            x=daily_fill_stats["date"],
-            y=daily_fill_stats["max"],
-            mode="lines+markers",
-            name="Max Fill",
-            line=dict(color="#A981F0", shape="spline", smoothing=1.3), #Make the line curved
-        
-        )
-    )
-
-    #Style the figure layout
-    fig.update_layout(
-        title=f"Fill Level Trends for Bin: #{selected_bin_id}",
-        xaxis=dict(title="Date", tickformat="%d %b"),
-        yaxis=dict(title="Fill Level (%)", range=[0, 100]),
-        hovermode="x unified", #Show single tooltip on hover
-        margin=dict(l=40, r=20, t=50, b=40),
-        plot_bgcolor="#F9F7FA", #extremely light purple chart bg colour
-    )
-
-
-    return fig, daily_fill_stats.to_dict("records")
 
 
 ###################################################################
@@ -670,7 +510,7 @@ def generate_weekly_fill_level_time_series(selected_bin_id, selected_month, sele
 @callback(
     Output("to-80-full-week-dropdown", "options"),
     Output("to-80-full-week-dropdown", "value"),
-    Input("to-80-full-month-dropdown", "value"),
+    Input("analytics-month-dropdown", "value"),
 )
 def update_time_to_80_week_dropdown_options(selected_month):
     #If no month selected, don't populate the week dropdown filter
@@ -704,105 +544,48 @@ def update_time_to_80_week_dropdown_options(selected_month):
     return weeks, None
 
 ###################################################################
-# Callback for building Time TAken to 80% Full Chart
-@callback(
-    Output("time-to-80-line-chart", "figure"),
-    Output("filtered-80-data", "data"), #Store the filtered data for exporting -AN
-
-    Input("to-80-full-bin-id-dropdown", "value"), #Bin ID
-    Input("to-80-full-month-dropdown", "value"), #Month
-    Input("to-80-full-week-dropdown", "value"), #Week
+# Callbacks for building Time TAken to 80% Full Chart
+# Sent once per bin and month like the fill level graph, drawn for the selected week in
+# the browser (ui.time_to_80_figure in assets/clientside.js)
+@heavy_callback(
+    Output("time-to-80-series", "data"),
+    Input("analytics-bin-id-dropdown", "value"), #Bin ID
+    Input("analytics-month-dropdown", "value"), #Month
+    widget_id="time-to-80-line-chart",
+    datasets=["bin_data"], #new readings change the charts
 )
-def generate_time_to_80_chart(selected_bin_id, selected_month, selected_week_start):
-    #Get df based on bin ID  selected
-    df = get_time_to_80_data(selected_bin_id)
-
-    if df.empty:
-        #If no data, return empty graph
-        return go.Figure(
-            layout=go.Layout(
-                title="No data available.",
-                xaxis=dict(visible=False),
-                yaxis=dict(visible=False),
-                plot_bgcolor="#F9F7FA"
-            )
-        ), []#and return empty data for the data store for exports
-
-    #Get timestamps and format to datetime for handling
-    df['date'] = pd.to_datetime(df['date'])
-
-    #Filter df rows by the selected month only, and format into string YYYY-MM
-    df = df[df['date'].dt.strftime("%Y-%m") == selected_month]
-
-    #Filter data to the selected week if selected
-    if selected_week_start:
-        #Convert selected week start string (e.g. '2025-05-06') into datetime object (to compare with df['date'])
-        week_start = pd.to_datetime(selected_week_start)
-        week_end = week_start + timedelta(days=7)
+def load_time_to_80_series(selected_bin_id, selected_month):
+    #Avg time to 80% full per day for the selected month
+    daily_avg_to_80_full = time_to_80_stats(selected_bin_id, selected_month)
 
-        #Filter rows where date column is within week_start and end
-        df = df[(df['date'] >= week_start) & (df['date'] < week_end)]
+    return {
+        "bin_id": selected_bin_id,
+        "series": to_columns(daily_avg_to_80_full, "time-to-80-series") if daily_avg_to_80_full is not None else None,
+    }
 
-    #Find the avg times for bins to get full each day
-    daily_avg_to_80_full = (
-        df.groupby("date")['time_to_fill'] #Group values by each date
-        .mean() #Find the avg in each group of time to 80% values per date
-        .reset_index() #groupby() makes the 'date' column the index, reset it to normal for plotting the graph
-        .sort_values("date") #Sort date ascending
-    )
-    
-    #If no data found AFTER filtering, return empty graph
-    if daily_avg_to_80_full.empty:
-        return go.Figure(
-            layout=go.Layout(
-                title="No data available for selected filters.",
-                xaxis=dict(title="Date", tickformat="%d %b"),
-                yaxis=dict(title="Duration (days)", rangemode="tozero"),
-                plot_bgcolor="#F9F7FA"
-            )
-        ), []#and return empty data for the data store for exports
-
-    fig = go.Figure()
-
-    fig.add_trace(
-        go.Scatter(
-            x=daily_avg_to_80_full["date"],
-            y=(daily_avg_to_80_full["time_to_fill"] / 1440).round(2), #There are 1440 minutes per day, divide by this to get days instead of minutes
-            mode="lines+markers",
-            name="Avg Time to 80%",
-            line=dict(color="#22960B", shape="spline", smoothing=1.3),
-            hovertemplate="Duration: %{y} days<extra></extra>" #Tooltip text, extra tags hides default text
-        )
-    )
-
-    #Style the figure layout
-    fig.update_layout(
-        title=f"Avg Time to Reach 80% Full for Bin: #{selected_bin_id}",
-        xaxis=dict(title="Date", tickformat="%d %b"),
-        yaxis=dict(title="Duration (days)", rangemode="tozero"),
-        hovermode="x unified", #Show single tooltip box for each marker
-        margin=dict(l=40, r=20, t=50, b=40),
-        plot_bgcolor="#F9F7FA",
-    )
-
-    return fig, daily_avg_to_80_full.to_dict("records")
+clientside_callback(
+    ClientsideFunction(namespace="ui", function_name="time_to_80_figure"),
+    Output("time-to-80-line-chart", "figure"),
+    Input("time-to-80-series", "data"),
+    Input("to-80-full-week-dropdown", "value"), #Week
+)
 
 
 
 ###################################################################
 # Callback for building WEEKLY Collections bar chart
-@callback(
+@heavy_callback(
     Output("daily-collections-bar-chart", "figure"),
-    Output("filtered-collections-data", "data"), #Store the filtered data for exporting -AN
-
-    Input("daily-collections-bin-id-dropdown", "value"), #Bin ID
-    Input("daily-collections-month-dropdown", "value"), #Month
+    Input("analytics-bin-id-dropdown", "value"), #Bin ID
+    Input("analytics-month-dropdown", "value"), #Month
+    widget_id="daily-collections-bar-chart",
+    datasets=["bin_data"], #new readings change the charts
 )
 def generate_collections_bar_chart(selected_bin_id, selected_month):
-    #Get empty event timestamps for selected bin
-    df = get_daily_bin_collections(selected_bin_id)
+    #Collections per week for the selected month
+    weekly_collection_counts = collections_per_week(selected_bin_id, selected_month)
 
-    if df.empty:
+    if weekly_collection_counts is None:
         #If no data, return empty graph
         return go.Figure(
             layout=go.Layout(
@@ -811,24 +594,7 @@ def generate_collections_bar_chart(selected_bin_id, selected_month):
                 yaxis=dict(visible=False),
                 plot_bgcolor="#F9F7FA"
             )
-        ), []#and return empty data for the data store for exports
-
-    #Get timestamps and format to datetime for handling
-    df['date'] = pd.to_datetime(df['date'])
-
-    #Filter df rows by the selected month only, and format into string YYYY-MM
-    df = df[df['date'].dt.strftime("%Y-%m") == selected_month]
-
-    #Create a column for the start of the week, to group the data by week
-    df['week_start'] = df['date'] - pd.to_timedelta(df['date'].dt.weekday, unit='d') #Get the Monday of that week
-
-    #Find the total collections per week for selected bin
-    weekly_collection_counts = (
-        df.groupby("week_start")['timestamp'] #Group by each Monday (week_start)
-        .count() #Find the sum of collection events in each week
-        .reset_index(name="collections") #groupby() makes the 'date' column the index, reset it to normal for plotting the graph
-        .sort_values("week_start") #Sort ascending
-    )
+        )
 
     #If no data found AFTER filtering, return empty graph
     if weekly_collection_counts.empty:
@@ -839,7 +605,7 @@ def generate_collections_bar_chart(selected_bin_id, selected_month):
                 yaxis=dict(title="Times Emptied"),
                 plot_bgcolor="#F9F7FA"
             )
-        ), []#and return empty data for the data store for exports
+        )
 
     #Create list of colours for the bars depending on collection value
     colours = []
@@ -889,23 +655,23 @@ def generate_collections_bar_chart(selected_bin_id, selected_month):
         plot_bgcolor="#F9F7FA"
     )
 
-    return fig, weekly_collection_counts.to_dict("records")
+    return fig
 
 
 ###################################################################
 # Callback for building Time of Day Bins Emptied bar chart
-@callback(
+@heavy_callback(
     Output("time-emptied-bar-chart", "figure"),
-    Output("time-bins-emptied-data", "data"), #Store the filtered data for exporting
-
-    Input("time-emptied-bin-id-dropdown", "value"), #Bin ID
-    Input("time-emptied-month-dropdown", "value"), #Month
+    Input("analytics-bin-id-dropdown", "value"), #Bin ID
+    Input("analytics-month-dropdown", "value"), #Month
+    widget_id="time-emptied-bar-chart",
+    datasets=["bin_data"], #new readings change the charts
 )
 def generate_time_emptied_bar_chart(selected_bin_id, selected_month):
-    #Get empty event timestamps for selected bin
-    df = get_daily_bin_collections(selected_bin_id)
+    #Collections per hour of the day (0-23) for the selected month
+    collection_hour_counts = collections_per_hour(selected_bin_id, selected_month)
 
-    if df.empty:
+    if collection_hour_counts is None:
         #If no data, return empty graph
         return go.Figure(
             layout=go.Layout(
@@ -914,24 +680,7 @@ def generate_time_emptied_bar_chart(selected_bin_id, selected_month):
                 yaxis=dict(visible=False),
                 plot_bgcolor="#F9F7FA"
             )
-        ), []#and return empty data for the data store for exports
-
-    #Get timestamps and format to datetime for handling
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-
-    #Filter df rows by the selected month only, and format into string YYYY-MM
-    df = df[df['timestamp'].dt.strftime("%Y-%m") == selected_month]
-
-    #Make new column with only the hour value extracted from timestamp
-    df['hour'] = df['timestamp'].dt.hour
-
-    #Find the total collections per HOUR for selected bin
-    collection_hour_counts = (
-        df.groupby("hour")['timestamp'] #Group by each hour
-        .count() #Find the sum of collections in each hour
-        .reset_index(name="collections") #groupby() makes the 'date' column the index, reset it to normal for plotting the graph
-        .sort_values("hour") #Sort ascending by hour
-    )
+        )
 
     #If no data found AFTER filtering, return empty graph
     if collection_hour_counts.empty:
@@ -942,21 +691,8 @@ def generate_time_emptied_bar_chart(selected_bin_id, selected_month):
                 yaxis=dict(title="Times Emptied"),
                 plot_bgcolor="#F9F7FA"
             )
-        ), []#and return empty data for the data store for exports
+        )
     
-    #Represent all hours in the chart 0-2300
-    #Create a dictionary with key 'hour' containing list of numbers from 0-23
-    all_hours = pd.DataFrame({'hour': list(range(24))})
-
-    #Then join collection_hour_counts table with table of all_hours
-    #Join based on "hour" column
-    #How='left' -> keep all rows from left table (all_hours)
-    #Hours with no entries are filled with "0"
-    collection_hour_counts = pd.merge(all_hours, collection_hour_counts, on='hour', how='left').fillna(0)
-
-    #Convert column into integer to clean up any floats
-    collection_hour_counts['collections'] = collection_hour_counts['collections'].astype(int)
-
     #Build bar chart
     fig = go.Figure(
         data=[
@@ -984,24 +720,24 @@ def generate_time_emptied_bar_chart(selected_bin_id, selected_month):
         plot_bgcolor="#F9F7FA"
     )
 
-    return fig, collection_hour_counts.to_dict("records") 
+    return fig
 
 
 
 ###################################################################
 # Callback for building Avg Hourly Fill Activity Heatmap
-@callback(
+@heavy_callback(
     Output("fill-activity-heatmap", "figure"),
-    Output("fill-activity-heatmap-data", "data"), #Store filtered data for exporting
-
-    Input("fill-activity-heatmap-bin-id-dropdown", "value"), #Bin ID
-    Input("fill-activity-heatmap-month-dropdown", "value"), #Month
+    Input("analytics-bin-id-dropdown", "value"), #Bin ID
+    Input("analytics-month-dropdown", "value"), #Month
+    widget_id="fill-activity-heatmap",
+    datasets=["bin_data"], #new readings change the charts
 )
 def build_fill_activity_heatmap(selected_bin_id, selected_month):
-    #Fetch the df and input the bin ID and month parameters via the dropdowns
-    df = get_bin_fill_heatmap_data(selected_bin_id, selected_month)
+    #Avg fill increase by day of week and hour for the selected month
+    df = fill_activity_heatmap(selected_bin_id, selected_month)
 
-    if df.empty:
+    if df is None or df.empty:
         #If no data, return empty graph
         return go.Figure(
             layout=go.Layout(
@@ -1010,10 +746,7 @@ def build_fill_activity_heatmap(selected_bin_id, selected_month):
                 yaxis=dict(title="Day of Week"),
                 plot_bgcolor="#F9F7FA"
             )
-        ), []#and return empty data for the data store for exports
-
-    #Ensure the hour column is an int and not string
-    df['hour'] = df['hour'].astype(int)
+        )
 
     #Rearrange the df into a table using the pivot method where:
     #Columns = hour of day from 0-23
@@ -1056,165 +789,85 @@ def build_fill_activity_heatmap(selected_bin_id, selected_month):
         plot_bgcolor="#FCFCFC" #white bg
     )
 
-    return fig, df.to_dict("records") 
+    return fig
 
 
 
 ###################################################################
-# EXPORT Callbacks
+# EXPORT dropdowns
+# Picking a format downloads the chart's report from /exports (see analytics_reports.py),
+# rebuilt on the server from the chart's filters
 ###################################################################
+register_export_dropdown("export-dropdown", "weekly-fill-levels", {
+    "bin_id": "analytics-bin-id-dropdown",
+    "month": "analytics-month-dropdown",
+    "week": "weekly-fill-level-week-dropdown",
+})
+register_export_dropdown("export-80-dropdown", "time-to-80", {
+    "bin_id": "analytics-bin-id-dropdown",
+    "month": "analytics-month-dropdown",
+    "week": "to-80-full-week-dropdown",
+})
+register_export_dropdown("export-collections-dropdown", "collections", {
+    "bin_id": "analytics-bin-id-dropdown",
+    "month": "analytics-month-dropdown",
+})
+register_export_dropdown("time-bins-emptied-export-dropdown", "collection-times", {
+    "bin_id": "analytics-bin-id-dropdown",
+    "month": "analytics-month-dropdown",
+})
+register_export_dropdown("fill-activity-heatmap-export-dropdown", "fill-activity", {
+    "bin_id": "analytics-bin-id-dropdown",
+    "month": "analytics-month-dropdown",
+})
 
-# Callback for exporting Avg Weekly Fill Level to Excel or PDF -AN
-@callback(
-    Output("download-export", "data"),
-    Input("export-dropdown", "value"),
-    State("filtered-weekly-fill-data", "data"),
-    allow_duplicate=True
-)
-def export_data(selected_option, stored_data):
-    if not stored_data:
-        return no_update
-
-    df = pd.DataFrame(stored_data)
-
-    if selected_option == "excel":
-        with io.BytesIO() as buffer:
-            df.to_excel(buffer, index=False)
-            return dcc.send_bytes(buffer.getvalue(), filename="fill_level_report.xlsx")
-
-
-    return no_update
-
-
-###################################################################
-# Callback for exporting Time to 80% Full data to Excel or PDF -AN
-@callback(
-    Output("download-80-export", "data"),
-    Input("export-80-dropdown", "value"),
-    State("filtered-80-data", "data"),
-    allow_duplicate=True
-)
-def export_80_chart(option, data):
-    if not data:
-        return no_update
-
-    df = pd.DataFrame(data)
-
-    if option == "excel":
-        with io.BytesIO() as buffer:
-            df.to_excel(buffer, index=False)
-            return dcc.send_bytes(buffer.getvalue(), filename="time_to_80_report.xlsx")
-
-
-    return no_update
 
 
 ###################################################################
-# Callback for exporting Daily Collections data to Excel or PDF -AN
-@callback(
-    Output("download-collections-export", "data"),
-    Input("export-collections-dropdown", "value"),
-    State("filtered-collections-data", "data"),
-    allow_duplicate=True
-)
-def export_collections(option, data):
-    if not data:
-        return no_update
-
-    df = pd.DataFrame(data)
-
-    if option == "excel":
-        with io.BytesIO() as buffer:
-            df.to_excel(buffer, index=False)
-            return dcc.send_bytes(buffer.getvalue(), filename="collections_report.xlsx")
-
-
-    return no_update
-
-
-###################################################################
-# Callback for exporting Time Bins Emptied data to Excel or PDF -AN
-@callback(
-    Output("time-bins-emptied-download-export", "data"),
-    Input("time-bins-emptied-export-dropdown", "value"),
-    State("time-bins-emptied-data", "data"),
-    allow_duplicate=True
-)
-def export_time_bins_emptied(option, data):
-    if not data:
-        return no_update
-
-    df = pd.DataFrame(data)
-
-    if option == "excel":
-        with io.BytesIO() as buffer:
-            df.to_excel(buffer, index=False)
-            return dcc.send_bytes(buffer.getvalue(), filename="time_bins_emptied_report.xlsx")
-
-
-    return no_update
-
+#######      LAYOUT       ######
 ###################################################################
-# Callback for exporting Fill Activity Heatmap data to Excel or PDF -AN
-@callback(
-    Output("fill-activity-heatmap-download-export", "data"),
-    Input("fill-activity-heatmap-export-dropdown", "value"),
-    State("fill-activity-heatmap-data", "data"),
-    allow_duplicate=True
-)
-def export_fill_activity_heatmap(option, data):
-    if not data:
-        return no_update
-
-    df = pd.DataFrame(data)
-
-    if option == "excel":
-        with io.BytesIO() as buffer:
-            df.to_excel(buffer, index=False)
-            return dcc.send_bytes(buffer.getvalue(), filename="fill_activity_report.xlsx")
-
-
-    return no_update
+#Layout is a function so the cards are built when the page is opened, not when the app starts
+#(keeps the database out of worker startup and the bin IDs/months current)
+def layout(**kwargs):
+    #Starting options for the Bin ID dropdown, other bins are searched as the user types
+    bin_ids = first_bin_ids()
 
+    return html.Div([
+        dbc.Container([
 
+            dbc.Row([
+                dbc.Col(
+                    html.H4("Data Analytics", className="mb-4"),
+                    width=12
+                )
+            ]),
 
+            #Bin and month for all the charts
+            dbc.Row([
+                dbc.Col(build_analytics_filters_card(bin_ids), xs=12, md=12)
+            ], style={"marginBottom": "20px"}),
 
+            #Card for average fill levels
+            dbc.Row([
+                dbc.Col(build_avg_fill_level_weekly_graph_card(), xs=12, md=12)
+            ], style={"marginBottom": "20px"}),
 
+            #Card for avg duration to get full 80%
+            dbc.Row([
+                dbc.Col(build_avg_time_bin_get_full_chart_card(), xs=12, md=12)
+            ], style={"marginBottom": "20px"}),
 
-###################################################################
-#######      LAYOUT       ######
-###################################################################
-layout = html.Div([
-    dbc.Container([
+            #Card for daily total collections
+            dbc.Row([
+                dbc.Col(build_daily_collections_bar_chart_card(), xs=12, md=6),
+                dbc.Col(build_bin_empty_times_bar_chart_card(), xs=12, md=6)
+            ], style={"marginBottom": "20px"}),
 
-        dbc.Row([
-            dbc.Col(
-                html.H4("Data Analytics", className="mb-4"),
-                width=12
-            )
-        ]),
+            #Card for Heat map avg fill activity
+            dbc.Row([
+                dbc.Col(build_fill_activity_heatmap_card(), xs=12, md=12),
+            ])
 
-        #Card for average fill levels
-        dbc.Row([
-            dbc.Col(avg_fill_level_weekly_graph_card, xs=12, md=12)
-        ], style={"marginBottom": "20px"}),
-
-        #Card for avg duration to get full 80%
-        dbc.Row([
-            dbc.Col(avg_time_bin_get_full_chart_card, xs=12, md=12)
-        ], style={"marginBottom": "20px"}),
-
-        #Card for daily total collections
-        dbc.Row([
-            dbc.Col(daily_collections_bar_chart_card, xs=12, md=6),
-            dbc.Col(bin_empty_times_bar_chart_card, xs=12, md=6)
-        ], style={"marginBottom": "20px"}),
-
-        #Card for Heat map avg fill activity
-        dbc.Row([
-            dbc.Col(fill_activity_heatmap_card, xs=12, md=12),
         ])
-
-    ])
     
-]) 
+    ]) 
@@ -1,145 +1,141 @@
 from dash import Dash, html, register_page, dcc, callback, Input, Output, dash_table, exceptions, State
 import dash_bootstrap_components as dbc
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+from lazy_imports import go #plotly.graph_objects is imported on first use
 from datetime import datetime, timedelta
 
 
-from data_utils import get_complete_bin_table, get_collection_history, get_bin_data, get_bin_fill_history
+from data_utils import get_complete_bin_table, get_collection_history, get_bin_fill_history, get_fill_readings
+from downsample import minmax_downsample, chart_buckets, chart_width_id, chart_width_store, register_chart_width
+from search_index import first_bin_ids, search_bin_ids, search_store, register_search_dropdown
+from live_updates import version_store_id
 
 #Register this file as a Dash page
 register_page(__name__, path="/bin-fill-levels", name="Fill Level & Collection Activity")
 
+#Most points in the fill history line chart that still get markers and value labels
+MAX_LABELLED_POINTS = 100
+
 
 
 
 ###################################################################
 # Create bin fill history card to show last 100 records
 ###################################################################
-bin_df = get_bin_data() #Fetch latest bin data
-#Get distinct bin IDs from the bin data into bin_ids
-bin_ids = sorted(bin_df['bin_id'].unique())
-
-bin_history_card = html.Div([
-    dbc.Card([
-        dbc.CardHeader(
-            #Card header
-            dbc.Row([
-                dbc.Col(html.H5("Latest Fill Level Records", className="card-title"))
-            ]), 
-            style={
-                "backgroundColor": "#FFFFFF", #Header bg colour 
-                "paddingTop": "15px",
-                "borderBottom": "none" #Remove the grey border under cardheader
-            } 
-        ),
-
-        dbc.CardBody([
-            html.Div([
-                html.H6("Bin ID:", style={"marginRight": "5px", "fontSize": "12px", "fontWeight": "bold"}),
-                #Dropdown selection for Bin IDs
-                dcc.Dropdown(
-                    id='fill-history-bin-id-dropdown',
-                    #Populate dropdown options with bin_ids created earlier
-                    options=[{'label': b, 'value': b} for b in bin_ids],
-                    value=bin_ids[0], #Set the first index item as the default bin ID
-                    placeholder='Select Bin ID',
-                    #multi=True, #Can select multiple bins
-                    style={
-                        'width': '200px'
-                    }                   
-                ),               
-            #Style for dropdown and header container
-            ], style={
-                "display": "flex",
-                "flexWrap": "wrap", #enable wrapping on small screens so items don't overflow off the card
-                "alignItems": "center",
-                "marginBottom": "10px",
-                "fontFamily": "Arial", #dropdown font
-                "fontSize": "13px",
-                }
+def build_bin_history_card(bin_ids):
+    return html.Div([
+        dbc.Card([
+            dbc.CardHeader(
+                #Card header
+                dbc.Row([
+                    dbc.Col(html.H5("Latest Fill Level Records", className="card-title"))
+                ]), 
+                style={
+                    "backgroundColor": "#FFFFFF", #Header bg colour 
+                    "paddingTop": "15px",
+                    "borderBottom": "none" #Remove the grey border under cardheader
+                } 
             ),
 
-            #Create DataTable for Bin fill history
-            dash_table.DataTable(
-                id="bin-fill-history-table",
-                columns=[
-                    {'name': '#', 'id': 'row_number'},
-                    {'name': 'Fill Level', 'id': 'fill_level_display'},
-                    {'name': 'Δ Fill Level', 'id': 'fill_level_change_string'},
-                    {'name': 'Timestamp', 'id': 'timestamp_string'},                   
-                ],
-
-                data=[], #populated via callback
-                page_size=10,
-                cell_selectable=False, #DON'T allow cells to be selected/highlighted to prevent default styles from overriding
+            dbc.CardBody([
+                html.Div([
+                    html.H6("Bin ID:", style={"marginRight": "5px", "fontSize": "12px", "fontWeight": "bold"}),
+                    #Dropdown selection for Bin IDs
+                    dcc.Dropdown(
+                        id='fill-history-bin-id-dropdown',
+                        #Populate dropdown options with bin_ids created earlier, the rest are found by typing
+                        options=[{'label': b, 'value': b} for b in bin_ids],
+                        value=bin_ids[0], #Set the first index item as the default bin ID
+                        placeholder='Select Bin ID',
+                        #multi=True, #Can select multiple bins
+                        style={
+                            'width': '200px'
+                        }                   
+                    ),               
+                    search_store('fill-history-bin-id-dropdown'), #Debounced search text
+                #Style for dropdown and header container
+                ], style={
+                    "display": "flex",
+                    "flexWrap": "wrap", #enable wrapping on small screens so items don't overflow off the card
+                    "alignItems": "center",
+                    "marginBottom": "10px",
+                    "fontFamily": "Arial", #dropdown font
+                    "fontSize": "13px",
+                    }
+                ),
+
+                #Create DataTable for Bin fill history
+                dash_table.DataTable(
+                    id="bin-fill-history-table",
+                    columns=[
+                        {'name': '#', 'id': 'row_number'},
+                        {'name': 'Fill Level', 'id': 'fill_level_display'},
+                        {'name': 'Δ Fill Level', 'id': 'fill_level_change_string'},
+                        {'name': 'Timestamp', 'id': 'timestamp_string'},                   
+                    ],
+
+                    data=[], #populated via callback
+                    page_size=10,
+                    cell_selectable=False, #DON'T allow cells to be selected/highlighted to prevent default styles from overriding
                 
-                style_table={
-                    'overflowX': 'auto',
-                    'paddingLeft': '5px',
-                    'marginBottom': '10px',
-                },
-
-                style_cell={
-                    'textAlign': 'center',
-                    'fontFamily': 'Arial',
-                    'fontSize': '14px',
-                    'padding': '6px'
-                },
-
-                style_header={
-                    'fontWeight': 'bold',
-                    'backgroundColor': '#893FB5', #Header purple
-                    'fontSize': '15px',
-                    'textAlign': 'center',
-                    'padding': '10px',
-                    'color': 'white',
-                },
-
-                #Conditional cell styling
-                style_data_conditional=[
-                    #Striped rows
-                    {
-                        'if': {'row_index': 'odd'},
-                        'backgroundColor': '#F1EEF7' #very light purplre
+                    style_table={
+                        'overflowX': 'auto',
+                        'paddingLeft': '5px',
+                        'marginBottom': '10px',
                     },
 
-                    #If fill level 80-89 make cell bg red
-                    {
-                        'if': {
-                            'filter_query': '{fill_level} >= 80 && {fill_level} < 90',
-                            'column_id': 'fill_level_display'
-                        },
-                        'backgroundColor': '#C2171D', #Dark red
-                        'color': 'black'
+                    style_cell={
+                        'textAlign': 'center',
+                        'fontFamily': 'Arial',
+                        'fontSize': '14px',
+                        'padding': '6px'
                     },
 
-                    #If fill level 90+ make cell bg bright red
-                    {
-                        'if': {
-                            'filter_query': '{fill_level} >= 90',
-                            'column_id': 'fill_level_display'
-                        },
-                        'backgroundColor': '#E62727', #Bright red
-                        'color': 'black'
+                    style_header={
+                        'fontWeight': 'bold',
+                        'backgroundColor': '#893FB5', #Header purple
+                        'fontSize': '15px',
+                        'textAlign': 'center',
+                        'padding': '10px',
+                        'color': 'white',
                     },
-                ]
-            )
-        ])
-    #Style the card    
-    ], style={
-        "backgroundColor": "#FFFFFF",
-        "boxShadow": "0 4px 12px rgba(0, 0, 0, 0.1)",
-    }),
-
-    #Update card every 15 minutes
-    dcc.Interval(
-    id='update-bin-fill-history-table-interval',
-    interval=15 * 60 * 1000,  #15 minutes in milliseconds
-    n_intervals=0
-)
-])
+
+                    #Conditional cell styling
+                    style_data_conditional=[
+                        #Striped rows
+                        {
+                            'if': {'row_index': 'odd'},
+                            'backgroundColor': '#F1EEF7' #very light purplre
+                        },
+
+                        #If fill level 80-89 make cell bg red
+                        {
+                            'if': {
+                                'filter_query': '{fill_level} >= 80 && {fill_level} < 90',
+                                'column_id': 'fill_level_display'
+                            },
+                            'backgroundColor': '#C2171D', #Dark red
+                            'color': 'black'
+                        },
+
+                        #If fill level 90+ make cell bg bright red
+                        {
+                            'if': {
+                                'filter_query': '{fill_level} >= 90',
+                                'column_id': 'fill_level_display'
+                            },
+                            'backgroundColor': '#E62727', #Bright red
+                            'color': 'black'
+                        },
+                    ]
+                )
+            ])
+        #Style the card    
+        ], style={
+            "backgroundColor": "#FFFFFF",
+            "boxShadow": "0 4px 12px rgba(0, 0, 0, 0.1)",
+        }),
+    ])
 
 
 ###################################################################
@@ -187,71 +183,73 @@ def get_current_month_value():
     return datetime.today().strftime('%Y-%m')
 
 
-bin_fill_history_line_chart = html.Div([
-    dbc.Card([
-        dbc.CardBody([
-            html.Div([
-            #Dropdown for months
-            dcc.Dropdown(
-                id="fill-history-line-chart-month-dropdown",
-                options=generate_month_options(),
-                value=get_current_month_value(),
-                clearable=False,
-                style={
-                    "width": "200px",
-                }
-            ),
-
-            #Dropdown for weeks based on selected month
-            dcc.Dropdown(
-                id="fill-history-line-chart-week-dropdown",
-                options=[], #Populate dropdown with the weeks of the selected month
-                value=None, #Current week by default
-                clearable=False,
-                style={
-                    'width': '230px',
-                }
-            ),
+def build_bin_fill_history_line_chart():
+    return html.Div([
+        dbc.Card([
+            dbc.CardBody([
+                html.Div([
+                #Dropdown for months
+                dcc.Dropdown(
+                    id="fill-history-line-chart-month-dropdown",
+                    options=generate_month_options(),
+                    value=get_current_month_value(),
+                    clearable=False,
+                    style={
+                        "width": "200px",
+                    }
+                ),
 
-            html.Div([
-                #Header for Bin ID
-                html.H6(
-                    id="selected-bin-id-line-chart-title",
+                #Dropdown for weeks based on selected month
+                dcc.Dropdown(
+                    id="fill-history-line-chart-week-dropdown",
+                    options=[], #Populate dropdown with the weeks of the selected month
+                    value=None, #Current week by default
+                    clearable=False,
                     style={
-                        "fontSize": "12px",
-                        "fontWeight": "bold",
-                        "margin": "0",
+                        'width': '230px',
                     }
-                )
+                ),
+
+                html.Div([
+                    #Header for Bin ID
+                    html.H6(
+                        id="selected-bin-id-line-chart-title",
+                        style={
+                            "fontSize": "12px",
+                            "fontWeight": "bold",
+                            "margin": "0",
+                        }
+                    )
+                ], style={
+                    "marginLeft": "auto", #Push bin id header to far right
+                    "display": "flex",
+                    "alignItems": "center"
+                }),
+        
+            #Styling for dropdown filters container
             ], style={
-                "marginLeft": "auto", #Push bin id header to far right
                 "display": "flex",
-                "alignItems": "center"
-            }),
-        
-        #Styling for dropdown filters container
-        ], style={
-            "display": "flex",
-            "gap": "10px",
-            "marginBottom": "10px",
-            "flexWrap": "wrap", #enable wrapping on small screens so items don't overflow off the card
-            "alignItems": "center",
-            "fontFamily": "Arial", #dropdown font
-            "fontSize": "13px",
-        }
-        ),
+                "gap": "10px",
+                "marginBottom": "10px",
+                "flexWrap": "wrap", #enable wrapping on small screens so items don't overflow off the card
+                "alignItems": "center",
+                "fontFamily": "Arial", #dropdown font
+                "fontSize": "13px",
+            }
+            ),
 
-        #Line chart
-        dcc.Graph(id="fill-history-line-chart")
-        ])
+            #Line chart
+            dcc.Graph(id="fill-history-line-chart"),
+            chart_width_store("fill-history-line-chart"),
+            ])
     
-    #Style the card
-    ], style={
-        "backgroundColor": "#FFFFFF",
-        "boxShadow": "0 4px 12px rgba(0, 0, 0, 0.1)",
-        "padding": "3px",
-    })
-])
+        #Style the card
+        ], style={
+            "backgroundColor": "#FFFFFF",
+            "boxShadow": "0 4px 12px rgba(0, 0, 0, 0.1)",
+            "padding": "3px",
+        })
+    ])
 
 
 
@@ -261,157 +259,152 @@ bin_fill_history_line_chart = html.Div([
 # Create the collection table card
 ###################################################################
 
-collection_table_card = html.Div([
-    dbc.Card([
-        dbc.CardHeader(
-            #Card header
-            dbc.Row([
-                dbc.Col(html.H5("Collection History", className="card-title"))
-            ]), style={
-                "backgroundColor": "#FFFFFF", #Header bg colour
-                "paddingTop": "15px",
-                "borderBottom": "none" #Remove the grey border under cardheader
-            } 
-        ),    
-
-        dbc.CardBody([
-            html.Div([
-                html.H6("Bin ID:", style={"marginRight": "5px", "fontSize": "12px", "fontWeight": "bold"}),
-                #Dropdown selection for Bin IDs
-                dcc.Dropdown(
-                    id='collection-table-bin-id-dropdown',
-                    #Populate dropdown options with bin_ids created earlier
-                    options=[{'label': b, 'value': b} for b in bin_ids],
-                    value=bin_ids[0], #Set the first index item as the default bin ID
-                    placeholder='Select Bin ID',
-                    #multi=True, #Can select multiple bins
-                    style={
-                        'width': '200px'
-                    }                   
-                ),               
-            ], style={
-                "display": "flex",
-                "flexWrap": "wrap", #enable wrapping on small screens so items don't overflow off the card
-                "alignItems": "center",
-                "marginBottom": "15px",
-                "fontFamily": "Arial", #dropdown font
-                "fontSize": "13px",
-                }
-            ),
+def build_collection_table_card(bin_ids):
+    return html.Div([
+        dbc.Card([
+            dbc.CardHeader(
+                #Card header
+                dbc.Row([
+                    dbc.Col(html.H5("Collection History", className="card-title"))
+                ]), style={
+                    "backgroundColor": "#FFFFFF", #Header bg colour
+                    "paddingTop": "15px",
+                    "borderBottom": "none" #Remove the grey border under cardheader
+                } 
+            ),    
+
+            dbc.CardBody([
+                html.Div([
+                    html.H6("Bin ID:", style={"marginRight": "5px", "fontSize": "12px", "fontWeight": "bold"}),
+                    #Dropdown selection for Bin IDs
+                    dcc.Dropdown(
+                        id='collection-table-bin-id-dropdown',
+                        #Populate dropdown options with bin_ids created earlier, the rest are found by typing
+                        options=[{'label': b, 'value': b} for b in bin_ids],
+                        value=bin_ids[0], #Set the first index item as the default bin ID
+                        placeholder='Select Bin ID',
+                        #multi=True, #Can select multiple bins
+                        style={
+                            'width': '200px'
+                        }                   
+                    ),               
+                    search_store('collection-table-bin-id-dropdown'), #Debounced search text
+                ], style={
+                    "display": "flex",
+                    "flexWrap": "wrap", #enable wrapping on small screens so items don't overflow off the card
+                    "alignItems": "center",
+                    "marginBottom": "15px",
+                    "fontFamily": "Arial", #dropdown font
+                    "fontSize": "13px",
+                    }
+                ),
+
+                #Create the datatable
+                dash_table.DataTable(
+                    id="collection-history-table",
+                    columns=[
+                        {'name': 'Collection Date', 'id': 'collection_timestamp_string'},
+                        {'name': 'Fill Level at Time of Collection', 'id': 'fill_level'},
+                        {'name': 'Time Taken to Empty Since Reaching 80% Full', 'id': 'time_since_full_string'},
+                    ],
+                    data=[],
+                    sort_action='custom',
+                    sort_mode='single',
+                    cell_selectable=False, #DON'T allow cells to be selected/highlighted to prevent default styles from overriding
+
+                    style_table={
+                        'overflowX': 'auto',
+                        'paddingLeft': '5px',
+                        #'border': '1px solid #ccc', #grey border around table
+                    },
 
-            #Create the datatable
-            dash_table.DataTable(
-                id="collection-history-table",
-                columns=[
-                    {'name': 'Collection Date', 'id': 'collection_timestamp_string'},
-                    {'name': 'Fill Level at Time of Collection', 'id': 'fill_level'},
-                    {'name': 'Time Taken to Empty Since Reaching 80% Full', 'id': 'time_since_full_string'},
-                ],
-                data=[],
-                sort_action='custom',
-                sort_mode='single',
-                cell_selectable=False, #DON'T allow cells to be selected/highlighted to prevent default styles from overriding
-
-                style_table={
-                    'overflowX': 'auto',
-                    'paddingLeft': '5px',
-                    #'border': '1px solid #ccc', #grey border around table
-                },
-
-                style_cell={
-                    'textAlign': 'center',
-                    "fontFamily": "Arial", 
-                    "fontSize": "14px",
-                    "padding": "6px",
-                },
-                
-                #Table header columns
-                style_header={
-                    "fontWeight": "bold", 
-                    "fontFamily": "Arial", 
-                    "fontSize": "15px",
-                    "textAlign": "center",
-                    "backgroundColor": "#893FB5", #Header purple
-                    "padding": "10px",
-                    'color': 'white'
-                },
-
-                #Conditional styling of the cells
-                style_data_conditional=[                    
-                #Change cell bg colour based on fill level
-                {
-                    'if': {
-                        'filter_query': '{fill_level} >= 90', 
-                        'column_id': 'fill_level' #output bg colour to this column
+                    style_cell={
+                        'textAlign': 'center',
+                        "fontFamily": "Arial", 
+                        "fontSize": "14px",
+                        "padding": "6px",
                     },
-                    'backgroundColor': '#E62727', #Bright red
-                    'color': 'black'
-                },
-
-                #Highlight delay in emptying (12+ hours) very full bins <90
-                {
-                    'if': {
-                        'filter_query': '{fill_level} > 90 && {time_since_full} >= 720',
-                        'column_id': 'time_since_full_string'
+                
+                    #Table header columns
+                    style_header={
+                        "fontWeight": "bold", 
+                        "fontFamily": "Arial", 
+                        "fontSize": "15px",
+                        "textAlign": "center",
+                        "backgroundColor": "#893FB5", #Header purple
+                        "padding": "10px",
+                        'color': 'white'
                     },
-                    'backgroundColor': '#E62727', # Bright red
-                    'color': 'black'
-                },
 
-                ],
+                    #Conditional styling of the cells
+                    style_data_conditional=[                    
+                    #Change cell bg colour based on fill level
+                    {
+                        'if': {
+                            'filter_query': '{fill_level} >= 90', 
+                            'column_id': 'fill_level' #output bg colour to this column
+                        },
+                        'backgroundColor': '#E62727', #Bright red
+                        'color': 'black'
+                    },
 
-                #Adjust width of columns
-                style_cell_conditional=[
-                        {'if': {'column_id': 'collection_timestamp_string'}, 'width': '180px'},
-                        {'if': {'column_id': 'fill_level'}, 'width': '100px'},
-                        {'if': {'column_id': 'time_since_full_string'}, 'width': '250px'},
-                ],
+                    #Highlight delay in emptying (12+ hours) very full bins <90
+                    {
+                        'if': {
+                            'filter_query': '{fill_level} > 90 && {time_since_full} >= 720',
+                            'column_id': 'time_since_full_string'
+                        },
+                        'backgroundColor': '#E62727', # Bright red
+                        'color': 'black'
+                    },
 
-                page_size=15,
+                    ],
 
-            ),
+                    #Adjust width of columns
+                    style_cell_conditional=[
+                            {'if': {'column_id': 'collection_timestamp_string'}, 'width': '180px'},
+                            {'if': {'column_id': 'fill_level'}, 'width': '100px'},
+                            {'if': {'column_id': 'time_since_full_string'}, 'width': '250px'},
+                    ],
 
-            #Message if no data is found when a Bin ID is selected for filter in collection history table
-            html.Div(
-                id="no-data-message", 
-                style={
-                    'marginTop': '20px', 
-                    'color': '#666', #grey 
-                    'textAlign': 'center',
-                    "fontFamily": "Arial",
-                    }
-            ),
+                    page_size=15,
 
-            #Last updated Time message below collection Table
-            html.Div(
-                id="collection-table-last-updated-msg", 
-                style={
-                    'marginTop': '10px',
-                    'fontSize': '10px',
-                    'color': '#666', #grey
-                    'textAlign': 'right',
-                    'fontStyle': 'italic',
-                }
-            ),
+                ),
 
-        ])
+                #Message if no data is found when a Bin ID is selected for filter in collection history table
+                html.Div(
+                    id="no-data-message", 
+                    style={
+                        'marginTop': '20px', 
+                        'color': '#666', #grey 
+                        'textAlign': 'center',
+                        "fontFamily": "Arial",
+                        }
+                ),
+
+                #Last updated Time message below collection Table
+                html.Div(
+                    id="collection-table-last-updated-msg", 
+                    style={
+                        'marginTop': '10px',
+                        'fontSize': '10px',
+                        'color': '#666', #grey
+                        'textAlign': 'right',
+                        'fontStyle': 'italic',
+                    }
+                ),
 
+            ])
 
 
-    #Card styling
-    ], style={
-            "backgroundColor": "#FFFFFF",
-            "boxShadow": "0 4px 12px rgba(0, 0, 0, 0.1)",
-        }
-    ),
 
-    #Update card every 15 min
-    dcc.Interval(
-        id='update-collection-table-interval',
-        interval=15 * 60 * 1000,  #15 minutes in milliseconds
-        n_intervals=0
-    )
-])
+        #Card styling
+        ], style={
+                "backgroundColor": "#FFFFFF",
+                "boxShadow": "0 4px 12px rgba(0, 0, 0, 0.1)",
+            }
+        ),
+    ])
 
 
 
@@ -423,9 +416,9 @@ collection_table_card = html.Div([
 @callback(
     Output('bin-fill-history-table', 'data'),
     Input('fill-history-bin-id-dropdown', 'value'), #Bin ID filter
-    Input('update-bin-fill-history-table-interval', 'n_intervals') #Update every 15 min
+    Input(version_store_id('bin_data'), 'data') #Update whenever new sensor readings arrive
 )
-def update_bin_fill_history_table(selected_bin, n_intervals):
+def update_bin_fill_history_table(selected_bin, data_version):
     if not selected_bin:
         return [] #Return empty table if dropdown filter is cleared
     
@@ -441,38 +434,39 @@ def update_bin_fill_history_table(selected_bin, n_intervals):
 ###################################################################
 # Callback for bin fill level history line chart
 # Includes filters 
+#Plots every reading of the selected week, downsampled to the chart's width (downsample.py)
 @callback(
         Output('fill-history-line-chart', 'figure'),
         Input('fill-history-bin-id-dropdown', 'value'),
         Input('fill-history-line-chart-week-dropdown', 'value'), #Filter line chart by week start date
+        Input(chart_width_id('fill-history-line-chart'), 'data'), #Chart width in pixels
 )
-def update_fill_history_line_chart(selected_bin_id, selected_week_start):
+def update_fill_history_line_chart(selected_bin_id, selected_week_start, chart_width):
     if not selected_bin_id or not selected_week_start:
         return go.Figure().update_layout(
             title="No bin selected.",
             plot_bgcolor="#F9F7FA")
-    
-    df = get_bin_fill_history(selected_bin_id)
-
-    if df.empty:
-        return go.Figure()
-    
-    
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
 
     #Convert selected week start into datetime
     week_start = pd.to_datetime(selected_week_start)
     week_end = week_start + timedelta(days=7)
 
-    #Filter data to the selected week
-    df = df[(df['timestamp'] >= week_start) & (df['timestamp'] < week_end)] #Get a copy of the df, not just a view, in case of warning message
+    #Readings of the selected week, oldest first
+    df = get_fill_readings([selected_bin_id], week_start, week_end)
     
-    #If df empty after filtering show empty graph
+    #If no readings in the selected week show empty graph
     if df.empty:
         return go.Figure().update_layout(
             title="No data for selected week.",
             plot_bgcolor="#F9F7FA")
 
+    #Change in fill level from the previous reading, worked out before downsampling
+    df['fill_level_change'] = df['fill_level'].diff()
+    df = minmax_downsample(df, 'timestamp', ['fill_level', 'fill_level_change'], chart_buckets(chart_width))
+
+    #Show the markers and values only when there are few enough points to read them
+    mode = 'lines+markers+text' if len(df) <= MAX_LABELLED_POINTS else 'lines'
+
     fig = go.Figure()
     
     #Line chart for fill level
@@ -480,7 +474,7 @@ def update_fill_history_line_chart(selected_bin_id, selected_week_start):
         x=df['timestamp'],
         y=df['fill_level'],
         name='Fill Level',
-        mode='lines+markers+text', #show lines, markers (dots), text
+        mode=mode, #show lines, markers (dots), text
         text=df['fill_level'].round().astype(int).astype(str) + '%', #Text showing fill level above marker
         textposition='top center', #Position relative to markers
         line=dict(color='#22960B'), #green line
@@ -492,7 +486,7 @@ def update_fill_history_line_chart(selected_bin_id, selected_week_start):
         x=df['timestamp'],
         y=df['fill_level_change'],
         name='Δ Fill Level',
-        mode='lines+markers+text',
+        mode=mode,
         text=df['fill_level_change'].apply(
             lambda x: f"{'+' if x > 0 else ''}{round(x)}%" if pd.notnull(x) else "N/A" #If value is missing return "N/A", round x to nearest whole number instead of decimals
         ), #Text showing fill changes number
@@ -576,9 +570,9 @@ def update_bin_id_line_chart_title(selected_bin_id):
     Output('collection-table-last-updated-msg', 'children'), #Last updated message 
     Input('collection-table-bin-id-dropdown', 'value'),
     Input('collection-history-table', 'sort_by'), #for column sorting
-    Input('update-collection-table-interval', 'n_intervals') #update every 15 min
+    Input(version_store_id('bin_data'), 'data') #Update whenever new sensor readings arrive
 )
-def update_collection_history_table(selected_bin, sort_by, n_intervals):
+def update_collection_history_table(selected_bin, sort_by, data_version):
     if selected_bin is None:
         return [], '', '' #Return empty table if dropdown is cleared of any bin ID 
     
@@ -608,36 +602,52 @@ def update_collection_history_table(selected_bin, sort_by, n_intervals):
     #Replace any " 0" from minute value with just space in case
     last_updated = datetime.now().strftime("Last updated at %I:%M %p").lstrip("0").replace(" 0", " ")
 
-    return df.to_dict('records'), '', last_updated #'' used to clear the no data message line if df not empty
+    #The table shows collection_timestamp_string, the raw timestamp is only for the API
+    return df.drop(columns='collection_timestamp').to_dict('records'), '', last_updated #'' used to clear the no data message line if df not empty
 
 
+###################################################################
+# Bin ID dropdown options, looked up in the in-memory search index as the user types
+###################################################################
+register_search_dropdown('fill-history-bin-id-dropdown', search_bin_ids)
+register_search_dropdown('collection-table-bin-id-dropdown', search_bin_ids)
+
+#Fill history line chart width, for downsampling the readings
+register_chart_width('fill-history-line-chart')
+
 ###################################################################
 # Layout
 ###################################################################
-layout = html.Div([
-    dbc.Container([
-        dbc.Row([
-            #Page Header
-            dbc.Col(
-                html.H4("Fill Level & Collection Activity", className="mb-4"),
-                width=12
-            )
-        ]),
-
-
-        #Row for bin history table + line chart
-        dbc.Row([
-            dbc.Col(bin_history_card, xs=12, md=6),
-            dbc.Col(bin_fill_history_line_chart, xs=12, md=6),
-        ], style={"marginBottom": "20px"}
-        ),
+#Layout is a function so the cards are built when the page is opened, not when the app starts
+#(keeps the database out of worker startup and the bin IDs/months current)
+def layout(**kwargs):
+    #Starting options for the bin ID dropdowns (lowest IDs), other bins are searched as the user types
+    bin_ids = first_bin_ids()
+
+    return html.Div([
+        dbc.Container([
+            dbc.Row([
+                #Page Header
+                dbc.Col(
+                    html.H4("Fill Level & Collection Activity", className="mb-4"),
+                    width=12
+                )
+            ]),
 
-        #Row for collection history table
-        dbc.Row([
-            dbc.Col(collection_table_card, xs=12, md=12),
-        ]
-        ),
+
+            #Row for bin history table + line chart
+            dbc.Row([
+                dbc.Col(build_bin_history_card(bin_ids), xs=12, md=6),
+                dbc.Col(build_bin_fill_history_line_chart(), xs=12, md=6),
+            ], style={"marginBottom": "20px"}
+            ),
+
+            #Row for collection history table
+            dbc.Row([
+                dbc.Col(build_collection_table_card(bin_ids), xs=12, md=12),
+            ]
+            ),
     
-    ])
+        ])
 
-])
\ No newline at end of file
+    ])
\ No newline at end of file
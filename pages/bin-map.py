@@ -1,10 +1,13 @@
-from dash import Dash, html, register_page, dcc, callback, Input, Output, exceptions, no_update, State, callback_context
+from dash import Dash, html, register_page, dcc, callback, Input, Output, exceptions, no_update, State, callback_context, clientside_callback, ClientsideFunction
 import dash_leaflet as dl
 import dash_bootstrap_components as dbc
 import pandas as pd
 import math
-from collections import defaultdict
-from data_utils import get_bin_data, get_marker_colour, get_bin_type_and_last_emptied
+from data_utils import get_bin_data, get_bin_type_and_last_emptied
+from map_markers import update_map_markers, LARGE_MAP_POPUP_FIELDS
+from search_index import search_bin_ids, search_addresses, search_store, register_search_dropdown
+from spatial_index import get_spatial_index
+from live_updates import version_store_id, rendered_version_id, rendered_version_store, render_version, current_version
 
 
 #Register this file as a Dash page
@@ -29,6 +32,7 @@ large_map_card = html.Div([
                             style={"width": "200px", "marginRight": "10px",},
                             clearable=True, #Shows a small "x" to reset
                         ),            
+                        search_store('bin-search-dropdown'), #Debounced search text
                     ], style={
                         "zIndex": "4000", #Makes the dropdown options not get overlapped by the bin map nor fill level filter (when vertically stacked due to screen size)
                         "marginRight": "5px",
@@ -69,7 +73,8 @@ large_map_card = html.Div([
                             searchable=True,
                             clearable=True,
                             style={"width": "300px", "marginRight": "5px"},           
-                        )
+                        ),
+                        search_store('address-search-dropdown'), #Debounced search text
                     #Style the dropdown input field
                     ], style={
                         "zIndex": "2000",
@@ -79,6 +84,41 @@ large_map_card = html.Div([
                     ),
 
 
+                    #Bins near me search: choose a radius (or nearest 10) then ask the browser for the user's location
+                    html.Div([
+                        dcc.Dropdown(
+                            id='near-me-radius-dropdown',
+                            options=[
+                                {'label': 'Within 250m', 'value': 250},
+                                {'label': 'Within 500m', 'value': 500},
+                                {'label': 'Within 1km', 'value': 1000},
+                                {'label': 'Within 2km', 'value': 2000},
+                                {'label': 'Nearest 10 bins', 'value': 'nearest'},
+                            ],
+                            value=500, #500m by default
+                            clearable=False,
+                            searchable=False,
+                            style={"width": "150px"}
+                        ),
+                    ], style={
+                        "zIndex": "1500", #Below the other filter dropdowns
+                        "marginRight": "5px",
+                        "flex": "auto"
+                        }
+                    ),
+
+                    dbc.Button(
+                        [html.I(className="bi bi-geo-alt-fill me-1"), "Bins Near Me"],
+                        id="near-me-button",
+                        className="custom-purple-button",
+                        size="sm",
+                        outline=True,
+                    ),
+                    #Gets the user's location from the browser when update_now is set
+                    dcc.Geolocation(id="near-me-geolocation", high_accuracy=True),
+                    #Stores the user's location + radius for the map and filtered bins card
+                    dcc.Store(id="near-me-store"),
+
                     #Reset map button
                     dbc.Button(
                         "Reset", 
@@ -103,6 +143,7 @@ large_map_card = html.Div([
                     dcc.Loading(
                         id="large-map-loading",
                         type="circle",
+                        delay_show=500, #Don't flash the spinner for quick marker updates
                         children=dl.Map(
                             [
                                 dl.LayersControl([
@@ -111,7 +152,11 @@ large_map_card = html.Div([
                                         url="https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}",
                                         attribution="Esri Satellite"
                                     ), name="Satellite View")
-                                ])
+                                ]),
+                                #Bin markers, updated via callback (only changed markers are sent on refresh)
+                                dl.LayerGroup(id="large-map-marker-layer"),
+                                #User's location marker for the bins near me search
+                                dl.LayerGroup(id="large-map-location-layer"),
                             ],
                             id="large-bin-map",
                             center=[-37.7749, 144.8930],
@@ -191,12 +236,9 @@ large_map_card = html.Div([
                         "fontFamily": "'Segoe UI', 'Arial Unicode MS', 'Helvetica', sans-serif",
                         "color": "#333"
                     }),
-                #Sets 15 minutely updates to map    
-                dcc.Interval(
-                    id='update-large-map-interval',
-                    interval=900000,  
-                    n_intervals=0   
-                )
+                #Version of the markers currently on the map, so refreshes only send what changed
+                dcc.Store(id="large-map-marker-state"),
+                rendered_version_store("large-bin-map"), #Bin data version shown on the map
                 
                 ], style={"position": "relative"}),  #Outer container for map + legend
             
@@ -212,125 +254,34 @@ large_map_card = html.Div([
 ])
 
 ###################################################################
-# Build the Map markers, filters by bin if users inputs in search for callback later
-# Builds only marker for filtered bin (if selected) by passing it to the function else builds all
-def build_map_markers_using_bin_data(bin_data):
-    #Get current time to for the "last updated" message
-    now = pd.Timestamp.now()
-    markers = []
-    #Count how many bins at each address, for duplicates
-    position_counts = defaultdict(int)
-    #Offset duplicate bin position so that their markers don't completely overlap on the map
-    position_offsets = defaultdict(int)
-
-    for _, row in bin_data.iterrows():
-        position_key = (round(row['latitude'], 6), round(row['longitude'], 6))
-        position_counts[position_key] += 1
-
-    for _, row in bin_data.iterrows():
-        fill_level = row['fill_level']
-        marker_colour = get_marker_colour(fill_level)
-        last_updated = row['timestamp']
-
-        # Calculate last updated message
-        time_diff = now - last_updated
-        minutes = int(time_diff.total_seconds() / 60)
-        hours = int(minutes / 60)
-        days = int(hours / 24)
-
-        if minutes < 60:
-            time_text = f"{minutes} minute{'s' if minutes != 1 else ''} ago"
-        elif hours < 24:
-            time_text = f"{hours} hour{'s' if hours != 1 else ''} ago"
-        else:
-            remaining_hours = hours % 24
-            time_text = f"{days} day{'s' if days != 1 else ''}"
-            if remaining_hours > 0:
-                time_text += f" {remaining_hours} hour{'s' if remaining_hours != 1 else ''}"
-            time_text += " ago"
-
-        #Marker Icon creation for the map
-        try:
-            icon_url = {
-                'green': '/assets/bin_icon_green.png',
-                'yellow': '/assets/bin_icon_yellow.png',
-                'orange': '/assets/bin_icon_orange.png',
-                'red': '/assets/bin_icon_red.png',
-                'bright_red': '/assets/bin_icon_bright_red.png',
-                'black': '/assets/bin_icon_black.png',
-            }[marker_colour]
-        #If there's an error then use the black bin icon by default
-        except KeyError:
-            icon_url = '/assets/bin_icon_black.png'
-
-        icon = dict(
-            iconUrl=icon_url,
-            iconSize=[30, 30],
-            iconAnchor=[15, 30]
-        )
-
-        #Handle markers in duplicate lat/lon, offsetting position slightly for visibility
-        position_key = (round(row['latitude'], 6), round(row['longitude'], 6))
-        offset_index = position_offsets[position_key]
-        offset_step = 0.00013
-
-        if offset_index == 0:
-            adjusted_lat = row['latitude']
-            adjusted_lon = row['longitude']
-        else:
-            adjusted_lat = row['latitude']
-            adjusted_lon = row['longitude'] + (offset_index * offset_step)
-
-        position_offsets[position_key] += 1
-
-        #Build markers
-        markers.append(dl.Marker(
-            id=f"bin-marker-{row['bin_id']}",
-            position=[adjusted_lat, adjusted_lon],
-            icon=icon,
-            children=[
-                dl.Popup(html.Div([
-                    html.Div([
-                        html.Span("Bin ID: ", style={"fontWeight": "bold", "fontSize": "0.9em"}),
-                        html.Span(f"{row['bin_id']}")
-                    ], style={"marginBottom": "4px"}),
-
-                    html.Div([
-                        html.Span("Fill Level: ", style={"fontWeight": "bold", "fontSize": "0.9em"}),
-                        html.Span(f"{fill_level}%")
-                    ], style={"marginBottom": "4px"}),
-
-                    html.Div([
-                        html.Span("Bin Type: ", style={"fontWeight": "bold", "fontSize": "0.9em"}),
-                        html.Span(f"{row['bin_type']}")
-                    ], style={"marginBottom": "4px"}),
+# Filter the bins down to those around the user's location (Bins Near Me search)
+# Uses the spatial index so only nearby grid cells are checked instead of every bin
+# Adds a distance_m column and sorts the closest bins first
+# The index should be built from the whole fleet (not already filtered data) so it isn't rebuilt each time
+def filter_bins_near_me(bin_data, near_me, index):
+    if near_me['radius'] == 'nearest':
+        matches = index.nearest(near_me['lat'], near_me['lon'], n=10)
+    else:
+        matches = index.within_radius(near_me['lat'], near_me['lon'], near_me['radius'])
 
-                    html.Div([
-                        html.Span("Last Emptied on: ", style={"fontWeight": "bold", "fontSize": "0.9em"}),
-                        html.Span(f"{row['last_emptied_string']}")
-                    ], style={"marginBottom": "4px"}),
+    #Map of bin_id -> distance from the user in metres
+    distances = dict(matches)
+    bin_data = bin_data[bin_data['bin_id'].isin(distances.keys())].copy()
+    bin_data['distance_m'] = bin_data['bin_id'].map(distances)
 
-                    html.Div([
-                        html.Span("Address: ", style={"fontWeight": "bold", "fontSize": "0.9em"}),
-                        html.Span(f"{row['bin_location']}", style={"fontSize": "0.9em"})
-                    ], style={"marginBottom": "4px"}),
+    return bin_data.sort_values(by='distance_m')
 
-                    html.Div(
-                        f"Last updated: {time_text}",
-                        style={"fontSize": "0.8em", "color": "#666", "marginTop": "6px"}
-                    )
-                ], style={
-                    "fontFamily": "'Segoe UI', 'Arial Unicode MS', 'Helvetica', sans-serif",
-                    "fontSize": "1em",
-                    "lineHeight": "1.4",
-                    "padding": "2px",
-                    "minWidth": "180px",
-                    "maxWidth": "220px"
-                }))
-            ],
-        ))
+#Filter the bins down to those inside the map's current bounds [[south, west], [north, east]]
+def filter_bins_in_bounds(bin_data, bounds, index):
+    (south, west), (north, east) = bounds
+    bin_ids_in_view = index.in_bounds(south, west, north, east)
+    return bin_data[bin_data['bin_id'].isin(bin_ids_in_view)]
 
-    return markers    
+#Format distance from the user for display, i.e. 350 m or 1.2 km
+def format_distance(distance_m):
+    if distance_m < 1000:
+        return f"{int(round(distance_m))} m"
+    return f"{distance_m / 1000:.1f} km"
 
 
 
@@ -341,6 +292,13 @@ filtered_bins_table_card = html.Div([
     dbc.Card([
         dbc.CardHeader("Filtered Bins", style={"backgroundColor": "#FFFFFF"}, className="card-title"),
         dbc.CardBody([
+            #Toggle to only list bins inside the area currently shown on the map
+            dbc.Switch(
+                id="filtered-bins-map-view-switch",
+                label="Only bins in map view",
+                value=False,
+                style={"fontSize": "0.8rem", "marginBottom": "8px"}
+            ),
             html.Div(id="filtered-bin-list-wrapper"),
             #Track what page the card is showing (after clicking Next button)
             dcc.Store(id="filtered-bins-card-page", data=0)
@@ -361,27 +319,41 @@ filtered_bins_table_card = html.Div([
 ###################################################################
 # Callbacks for updating map markers every 15 minutes + filters and
 # Reset button control for resetting map view and zoom
+#A normal callback, not a background job: it is the map page's interactive callback and the
+#spatial index and marker diffing keep it cheap, so it shouldn't queue behind report jobs
 @callback(
-    Output('large-bin-map', 'children'), #Updates the map markers
+    Output('large-map-marker-layer', 'children'), #Updates the map markers (full list or only the changes)
+    Output('large-map-location-layer', 'children'), #User's location for bins near me search
+    Output('large-map-marker-state', 'data'), #Version of the markers now on the map
     Output('large-bin-map', 'center'), #Centres the map on filted bin
     Output('large-bin-map', 'zoom'), #Zooms map onto the filtered bin
     Output('bin-search-dropdown', 'value'), #Resets the dropdown input if reset button clicked
     Output('fill-level-filter', 'value'), #Reset button will clear filter levels too
     Output('address-search-dropdown', 'value'), #Reset button will clear address search inputs
+    Output(rendered_version_id('large-bin-map'), 'data'), #Bin data version now on the map
     [
         Input('large-bin-map', 'id'),   #Updates on Initial page load
-        Input('update-large-map-interval', 'n_intervals'), #Auto update every 15 minutes
+        Input(version_store_id('bin_data'), 'data'), #Auto update whenever the bin data changes
         Input('bin-search-dropdown', 'value'), #Update map based on search dropdown value (filtered bin ID)
         Input('reset-large-map-button', 'n_clicks'), #Reset map view button 
         Input('fill-level-filter', 'value'), #Fill level filter dropdown
         Input('address-search-dropdown', 'value'), #Address search dropdown
-    ]
+        Input('near-me-store', 'data'), #Bins near me search (user location + radius)
+    ],
+    State('large-map-marker-state', 'data'), #Markers the map already has
+    State(rendered_version_id('large-bin-map'), 'data'), #Bin data version the map already shows
 )
-def update_large_map(_, __, selected_bin_id, reset_button_clicked, fill_level_filter, address_search_value):
+def update_large_map(_, data_version, selected_bin_id, reset_button_clicked, fill_level_filter, address_search_value, near_me, marker_state, rendered_version):
+    #Stop at a version compare if the map already shows the pushed bin data
+    version = render_version('bin_data', data_version, rendered_version)
     bin_data = get_bin_data() #Fetch bin data
     bin_type_emptied_date = get_bin_type_and_last_emptied() #Function with bin types + last emptied date
     bin_data = bin_data.merge(bin_type_emptied_date, on="bin_id", how="left") #Merge the two tables based on bin IDs
 
+    #If a bins near me search is active, only keep the bins around the user
+    if near_me:
+        bin_data = filter_bins_near_me(bin_data, near_me, get_spatial_index(bin_data, version))
+
     #By default don't clear the bin ID filter dropdown user input unless reset button clicked
     clear_dropdown_input = no_update
     #By default don't clear the fill level filter inputs unless reset button clicked
@@ -442,87 +414,97 @@ def update_large_map(_, __, selected_bin_id, reset_button_clicked, fill_level_fi
             center = [-37.7749, 144.8930] #Maribyrnong
             zoom = 15
 
+    #Else if bins near me search is active, centre the map on the user
+    elif near_me:
+        center = [near_me['lat'], near_me['lon']]
+        zoom = 14 if near_me['radius'] == 2000 else 16 #Zoom out a bit to fit the 2km radius
+
     else:
         #If no bin is filtered for and no reset button click then default the map view
         center = [-37.7749, 144.8930] #Maribyrnong
         zoom = 15
 
 
-    #returns only the markers that have been filtered
-    markers = build_map_markers_using_bin_data(bin_data)
+    #returns only the markers that have been filtered, as a diff against the markers already on the map
+    markers, marker_state = update_map_markers(
+        bin_data, LARGE_MAP_POPUP_FIELDS, popup_width=("180px", "220px"), marker_state=marker_state
+    )
 
-    return [
-        dl.LayersControl([
-            dl.BaseLayer(dl.TileLayer(), name="Street View", checked=True),
-            dl.BaseLayer(dl.TileLayer(
-                url="https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}",
-                attribution="Esri Satellite"
-            ), name="Satellite View")
-        ]),
-        dl.LayerGroup(markers)
-    ], center, zoom, clear_dropdown_input, clear_fill_level_filter, clear_address_search_dropdown
+    #Show the user's location on the map during a bins near me search
+    location_marker = []
+    if near_me and not reset_button_clicked:
+        location_marker = [dl.CircleMarker(
+            id="near-me-location-marker",
+            center=[near_me['lat'], near_me['lon']],
+            radius=8,
+            color="#542978", #purple
+            fillOpacity=0.8,
+            children=[dl.Tooltip("Your location")]
+        )]
 
+    #Auto updates only refresh the markers, don't move the map away from where the user is looking
+    #and don't resend the user's location, it hasn't changed
+    if ctx.triggered_id == version_store_id('bin_data'):
+        center, zoom = no_update, no_update
+        location_marker = no_update
 
-###################################################################
-# Callback for collapsible legend box
-@callback(
-    Output('legend-content-large-map', 'style'),
-    Output('legend-toggle-button-large-map', 'children'),
-    Input('legend-toggle-button-large-map', 'n_clicks'),
-    prevent_initial_call=True,
+    return markers, location_marker, marker_state, center, zoom, clear_dropdown_input, clear_fill_level_filter, clear_address_search_dropdown, version
 
-)
-def toggle_legend(n_clicks):
-    if n_clicks % 2 == 1:
-        return {"display": "none"}, "+"
-    else:
-        return {"marginTop": "3px"}, "-"
-    
 
 ###################################################################
-# Callback for bin ID search dropdown options to autopopulate search options when user inputs
+# Callbacks for the Bins Near Me search
+# Clicking the button asks the browser for the user's location
 @callback(
-    Output('bin-search-dropdown', 'options'),
-    Input('bin-search-dropdown', 'search_value'),
+    Output('near-me-geolocation', 'update_now'),
+    Input('near-me-button', 'n_clicks'),
+    prevent_initial_call=True
 )
-def bin_search_dropdown_options(search_value):
-    bin_data = get_bin_data()  #Get the bin list
+def request_user_location(n_clicks):
+    return True
 
-    if not search_value:
-        raise exceptions.PreventUpdate  #Don't get updates if nothing typed
+#Store the user's location and selected radius, which the map and filtered bins card listen to
+@callback(
+    Output('near-me-store', 'data'),
+    Input('near-me-geolocation', 'position'), #Location returned from the browser
+    Input('near-me-radius-dropdown', 'value'), #Radius or nearest 10
+    Input('reset-large-map-button', 'n_clicks'), #Reset button clears the search
+    State('near-me-store', 'data'),
+    prevent_initial_call=True
+)
+def update_near_me_search(position, radius, reset_clicks, near_me):
+    triggered_id = callback_context.triggered_id
 
-    filtered_bins = bin_data[bin_data['bin_id'].astype(str).str.contains(search_value, case=False)]
+    #Reset button clears the bins near me search
+    if triggered_id == 'reset-large-map-button':
+        return None
 
-    #Build dropdown options
-    options = [{"label": str(bin_id), "value": str(bin_id)} for bin_id in filtered_bins['bin_id'].unique()]
-    return options
+    #New location from the browser starts a search
+    if triggered_id == 'near-me-geolocation':
+        if not position:
+            raise exceptions.PreventUpdate
+        return {"lat": position['lat'], "lon": position['lon'], "radius": radius}
 
-###################################################################
-#Callback for populating the address search dropdown when user inputs
-@callback(
-    Output("address-search-dropdown", "options"),
-    Input("address-search-dropdown", "search_value")
-)
-def address_search_options(search_value):
-    #If search field is empty or if it's just spaces then don't update dropdown options
-    if not search_value or not search_value.strip():
+    #Radius changed, only update if a search is already active
+    if not near_me:
         raise exceptions.PreventUpdate
+    return {**near_me, "radius": radius}
 
-    #Fetch bin data into a df
-    df = get_bin_data()
 
-    #Filter the df to only records where search_value is found in bin_location
-    #case=False (case-insensitive), na=False (ignore rows with undefined bin_location)
-    filter_for_address = df[df['bin_location'].str.contains(search_value, case=False, na=False)]
+###################################################################
+# Callback for collapsible legend box (runs in the browser, see assets/clientside.js)
+clientside_callback(
+    ClientsideFunction(namespace="ui", function_name="toggle_legend"),
+    Output('legend-content-large-map', 'style'),
+    Output('legend-toggle-button-large-map', 'children'),
+    Input('legend-toggle-button-large-map', 'n_clicks'),
+    prevent_initial_call=True,
+)
     
-    #Get bin_location column from filtered rows
-    # .dropna() = remove blank addresses 
-    # .unique() = return array of DISTINCT matches, no duplicates
-    address_matches = filter_for_address['bin_location'].dropna().unique()
 
-    #label = dropdown option value shown
-    #value = data used when user selects the label
-    return [{"label": addr, "value": addr} for addr in address_matches]
+###################################################################
+# Bin ID and address search dropdown options, looked up in the in-memory search index as the user types
+register_search_dropdown('bin-search-dropdown', search_bin_ids, as_text=True)
+register_search_dropdown("address-search-dropdown", search_addresses)
 
 ###################################################################
 # Callback for updating the NEXT/PREVIOUS page number of Filtered Bin Table card
@@ -547,28 +529,30 @@ def update_filtered_page_num(next_clicks, prev_clicks, current_page):
     else:
         return current_page
 
-#Callback to disable the Previous button on filtered bins card if on Page 0
-@callback(
+#Callback to disable the Previous button on filtered bins card if on Page 0 (runs in the browser)
+clientside_callback(
+    ClientsideFunction(namespace="ui", function_name="disable_prev_button"),
     Output('prev-filtered-bins-button', 'disabled'),
     Input('filtered-bins-card-page', 'data') #Listens to dcc.Store of input id
 )
-def disable_prev_button(page):
-    return page == 0
 
 ###################################################################
 #Callback for filtered bin table card to list filtered bins
 @callback(
         Output("filtered-bin-list-wrapper", "children"),
         [ #Listens to same Inputs as the map filters
-            Input('update-large-map-interval', 'n_intervals'), #Auto update every 15 minutes
+            Input(version_store_id('bin_data'), 'data'), #Auto update whenever the bin data changes
             Input('bin-search-dropdown', 'value'), #Update map based on search dropdown value (filtered bin ID)
             Input('fill-level-filter', 'value'), #Fill level filter dropdown
             Input('reset-large-map-button', 'n_clicks'), #Reset map view button 
             Input('filtered-bins-card-page', 'data'), #Listen to the page on filtered bins list card
             Input('address-search-dropdown', 'value'), #Address search dropdown
+            Input('near-me-store', 'data'), #Bins near me search
+            Input('filtered-bins-map-view-switch', 'value'), #Only list bins in the current map view
+            Input('large-bin-map', 'bounds'), #Current map view bounds
         ]
 )
-def update_filtered_bin_card(_, selected_bin_id, fill_level_filter, reset_clicks, page, address_search_value):
+def update_filtered_bin_card(_, selected_bin_id, fill_level_filter, reset_clicks, page, address_search_value, near_me, map_view_only, bounds):
     
     #Check if reset button was clicked using callback_context
     ctx = callback_context
@@ -578,13 +562,27 @@ def update_filtered_bin_card(_, selected_bin_id, fill_level_filter, reset_clicks
     if reset_button_clicked:
         return html.Div("No bins filtered.", style={"fontSize": "0.9rem", "color": "#888"})  
 
-    df = get_bin_data()
-    df = df.merge(get_bin_type_and_last_emptied(), on="bin_id", how="left")
+    #Panning/zooming the map only matters when listing bins in the map view
+    if ctx.triggered_id == 'large-bin-map' and not map_view_only:
+        raise exceptions.PreventUpdate
 
     #If no filters selected, display message
-    if not fill_level_filter and not selected_bin_id and not address_search_value:
+    if not fill_level_filter and not selected_bin_id and not address_search_value and not near_me and not map_view_only:
         return html.Div("No bins filtered.", style={"fontSize": "0.9rem", "color": "#888"})
 
+    df = get_bin_data()
+    df = df.merge(get_bin_type_and_last_emptied(), on="bin_id", how="left")
+    #Spatial index of the whole fleet for the map view + near me filters
+    index = get_spatial_index(df, current_version('bin_data'))
+
+    #Only keep bins inside the current map view (spatial index bounding box query)
+    if map_view_only and bounds:
+        df = filter_bins_in_bounds(df, bounds, index)
+
+    #Only keep bins around the user (spatial index radius/nearest query)
+    if near_me:
+        df = filter_bins_near_me(df, near_me, index)
+
     #If filters are applied to the map
     if fill_level_filter:
         filters = {
@@ -609,8 +607,9 @@ def update_filtered_bin_card(_, selected_bin_id, fill_level_filter, reset_clicks
         #Make it into a string for comparison
         df = df[df['bin_id'].astype(str) == selected_bin_id]
 
-    #Sort by fill level descending
-    df = df.sort_values(by='fill_level', ascending=False)
+    #Sort by fill level descending, or closest first for a bins near me search
+    if not near_me:
+        df = df.sort_values(by='fill_level', ascending=False)
 
     #Address search value is inputted, get data with matching bin location
     if address_search_value:
@@ -646,6 +645,8 @@ def update_filtered_bin_card(_, selected_bin_id, fill_level_filter, reset_clicks
             html.Div(f"Bin ID: #{row['bin_id']}", style={"fontWeight": "bold", "fontSize": "13px", "backgroundColor": "#F1EEF7"}), #Very light purple bg
             html.Div(f"Fill Level: {row['fill_level']}%", style={"fontWeight": "bold"}),
             html.Div(f"Address: {row['bin_location']}"),
+            #Show how far away the bin is during a bins near me search
+            html.Div(f"Distance: {format_distance(row['distance_m'])}") if near_me else None,
             #Border beneath each row
             html.Hr(style={"margin": "6px 0", "borderTop": "3px solid #eee"})
         ], style={"marginBottom": "5px"}))
@@ -1,13 +1,17 @@
-from dash import Dash, html, Input, Output, dcc, register_page, callback, dash_table, exceptions
+from dash import Dash, html, Input, Output, State, dcc, register_page, callback, dash_table, clientside_callback, ClientsideFunction, Patch, no_update
 import dash_bootstrap_components as dbc
 import dash_leaflet as dl
 from datetime import datetime
 import pandas as pd
 import math
-import plotly.express as px
+from lazy_imports import px #plotly.express is imported on first use
 
 #import layouts, componenets, styles here
-from data_utils import get_fill_level_stats, get_recently_emptied_bins, get_bin_data, get_marker_colour, get_top_fullest_bins, get_weekly_collection_stats, get_complete_bin_table, get_alerts_data
+from data_utils import get_fill_level_stats, get_recently_emptied_bins, get_bin_data, get_top_fullest_bins, get_weekly_collection_stats, get_complete_bin_table, get_alerts_data
+from map_markers import update_map_markers, MINIMAP_POPUP_FIELDS
+from search_index import search_bin_ids, search_addresses, search_store, register_search_dropdown
+from live_updates import version_store_id, rendered_version_id, rendered_version_store, render_version
+from columnar import to_columns, from_columns, columns_store_id, columnar_store, register_columnar_table
 from layouts import sidebar, CONTENT_STYLE
 import callbacks
 
@@ -338,10 +342,8 @@ def build_fill_level_rows(fill_df):
     return stat_rows  
 
 #Builds the full card widget for Current Bin fill stats
+#The rows are filled in by update_fill_level_stats when the page loads, so no query runs here
 def build_fill_level_card():
-    fill_df = get_fill_level_stats()  # Get the latest fill level stats
-    stat_rows = build_fill_level_rows(fill_df)
-    
     #Build the full card widget for Bin fill stats
     return html.Div(
         children=[
@@ -357,7 +359,8 @@ def build_fill_level_card():
                     }
                 ),
                 dbc.CardBody([
-                    html.Div(id="fill-level-data", children=stat_rows)
+                    html.Div(id="fill-level-data", children=[]),
+                    rendered_version_store("fill-level-data"), #Fill stats version shown in the card
                 ]),            
             ],
                 style={
@@ -370,13 +373,6 @@ def build_fill_level_card():
                     "width": "100%"
                 }
             ),
-
-            #Auto update every 15 minutes
-            dcc.Interval(
-                id='update-fill-level-stats',
-                interval=900000,  #15 minutes in milliseconds
-                n_intervals=0
-            )
         ]
     )
 
@@ -389,15 +385,20 @@ fill_level_card = build_fill_level_card()
 ###################################################################
 @callback(
     Output('fill-level-data', 'children'),
-    Input('update-fill-level-stats', 'n_intervals')
+    Output(rendered_version_id('fill-level-data'), 'data'),
+    Input('fill-level-data', 'id'), #On page load
+    Input(version_store_id('fill_level_stats'), 'data'), #Whenever the fill stats change
+    State(rendered_version_id('fill-level-data'), 'data'), #Version the card already shows
 )
-def update_fill_level_stats(n):
+def update_fill_level_stats(_, data_version, rendered_version):
+    #Stop here if the card already shows this version
+    version = render_version('fill_level_stats', data_version, rendered_version)
     #Fetch the fill level data
     fill_df = get_fill_level_stats()
     #Update the rows for each fill level category
     stat_rows = build_fill_level_rows(fill_df)
 
-    return stat_rows
+    return stat_rows, version
 
 
 
@@ -405,9 +406,6 @@ def update_fill_level_stats(n):
 ###################################################################
 # Create the card for the bin table with full bin info
 ###################################################################
-#Fetch the data using the function
-bin_table_df = get_complete_bin_table()
-
 bin_data_table_card = html.Div([
     dbc.Card([
         dbc.CardHeader(
@@ -432,6 +430,7 @@ bin_data_table_card = html.Div([
                         style={"width": "130px", "marginRight": "10px"},
                         clearable=True, #Shows a small "x" to reset
                     ),            
+                    search_store('bin-table-id-dropdown'), #Debounced search text
                 ], style={
                     "zIndex": "4000", #Makes the dropdown options not get overlapped (when vertically stacked due to screen size)
                     "marginRight": "5px",
@@ -490,7 +489,8 @@ bin_data_table_card = html.Div([
                         searchable=True,
                         clearable=True,
                         style={"width": "200px", "marginRight": "5px"},           
-                    )
+                    ),
+                    search_store('bin-table-address-search-dropdown'), #Debounced search text
                 #Style the dropdown input field
                 ], style={
                     "zIndex": "2000",
@@ -621,6 +621,8 @@ bin_data_table_card = html.Div([
                     'fontStyle': 'italic',
                 }
             ),
+            rendered_version_store("bin-data-table"), #Bin table version shown in the table
+            columnar_store("bin-data-table"), #Table data in columns, expanded into the table in the browser
 
         ])
 
@@ -632,13 +634,6 @@ bin_data_table_card = html.Div([
             #"padding": "5px",
         }
     ),
-
-    #Update the table every 15 minutes
-    dcc.Interval(
-        id='update-bin-data-table-interval',
-        interval=15 * 60 * 1000,  #15 minutes in milliseconds
-        n_intervals=0  #start count at 0
-    )
 ])
 
 
@@ -648,16 +643,20 @@ bin_data_table_card = html.Div([
 #update table every 15 min
 ###################################################################
 @callback(
-    Output("bin-data-table", "data"),
+    Output(columns_store_id("bin-data-table"), "data"),
     Output("bin-data-table-last-updated-msg", "children"), #Last updated message under Bin table
+    Output(rendered_version_id("bin-data-table"), "data"),
     Input("bin-data-table", "sort_by"), #sorting columns with arrows built in by DashTable; dash passes sort_by value tellign you which column clicked
     Input("bin-table-id-dropdown", "value"), #Bin ID filter
     Input("bin-table-address-search-dropdown", "value"), #Address search filter
     Input("bin-table-fill-level-dropdown", "value"), #Fill level filter
     Input("bin-table-bin-type-dropdown", "value"), #Bin Type dropdown filter
-    Input("update-bin-data-table-interval", "n_intervals"), #Update every 15 min
+    Input(version_store_id("complete_bin_table"), "data"), #Update whenever the bin table data changes
+    State(rendered_version_id("bin-data-table"), "data"), #Version the table already shows
 )
-def update_bin_data_table(sort_by, selected_bin_id, address_search_value, fill_level_filter, selected_bin_type, n_intervals):
+def update_bin_data_table(sort_by, selected_bin_id, address_search_value, fill_level_filter, selected_bin_type, data_version, rendered_version):
+    #Filter and sort changes always re-render, version pushes only when the data is newer than the table
+    version = render_version("complete_bin_table", data_version, rendered_version)
     df = get_complete_bin_table() #Fetch bin data
 
     #If no filters inputted, return full table records as default
@@ -733,53 +732,16 @@ def update_bin_data_table(sort_by, selected_bin_id, address_search_value, fill_l
     #Replace any " 0" from minute value with just space in case
     last_updated = datetime.now().strftime("Last updated at %I:%M %p").lstrip("0").replace(" 0", " ")
 
-    return df.to_dict("records"), last_updated
-
+    return to_columns(df, "bin-data-table"), last_updated, version
 
-###################################################################
-# Callback for bin ID search dropdown options to autopopulate search options when user inputs
-@callback(
-    Output('bin-table-id-dropdown', 'options'),
-    Input('bin-table-id-dropdown', 'search_value'),
-)
-def bin_search_dropdown_options(search_value):
-    bin_data = get_complete_bin_table()  #Get the bin list
+#Expand the columns into the bin table in the browser
+register_columnar_table("bin-data-table")
 
-    if not search_value:
-        raise exceptions.PreventUpdate  #Don't get updates if nothing typed
-
-    filtered_bins = bin_data[bin_data['bin_id'].astype(str).str.contains(search_value, case=False)]
-
-    #Build dropdown options
-    options = [{"label": str(bin_id), "value": str(bin_id)} for bin_id in filtered_bins['bin_id'].unique()]
-    return options
 
 ###################################################################
-#Callback for populating the address search dropdown when user inputs
-@callback(
-    Output("bin-table-address-search-dropdown", "options"),
-    Input("bin-table-address-search-dropdown", "search_value")
-)
-def address_search_options(search_value):
-    #If search field is empty or if it's just spaces then don't update dropdown options
-    if not search_value or not search_value.strip():
-        raise exceptions.PreventUpdate
-
-    #Fetch bin data into a df
-    df = get_complete_bin_table()
-
-    #Filter the df to only records where search_value is found in bin_location
-    #case=False (case-insensitive), na=False (ignore rows with undefined bin_location)
-    filter_for_address = df[df['bin_location'].str.contains(search_value, case=False, na=False)]
-    
-    #Get bin_location column from filtered rows
-    # .dropna() = remove blank addresses 
-    # .unique() = return array of DISTINCT matches, no duplicates
-    address_matches = filter_for_address['bin_location'].dropna().unique()
-
-    #label = dropdown option value shown
-    #value = data used when user selects the label
-    return [{"label": addr, "value": addr} for addr in address_matches]
+# Bin ID and address search dropdown options, looked up in the in-memory search index as the user types
+register_search_dropdown('bin-table-id-dropdown', search_bin_ids, as_text=True)
+register_search_dropdown("bin-table-address-search-dropdown", search_addresses)
 
 
 
@@ -799,7 +761,8 @@ fill_level_bar_chart_card = html.Div([
             }
         ),
         dbc.CardBody([
-            dcc.Graph(id="fill-level-bar-chart", config={"displayModeBar": False}, style={"height": "100%"})
+            dcc.Graph(id="fill-level-bar-chart", config={"displayModeBar": False}, style={"height": "100%"}),
+            dcc.Store(id="fill-level-bar-chart-counts"), #Bar counts now on the chart, so updates only send the bars that changed
 
         ])
     #Card styling
@@ -817,14 +780,18 @@ fill_level_bar_chart_card = html.Div([
 
 ###################################################################
 # Callback for bar chart data, input data from the DataTable
+#The full figure is only built when the chart has no bars yet, after that only the counts
+#of the bars that changed are sent as a Patch and the layout and styling stay in the browser
 @callback(
     Output('fill-level-bar-chart', 'figure'),
-    Input('bin-data-table', 'data') #Get data from the bin DataTable to input
+    Output('fill-level-bar-chart-counts', 'data'),
+    Input('bin-data-table', 'data'), #Get data from the bin DataTable to input
+    State('fill-level-bar-chart-counts', 'data'), #Counts of the bars on the chart, None before the first figure
 )
-def update_fill_level_bar_chart(data):
+def update_fill_level_bar_chart(data, shown_counts):
     #If there's no data available, show empty chart
     if not data:
-        return px.bar() #empty chart
+        return px.bar(), None #empty chart
     
     #Pass the DataTable's data into a df
     df = pd.DataFrame(data)
@@ -851,6 +818,18 @@ def update_fill_level_bar_chart(data):
     bin_counts.columns = ['fill_range', 'count']
     #Add a new column to use for the count text labels for each bar so that Plotly knows which text value belongs to which bar
     bin_counts['count_label'] = bin_counts['count'].astype(str)
+    counts = bin_counts['count'].tolist()
+
+    #The chart already has its bars, one trace per fill range in this order: only update their counts
+    if shown_counts is not None and len(shown_counts) == len(counts):
+        if shown_counts == counts:
+            return no_update, no_update
+        patch = Patch()
+        for trace, (old, new) in enumerate(zip(shown_counts, counts)):
+            if old != new:
+                patch['data'][trace]['y'] = [new]
+                patch['data'][trace]['text'] = [str(new)]
+        return patch, counts
 
     #Assign colours for each "bin" range (bar colours)
     bin_colours = {
@@ -916,7 +895,7 @@ def update_fill_level_bar_chart(data):
 
 
 
-    return fig
+    return fig, counts
 
 
 
@@ -992,24 +971,18 @@ emptied_bins_card = html.Div([
         "backgroundColor": "#FFFFFF",
         "boxShadow": "0 4px 12px rgba(0, 0, 0, 0.1)"
     }),
-
-    #Auto refresh every 15 minutes
-    dcc.Interval(
-        id='update-emptied-bins',
-        interval=900000, #15 minutes in milliseconds
-        n_intervals=0
-    )
 ])
 
 ################################################################################
 # Callback for updating Recently Emptied Bins card from home page
-# Update interval: 15 minutely
+# Updates on page load and whenever the recently emptied bins change
 ################################################################################
 @callback(
     Output("emptied-bins-table", "data"),
-    Input("update-emptied-bins", "n_intervals")
+    Input("emptied-bins-table", "id"),
+    Input(version_store_id("recently_emptied_bins"), "data"),
 )
-def update_recently_emptied_bins(n):
+def update_recently_emptied_bins(_, __):
     df = get_recently_emptied_bins()
     return df.to_dict("records")
 
@@ -1018,129 +991,6 @@ def update_recently_emptied_bins(n):
 # Build the card for Mini Map
 ###################################################################
 
-#Build the Mini map card
-def generate_minimap_markers():
-    bin_data = get_bin_data()
-    #Parse timestamp column if needed for pandas
-    bin_data['timestamp'] = pd.to_datetime(bin_data['timestamp'])
-
-    #Current time for comparison
-    now = datetime.now()
-
-    #Create bin markers (icons on map)
-    markers = []
-
-    #Build a count of how many bins are at each lat/long
-    from collections import defaultdict
-    bin_location_counts = defaultdict(int)
-
-    for _, row in bin_data.iterrows():
-        position_key = (round(row['latitude'], 6), round(row['longitude'], 6))
-        bin_location_counts[position_key] += 1
-
-    position_offsets = defaultdict(int)  #Track how many markers placed at each location
-
-    #Now build each bin marker
-    for _, row in bin_data.iterrows():
-        fill_level = row['fill_level']
-        marker_colour = get_marker_colour(fill_level)
-        #Find how long ago the map was last updated
-        last_updated = row['timestamp']
-
-        #Calculate time difference
-        time_diff = now - last_updated
-        minutes = int(time_diff.total_seconds() / 60)
-        hours = int(minutes / 60)
-        days = int(hours / 24)
-
-        #Modify last updated message in either minutes, hours, days
-        if minutes < 60:
-            time_text = f"{minutes} minute{'s' if minutes != 1 else ''} ago"
-        elif hours < 24:
-            time_text = f"{hours} hour{'s' if hours != 1 else ''} ago"
-        else:
-            remaining_hours = hours % 24
-            time_text = f"{days} day{'s' if days != 1 else ''}"
-            if remaining_hours > 0:
-                time_text += f" {remaining_hours} hour{'s' if remaining_hours != 1 else ''}"
-            time_text += " ago"
-
-        #Colour-coded icons from assets folder
-        try:
-            icon_url = {
-                'green': '/assets/bin_icon_green.png',
-                'yellow': '/assets/bin_icon_yellow.png',
-                'orange': '/assets/bin_icon_orange.png',
-                'red': '/assets/bin_icon_red.png',
-                'bright_red': '/assets/bin_icon_bright_red.png',
-                'black': '/assets/bin_icon_black.png',
-            }[marker_colour]
-        except KeyError:
-            icon_url = '/assets/bin_icon_black.png'  #fallback if no colour coded (error)
-
-        #Set the marker icon
-        icon = dict(
-            iconUrl=icon_url,
-            iconSize=[30, 30],
-            iconAnchor=[15, 30]
-        )
-
-        #Determine the bin marker positions on the map, slightly offsetting multiple bins at same location
-        position_key = (round(row['latitude'], 6), round(row['longitude'], 6))
-        offset_index = position_offsets[position_key]
-        offset_step = 0.00013  #about 5 metres per marker
-
-        # Always allow slight offset if offset_index > 0
-        if offset_index == 0:
-            adjusted_lat = row['latitude']
-            adjusted_lon = row['longitude']
-        else:
-            adjusted_lat = row['latitude']
-            adjusted_lon = row['longitude'] + (offset_index * offset_step)
-
-        position_offsets[position_key] += 1
-
-        #Add the markers to the map
-        markers.append(dl.Marker(
-            id=f"bin-marker-{row['bin_id']}", #Give each map marker a unique ID (because multiple bin_ids can have same exact location so only one of them will appear on map otherwise)
-            position=[adjusted_lat, adjusted_lon],  # Use adjusted position
-            icon=icon,
-            children=[
-                #Pop up message when clicking on bin icon on mini map
-                dl.Popup(html.Div([
-                    html.Div([
-                        html.Span("Bin ID: ", style={"fontWeight": "bold", "fontSize": "0.9em"}),
-                        html.Span(f"{row['bin_id']}")
-                    ], style={"marginBottom": "4px"}), #space between each line
-
-                    html.Div([
-                        html.Span("Fill Level: ", style={"fontWeight": "bold", "fontSize": "0.9em"}),
-                        html.Span(f"{fill_level}%")
-                    ], style={"marginBottom": "4px"}),
-
-                    html.Div([
-                        html.Span("Address: ", style={"fontWeight": "bold", "fontSize": "0.9em"}),
-                        html.Span(f"{row['bin_location']}", style={"fontSize": "0.9em"})
-                    ], style={"marginBottom": "4px"}),
-
-                    html.Div(
-                        f"Last updated: {time_text}",
-                        style={"fontSize": "0.8em", "color": "#666", "marginTop": "6px"}
-                    )
-                #Style the popup box    
-                ], style={
-                    "fontFamily": "'Segoe UI', 'Arial Unicode MS', 'Helvetica', sans-serif",
-                    "fontSize": "1em",
-                    "lineHeight": "1.4",
-                    "padding": "2px",
-                    "minWidth": "130px",    #Popup width
-                    "maxWidth": "200px",    
-                }))
-            ],
-        ))
-
-    return markers
-
 #Create the layout for the Mini Map
 minimap_card = html.Div([  #Wrap in html.Div to group Card + update interval properly
     dbc.Card(
@@ -1173,8 +1023,12 @@ minimap_card = html.Div([  #Wrap in html.Div to group Card + update interval pro
                     id="minimap-loading",
                     type="circle",
                     fullscreen=False,
+                    delay_show=500, #Don't flash the spinner for quick marker updates
                     children=dl.Map(
-                        [dl.TileLayer()], #Loads the base map 
+                        [
+                            dl.TileLayer(), #Loads the base map 
+                            dl.LayerGroup(id="minimap-marker-layer"), #Bin markers, updated via callback
+                        ],
                         id='minimap',
                         style={'height': '280px', "width": "100%", "position": "relative"},
                         center=[-37.7749, 144.8930], #Centres the map on Maribyrnong
@@ -1266,12 +1120,9 @@ minimap_card = html.Div([  #Wrap in html.Div to group Card + update interval pro
         }
     ),
 
-    #Set the interval to update mini map every 15 minutes
-    dcc.Interval(
-        id='update-minimap-interval',
-        interval=900000,  #15 minutes in milliseconds
-        n_intervals=0     #start from 0
-    )
+    #Version of the markers currently on the mini map, so refreshes only send what changed
+    dcc.Store(id="minimap-marker-state"),
+    rendered_version_store("minimap"), #Bin data version shown on the mini map
 ])
 
 
@@ -1322,12 +1173,6 @@ weekly_collection_card = html.Div([
             "paddingBottom": "10px"
         }
     ),
-    #Update the weekly collections card every 6 hours
-    dcc.Interval(
-        id="update-weekly-collection-card-interval",
-        interval=6 * 60 * 60 * 1000,  #6 hours in milliseconds
-        n_intervals=0 #Card will update on page load and refreshes
-    )
 ])
 
 
@@ -1343,7 +1188,7 @@ def update_active_alert_type_donut(data):
     if not data:
         return px.pie(title="No active alerts")
     
-    df = pd.DataFrame(data)
+    df = from_columns(data)
 
     #Filter for only active alerts with no resolved time
     df_active = df[(df["status"] == "Active") & (df["resolved_time_string"] == "")]
@@ -1426,7 +1271,7 @@ def populate_total_alerts_cards(data):
     if not data:
         return 0, 0, 0
     
-    df = pd.DataFrame(data)
+    df = from_columns(data)
 
     #return the alert counts for each status
     return (
@@ -1446,7 +1291,7 @@ def update_todays_alerts(data):
     if not data:
         return 0, 0
     
-    df = pd.DataFrame(data)
+    df = from_columns(data)
 
     #Get today's date without the time
     today = datetime.today().date()
@@ -1469,17 +1314,20 @@ def update_todays_alerts(data):
 # Callback to update mini map on page load AND every 15 minutes
 ###################################################################
 @callback(
-    Output('minimap', 'children'),
+    Output('minimap-marker-layer', 'children'), #Full marker list, or only the changed markers
+    Output('minimap-marker-state', 'data'),
+    Output(rendered_version_id('minimap'), 'data'),
     [Input('minimap', 'id'),
-     Input('update-minimap-interval', 'n_intervals')]
+     Input(version_store_id('bin_data'), 'data')], #Whenever the bin data changes
+    State('minimap-marker-state', 'data'), #Markers the mini map already has
+    State(rendered_version_id('minimap'), 'data'), #Bin data version the mini map already shows
 )
-def update_minimap(_, __):
-    markers = generate_minimap_markers()
-
-    return [
-        dl.TileLayer(),
-        dl.LayerGroup(markers),
-    ]
+def update_minimap(_, data_version, marker_state, rendered_version):
+    version = render_version('bin_data', data_version, rendered_version)
+    markers, marker_state = update_map_markers(
+        get_bin_data(), MINIMAP_POPUP_FIELDS, popup_width=("130px", "200px"), marker_state=marker_state
+    )
+    return markers, marker_state, version
 ###################################################################
 # Callback for reset button mini map
 @callback(
@@ -1493,20 +1341,14 @@ def reset_map_view(n_clicks):
     return [-37.7749, 144.8930], 14 #originally 15 zoom
 
 ###################################################################
-# Callback for collapse/expand button for legend
-@callback(
+# Callback for collapse/expand button for legend (runs in the browser, see assets/clientside.js)
+clientside_callback(
+    ClientsideFunction(namespace="ui", function_name="toggle_legend"),
     Output('legend-content', 'style'),
     Output('legend-toggle-button', 'children'),
     Input('legend-toggle-button', 'n_clicks'),
     prevent_initial_call=True
 )
-def toggle_legend(n_clicks):
-    if n_clicks % 2 == 1:
-        #If odd clicks: hide content
-        return {"display": "none"}, "+"
-    else:
-        #If even clicks: show content
-        return {"marginTop": "3px"}, "-"
 
 
 
@@ -1514,7 +1356,7 @@ def toggle_legend(n_clicks):
 #Callback for Weekly Collection Stats card
 @callback(
     Output("weekly-collection-columns", "children"),
-    Input("update-weekly-collection-card-interval", "n_intervals"), #Updates the card 6 hourly
+    Input(version_store_id("weekly_collection_stats"), "data"), #Updates the card whenever the weekly stats change
     Input("last-week-collection-toggle", "value") #Either 0(current weel) or -1(last week) radio button
 )
 def update_weekly_collection_card(_, week):
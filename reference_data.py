@@ -0,0 +1,58 @@
+#Fleet reference data (bin IDs, addresses, bin types, coordinates) for the browser's cache.
+#These rarely change, so each browser keeps a copy in localStorage keyed by the version of
+#the bin_metadata dataset (see the reference cache in assets/clientside.js) and searches
+#the bin ID and address dropdowns against it without a round trip.
+#
+#The browser revalidates its copy when the app loads by sending the cached version in
+#If-None-Match, which is answered with an empty 304 unless the version changed. The
+#bin_metadata version is also pushed over /events (live_updates.py), so an open tab picks
+#up a change without polling. Navigating between pages never downloads it again.
+import json
+import threading
+
+from flask import Response, request
+
+from data_utils import get_bin_metadata
+from live_updates import current_version
+
+#Columns of get_bin_metadata() sent to the browser
+REFERENCE_COLUMNS = ["bin_id", "bin_location", "bin_type", "latitude", "longitude"]
+
+_reference_lock = threading.Lock()
+_reference = (None, None) #(version, JSON body) last built by this process
+
+
+#Metadata as {"version": ..., "columns": {column: [values]}}, blanks as None
+def fleet_reference(version):
+    metadata = get_bin_metadata()
+    columns = {}
+    for column in REFERENCE_COLUMNS:
+        values = metadata[column].astype(object)
+        columns[column] = values.where(values.notna(), None).tolist()
+    return {"version": version, "columns": columns}
+
+#JSON body for the current version, only rebuilt when the version changes
+def fleet_reference_body():
+    global _reference
+
+    #Read the version before the data, so the data is never older than the version it's sent as
+    version = current_version("bin_metadata")
+    with _reference_lock:
+        cached_version, body = _reference
+        if body is None or version is None or version != cached_version:
+            body = json.dumps(fleet_reference(version), separators=(",", ":"))
+            _reference = (version, body)
+    return version, body
+
+
+#Add the /reference/fleet route to the Flask server
+def register_reference_data(server):
+    @server.route("/reference/fleet")
+    def fleet_reference_data():
+        version, body = fleet_reference_body()
+        response = Response(body, mimetype="application/json")
+        response.headers["Cache-Control"] = "no-cache" #always revalidate, the ETag makes that cheap
+        if version is not None:
+            response.set_etag(f"fleet-{version}")
+        return response.make_conditional(request)
+    return fleet_reference_data
@@ -0,0 +1,109 @@
+#Background refresher for the shared dashboard datasets.
+#Every dataset marked @shared_dataset in data_utils.py is recomputed on its own cadence
+#(refresh_every) and published as a new snapshot version in shared_cache.py, so the
+#dashboard callbacks only read the latest snapshot and their latency doesn't depend
+#on how many people are watching.
+#
+#By default each worker runs a refresher thread (started on its first request, so it
+#also works with gunicorn --preload). The threads coordinate through the shared cache:
+#a snapshot is only refreshed once per cadence on the machine, by whichever worker
+#gets the lease. To refresh from a separate process instead, set
+#REFRESHER_IN_WORKERS=0 and run:  python refresher.py
+#
+#The refresher also brings the analytics rollup tables (rollups.py) up to date every
+#ROLLUP_REFRESH seconds, under the same lease so only one process updates them at a time.
+#It never creates them: until `python rollups.py backfill` has, each check is one cheap query.
+import logging
+import os
+import threading
+
+from shared_cache import DATASETS, dataset_key, snapshot_age, refresh
+#Imported for its side effect: registers the @shared_dataset producers the refresher runs
+import data_utils # noqa: F401
+from rollups import ROLLUP_REFRESH, update_rollups
+
+logger = logging.getLogger(__name__)
+
+#Seconds between checks for datasets that are due
+CHECK_INTERVAL_SECONDS = 5
+#Whether app workers run the refresher thread themselves
+REFRESHER_IN_WORKERS = os.getenv("REFRESHER_IN_WORKERS", "1") == "1"
+
+
+#(dataset, args) pairs whose snapshot is missing or older than its cadence
+def due_refreshes():
+    for dataset in DATASETS.values():
+        for args in dataset.refresh_args:
+            age = snapshot_age(dataset_key(dataset.dataset_name, args))
+            if age is None or age >= dataset.refresh_every:
+                yield dataset, args
+
+#Refresh everything that is due, returns the keys this process refreshed
+def run_pending():
+    refreshed = []
+    for dataset, args in list(due_refreshes()):
+        key = dataset_key(dataset.dataset_name, args)
+        try:
+            if refresh(key, lambda: dataset.uncached(*args)):
+                refreshed.append(key)
+        except Exception:
+            #Keep serving the previous snapshot, try again on the next check
+            logger.exception("Refreshing %s failed", key)
+
+    age = snapshot_age("rollups")
+    if age is None or age >= ROLLUP_REFRESH:
+        try:
+            if refresh("rollups", update_rollups):
+                refreshed.append("rollups")
+        except Exception:
+            logger.exception("Updating the rollup tables failed")
+    return refreshed
+
+
+class Refresher(threading.Thread):
+    def __init__(self, check_interval=CHECK_INTERVAL_SECONDS):
+        super().__init__(name="dataset-refresher", daemon=True)
+        self.check_interval = check_interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                run_pending()
+            except Exception:
+                logger.exception("Dataset refresher check failed")
+            self.stopped.wait(self.check_interval)
+
+    def stop(self):
+        self.stopped.set()
+
+
+_refresher = None
+_refresher_pid = None
+_refresher_lock = threading.Lock()
+
+#Start this process's refresher thread if it isn't running yet (safe to call on every request)
+def start_refresher():
+    global _refresher, _refresher_pid
+    if _refresher is not None and _refresher_pid == os.getpid():
+        return _refresher
+
+    with _refresher_lock:
+        #Threads don't survive a fork, so a forked worker starts its own
+        if _refresher is None or _refresher_pid != os.getpid():
+            _refresher = Refresher()
+            _refresher.start()
+            _refresher_pid = os.getpid()
+        return _refresher
+
+
+#Run as a standalone refresher process
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    logger.info("Refreshing %d shared datasets", len(DATASETS))
+    refresher = Refresher()
+    refresher.start()
+    try:
+        refresher.join()
+    except KeyboardInterrupt:
+        refresher.stop()
@@ -0,0 +1,539 @@
+#Rollup tables for analytics, so reports over any range don't have to scan sensor_table.
+#
+#    rollup_hourly   per bin and hour: readings, fill sum/min/max, fill increases and collections
+#    rollup_daily    per bin and day: readings, fill sum/min/max and collections
+#    rollup_cycles   per bin and emptying: when it next reached 80% full (NULL until it does)
+#    rollup_bins     per bin: its last rolled up reading, the previous reading of the next batch
+#    rollup_state    the watermark, readings before it are in the rollups
+#
+#Sums and counts are stored rather than averages, so rows can be merged by adding them up:
+#a batch that only has part of an hour adds to that hour's row. The events use the same
+#thresholds as the queries in data_utils.py (and a bin's first reading counts as an event).
+#
+#update_rollups() rolls up the readings between the watermark and SETTLE_SECONDS ago in
+#batches, each in one transaction with the watermark, so a reading is never counted twice.
+#The background refresher (refresher.py) runs it every ROLLUP_REFRESH seconds. Readings
+#older than the watermark when they arrive are missed until a backfill, which check finds.
+#The tables are only created by the backfill (and the update command), the refresher just
+#waits for them. A backfill locks the watermark row like an update, so the two never
+#write the same readings at once.
+#
+#    python rollups.py backfill                      build the rollups from all readings
+#    python rollups.py backfill --since 2025-05-01   rebuild from a day on
+#    python rollups.py update                        catch up to now
+#    python rollups.py check --start 2025-05-01 --end 2025-06-01
+#
+#read_period() reads the rollups of a period, and works out anything after the watermark from
+#the readings. Until the rollups are built it works everything out from the readings.
+import argparse
+import logging
+import sys
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import pandas as pd
+from sqlalchemy.exc import SQLAlchemyError
+
+from data_utils import engine, get_fill_readings
+
+logger = logging.getLogger(__name__)
+
+EMPTY_LEVEL = 10 #emptied, start of the time to 80%
+FULL_LEVEL = 80
+COLLECTED_LEVEL = 30 #a drop to this level or below counts as a collection
+#Days of readings read before a period when working it out from the readings, to find the
+#emptying of cycles that end in the period
+LOOKBACK_DAYS = 31
+
+#Seconds between rollup updates by the background refresher
+ROLLUP_REFRESH = 60
+#Readings newer than this (seconds) aren't rolled up yet, in case earlier ones are still arriving
+SETTLE_SECONDS = 120
+#Most readings time rolled up in one transaction
+BATCH_DAYS = 7
+
+HOURLY_COLUMNS = ['bin_id', 'hour_start', 'readings', 'fill_sum', 'fill_min', 'fill_max', 'increase_sum', 'increase_count', 'collections']
+DAILY_COLUMNS = ['bin_id', 'day', 'readings', 'fill_sum', 'fill_min', 'fill_max', 'collections']
+CYCLE_COLUMNS = ['bin_id', 'emptied_at', 'full_at', 'time_to_fill']
+
+#Rollups of a batch of readings
+#cycles: every emptying of the batch plus the earlier ones it completed
+#bins: bin_id, last_timestamp, last_fill of the batch's last readings
+Batch = namedtuple("Batch", ["hourly", "daily", "cycles", "bins"])
+
+
+###################################################################
+# Rolling up readings
+###################################################################
+
+#Add the previous reading of the same bin to each reading (readings sorted by bin_id, timestamp)
+#last_fill: {bin_id: fill level} of the reading before the first one, for bins that have one
+def with_prev_fill(readings, last_fill=None):
+    readings['prev_fill'] = readings.groupby('bin_id')['fill_level'].shift()
+    if last_fill:
+        first = ~readings['bin_id'].duplicated()
+        readings.loc[first, 'prev_fill'] = readings.loc[first, 'bin_id'].map(last_fill)
+    return readings
+
+#Emptied and 80% full events, as (bin_id, timestamp) tables
+def fill_events(readings):
+    first = readings['prev_fill'].isna()
+    empties = readings.loc[(readings['fill_level'] <= EMPTY_LEVEL) & (first | (readings['prev_fill'] > EMPTY_LEVEL)), ['bin_id', 'timestamp']]
+    fulls = readings.loc[(readings['fill_level'] >= FULL_LEVEL) & (first | (readings['prev_fill'] < FULL_LEVEL)), ['bin_id', 'timestamp']]
+    return empties, fulls
+
+#Pair every emptying with the next 80% full event of the same bin, in one ordered pass
+#empties, fulls: bin_id, timestamp. Emptyings without a later full get no full_at
+def pair_cycles(empties, fulls):
+    #merge_asof needs the same key types on both sides (events read back from MySQL may differ)
+    types = {'bin_id': 'int64', 'timestamp': 'datetime64[ns]'}
+    empties, fulls = empties.astype(types), fulls.astype(types)
+    cycles = pd.merge_asof(
+        empties.rename(columns={'timestamp': 'emptied_at'}).sort_values('emptied_at'),
+        fulls.rename(columns={'timestamp': 'full_at'}).sort_values('full_at'),
+        left_on='emptied_at', right_on='full_at', by='bin_id',
+        direction='forward', allow_exact_matches=False, #first full strictly after the emptying
+    )
+    cycles['time_to_fill'] = (cycles['full_at'] - cycles['emptied_at']).dt.total_seconds() // 60
+    return cycles.sort_values(['bin_id', 'emptied_at']).reset_index(drop=True)[CYCLE_COLUMNS]
+
+#Hourly rollup rows of readings with prev_fill
+def hourly_rows(readings):
+    increase = readings['fill_level'] - readings['prev_fill']
+    increase = increase.where(increase > 0) #only rises count as fill activity
+    collected = (readings['fill_level'] <= COLLECTED_LEVEL) & (readings['prev_fill'].isna() | (readings['prev_fill'] > COLLECTED_LEVEL))
+    df = readings.assign(hour_start=readings['timestamp'].dt.floor('h'), increase=increase, collected=collected)
+    return (
+        df.groupby(['bin_id', 'hour_start'])
+        .agg(
+            readings=('fill_level', 'count'),
+            fill_sum=('fill_level', 'sum'),
+            fill_min=('fill_level', 'min'),
+            fill_max=('fill_level', 'max'),
+            increase_sum=('increase', 'sum'),
+            increase_count=('increase', 'count'),
+            collections=('collected', 'sum'),
+        )
+        .reset_index()
+    )
+
+#Daily rollup rows of hourly rows
+def daily_rows(hourly):
+    return (
+        hourly.assign(day=hourly['hour_start'].dt.normalize())
+        .groupby(['bin_id', 'day'])
+        .agg(
+            readings=('readings', 'sum'),
+            fill_sum=('fill_sum', 'sum'),
+            fill_min=('fill_min', 'min'),
+            fill_max=('fill_max', 'max'),
+            collections=('collections', 'sum'),
+        )
+        .reset_index()
+    )
+
+#Rollup rows of the same bin and hour/day merged into one, like the upserts do
+def merge_rows(frames, keys):
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=HOURLY_COLUMNS if 'hour_start' in keys else DAILY_COLUMNS)
+    df = pd.concat(frames, ignore_index=True)
+    aggregations = {column: "sum" for column in df.columns if column not in keys}
+    aggregations.update(fill_min="min", fill_max="max")
+    return df.groupby(keys).agg(aggregations).reset_index()
+
+#Roll up a batch of readings (sorted by bin_id, timestamp)
+#last_fill: {bin_id: fill level} before the batch, pending: cycles still waiting for their full
+def roll_up(readings, last_fill, pending):
+    readings = with_prev_fill(readings, last_fill)
+    empties, fulls = fill_events(readings)
+    earlier = pending[['bin_id', 'emptied_at']].rename(columns={'emptied_at': 'timestamp'})
+    cycles = pair_cycles(pd.concat([earlier, empties], ignore_index=True), fulls)
+
+    hourly = hourly_rows(readings)
+    last = readings.groupby('bin_id').tail(1)
+    bins = last[['bin_id', 'timestamp', 'fill_level']].rename(columns={'timestamp': 'last_timestamp', 'fill_level': 'last_fill'})
+    return Batch(hourly, daily_rows(hourly), cycles, bins)
+
+
+###################################################################
+# Tables
+###################################################################
+TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS rollup_hourly (
+        bin_id INT NOT NULL,
+        hour_start DATETIME NOT NULL,
+        readings INT NOT NULL,
+        fill_sum DOUBLE NOT NULL,
+        fill_min DOUBLE NOT NULL,
+        fill_max DOUBLE NOT NULL,
+        increase_sum DOUBLE NOT NULL,
+        increase_count INT NOT NULL,
+        collections INT NOT NULL,
+        PRIMARY KEY (bin_id, hour_start),
+        KEY hour_start (hour_start)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS rollup_daily (
+        bin_id INT NOT NULL,
+        day DATE NOT NULL,
+        readings INT NOT NULL,
+        fill_sum DOUBLE NOT NULL,
+        fill_min DOUBLE NOT NULL,
+        fill_max DOUBLE NOT NULL,
+        collections INT NOT NULL,
+        PRIMARY KEY (bin_id, day),
+        KEY day (day)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS rollup_cycles (
+        bin_id INT NOT NULL,
+        emptied_at DATETIME NOT NULL,
+        full_at DATETIME NULL,
+        time_to_fill INT NULL,
+        PRIMARY KEY (bin_id, emptied_at),
+        KEY full_at (bin_id, full_at)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS rollup_bins (
+        bin_id INT NOT NULL PRIMARY KEY,
+        last_timestamp DATETIME NOT NULL,
+        last_fill DOUBLE NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS rollup_state (
+        id TINYINT NOT NULL PRIMARY KEY,
+        watermark DATETIME NOT NULL
+    )
+    """,
+]
+
+_reported_not_built = False
+
+#Create the rollup tables if they don't exist (backfill and the command line only)
+def ensure_tables():
+    with engine.begin() as conn:
+        for statement in TABLES:
+            conn.exec_driver_sql(statement)
+
+#Whether the rollup tables have been created (by a backfill)
+def tables_exist(conn):
+    count = conn.exec_driver_sql(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = 'rollup_state'"
+    ).scalar()
+    return count > 0
+
+def _placeholders(values):
+    return ", ".join(["%s"] * len(values))
+
+#Readings time rolled up so far: everything before the watermark. None until the first backfill
+def get_watermark(conn=None):
+    df = pd.read_sql("SELECT watermark FROM rollup_state WHERE id = 1", conn if conn is not None else engine)
+    return None if df.empty else pd.Timestamp(df['watermark'].iloc[0]).to_pydatetime()
+
+#{bin_id: last rolled up fill level} and the cycles still waiting for their full, of some bins
+def _bin_state(conn, bin_ids):
+    if not bin_ids:
+        return {}, pd.DataFrame(columns=['bin_id', 'emptied_at'])
+    ids = [int(bin_id) for bin_id in bin_ids]
+    bins = pd.read_sql(f"SELECT bin_id, last_fill FROM rollup_bins WHERE bin_id IN ({_placeholders(ids)})", conn, params=tuple(ids))
+    pending = pd.read_sql(
+        f"SELECT bin_id, emptied_at FROM rollup_cycles WHERE full_at IS NULL AND bin_id IN ({_placeholders(ids)})",
+        conn, params=tuple(ids),
+    )
+    pending['emptied_at'] = pd.to_datetime(pending['emptied_at'])
+    return dict(zip(bins['bin_id'], bins['last_fill'])), pending
+
+def _records(df, columns):
+    df = df[columns].astype(object).where(df[columns].notna(), None)
+    return [tuple(value.to_pydatetime() if isinstance(value, pd.Timestamp) else value for value in row) for row in df.itertuples(index=False, name=None)]
+
+#Add a batch to the rollup tables (rows of the same bin and hour/day are added up)
+def _write_batch(conn, batch, pending):
+    conn.exec_driver_sql(
+        f"""
+        INSERT INTO rollup_hourly ({", ".join(HOURLY_COLUMNS)}) VALUES ({_placeholders(HOURLY_COLUMNS)})
+        ON DUPLICATE KEY UPDATE
+            readings = readings + VALUES(readings),
+            fill_sum = fill_sum + VALUES(fill_sum),
+            fill_min = LEAST(fill_min, VALUES(fill_min)),
+            fill_max = GREATEST(fill_max, VALUES(fill_max)),
+            increase_sum = increase_sum + VALUES(increase_sum),
+            increase_count = increase_count + VALUES(increase_count),
+            collections = collections + VALUES(collections)
+        """,
+        _records(batch.hourly, HOURLY_COLUMNS),
+    )
+    conn.exec_driver_sql(
+        f"""
+        INSERT INTO rollup_daily ({", ".join(DAILY_COLUMNS)}) VALUES ({_placeholders(DAILY_COLUMNS)})
+        ON DUPLICATE KEY UPDATE
+            readings = readings + VALUES(readings),
+            fill_sum = fill_sum + VALUES(fill_sum),
+            fill_min = LEAST(fill_min, VALUES(fill_min)),
+            fill_max = GREATEST(fill_max, VALUES(fill_max)),
+            collections = collections + VALUES(collections)
+        """,
+        _records(batch.daily.assign(day=batch.daily['day'].dt.date), DAILY_COLUMNS),
+    )
+
+    #New emptyings, and earlier ones that reached 80% full in this batch
+    still_pending = batch.cycles['full_at'].isna() & batch.cycles.set_index(['bin_id', 'emptied_at']).index.isin(
+        pending.set_index(['bin_id', 'emptied_at']).index
+    )
+    changed = batch.cycles[~still_pending]
+    if not changed.empty:
+        conn.exec_driver_sql(
+            f"""
+            INSERT INTO rollup_cycles ({", ".join(CYCLE_COLUMNS)}) VALUES ({_placeholders(CYCLE_COLUMNS)})
+            ON DUPLICATE KEY UPDATE full_at = VALUES(full_at), time_to_fill = VALUES(time_to_fill)
+            """,
+            _records(changed, CYCLE_COLUMNS),
+        )
+
+    conn.exec_driver_sql(
+        """
+        INSERT INTO rollup_bins (bin_id, last_timestamp, last_fill) VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE last_timestamp = VALUES(last_timestamp), last_fill = VALUES(last_fill)
+        """,
+        _records(batch.bins, ['bin_id', 'last_timestamp', 'last_fill']),
+    )
+
+
+###################################################################
+# Updates
+###################################################################
+
+#Roll up the next batch of readings, returns the new watermark (None if the rollups aren't built yet)
+def update_batch(until):
+    with engine.begin() as conn:
+        if not tables_exist(conn):
+            return None
+        state = pd.read_sql("SELECT watermark FROM rollup_state WHERE id = 1 FOR UPDATE", conn) #one update at a time
+        if state.empty:
+            return None
+        watermark = pd.Timestamp(state['watermark'].iloc[0]).to_pydatetime()
+        upto = min(until, watermark + timedelta(days=BATCH_DAYS))
+        if upto <= watermark:
+            return watermark
+
+        readings = pd.read_sql(
+            """
+            SELECT bin_id, timestamp, fill_level
+            FROM sensor_table
+            WHERE timestamp >= %s AND timestamp < %s
+            ORDER BY bin_id, timestamp
+            """,
+            conn, params=(watermark, upto),
+        )
+        if not readings.empty:
+            readings['timestamp'] = pd.to_datetime(readings['timestamp'])
+            last_fill, pending = _bin_state(conn, readings['bin_id'].unique().tolist())
+            _write_batch(conn, roll_up(readings, last_fill, pending), pending)
+
+        conn.exec_driver_sql("UPDATE rollup_state SET watermark = %s WHERE id = 1", (upto,))
+        logger.info("Rolled up %d readings up to %s", len(readings), upto)
+        return upto
+
+#Roll up everything that has settled, returns the watermark (None if the rollups aren't built yet)
+#Run by the background refresher
+def update_rollups():
+    global _reported_not_built
+    until = datetime.now().replace(microsecond=0) - timedelta(seconds=SETTLE_SECONDS)
+    while True:
+        watermark = update_batch(until)
+        if watermark is None:
+            #Said once per process, not on every refresh until someone runs the backfill
+            if not _reported_not_built:
+                logger.info("Rollup tables are empty, build them with: python rollups.py backfill")
+                _reported_not_built = True
+            return None
+        if watermark >= until:
+            return watermark
+
+#Rebuild the rollups from since (a day, None for all readings) up to now
+def backfill(since=None):
+    ensure_tables()
+    with engine.begin() as conn:
+        #Wait for an update in progress and keep new ones out until the rollups are reset
+        #(the same row lock as update_batch, on the gap before the first backfill)
+        conn.exec_driver_sql("SELECT watermark FROM rollup_state WHERE id = 1 FOR UPDATE")
+        if since is None:
+            for table in ("rollup_hourly", "rollup_daily", "rollup_cycles", "rollup_bins"):
+                conn.exec_driver_sql(f"DELETE FROM {table}")
+            first = pd.read_sql("SELECT MIN(timestamp) AS first FROM sensor_table", conn)['first'].iloc[0]
+            if pd.isna(first):
+                logger.info("No readings to roll up")
+                return None
+            watermark = pd.Timestamp(first).floor('D').to_pydatetime()
+        else:
+            #Drop everything from since on, and put the bins back as they were before it
+            watermark = datetime.combine(since, datetime.min.time())
+            conn.exec_driver_sql("DELETE FROM rollup_hourly WHERE hour_start >= %s", (watermark,))
+            conn.exec_driver_sql("DELETE FROM rollup_daily WHERE day >= %s", (watermark.date(),))
+            conn.exec_driver_sql("DELETE FROM rollup_cycles WHERE emptied_at >= %s", (watermark,))
+            conn.exec_driver_sql("UPDATE rollup_cycles SET full_at = NULL, time_to_fill = NULL WHERE full_at >= %s", (watermark,))
+            conn.exec_driver_sql("DELETE FROM rollup_bins")
+            conn.exec_driver_sql(
+                """
+                INSERT INTO rollup_bins (bin_id, last_timestamp, last_fill)
+                SELECT bin_id, timestamp, fill_level
+                FROM (
+                    SELECT bin_id, timestamp, fill_level,
+                        ROW_NUMBER() OVER (PARTITION BY bin_id ORDER BY timestamp DESC) AS rn
+                    FROM sensor_table
+                    WHERE timestamp < %s
+                ) last_readings
+                WHERE rn = 1
+                """,
+                (watermark,),
+            )
+        conn.exec_driver_sql("REPLACE INTO rollup_state (id, watermark) VALUES (1, %s)", (watermark,))
+
+    logger.info("Backfilling rollups from %s", watermark)
+    return update_rollups()
+
+
+###################################################################
+# Reading a period
+###################################################################
+
+#Rollup tables of some bins over [start, end): hourly, daily and cycles (that reached 80% full in it)
+#Read from the rollups up to the watermark, anything after it is worked out from the readings
+def read_period(bin_ids, start, end):
+    try:
+        watermark = get_watermark()
+    except SQLAlchemyError:
+        #Rollup tables not created yet, everything from the readings
+        watermark = None
+    if watermark is None or watermark < start:
+        return _raw_period(bin_ids, start, end)
+    return _rollup_period(bin_ids, start, end, watermark)
+
+#From the readings alone, with LOOKBACK_DAYS before start for the emptyings
+def _raw_period(bin_ids, start, end):
+    readings = with_prev_fill(get_fill_readings(bin_ids, start - timedelta(days=LOOKBACK_DAYS), end))
+    empties, fulls = fill_events(readings)
+    cycles = pair_cycles(empties, fulls).dropna(subset=['full_at'])
+    hourly = hourly_rows(readings[readings['timestamp'] >= start])
+    return {
+        "hourly": hourly,
+        "daily": daily_rows(hourly),
+        "cycles": cycles[cycles['full_at'] >= start].reset_index(drop=True),
+    }
+
+def _rollup_period(bin_ids, start, end, watermark):
+    ids = tuple(int(bin_id) for bin_id in bin_ids)
+    where = f"bin_id IN ({_placeholders(ids)})"
+    with engine.connect() as conn:
+        hourly = pd.read_sql(
+            f"SELECT {', '.join(HOURLY_COLUMNS)} FROM rollup_hourly WHERE {where} AND hour_start >= %s AND hour_start < %s",
+            conn, params=(*ids, start, end),
+        )
+        daily = pd.read_sql(
+            f"SELECT {', '.join(DAILY_COLUMNS)} FROM rollup_daily WHERE {where} AND day >= %s AND day < %s",
+            conn, params=(*ids, start.date(), end.date() if end.time() == datetime.min.time() else end.date() + timedelta(days=1)),
+        )
+        cycles = pd.read_sql(
+            f"SELECT {', '.join(CYCLE_COLUMNS)} FROM rollup_cycles WHERE {where} AND full_at >= %s AND full_at < %s",
+            conn, params=(*ids, start, end),
+        )
+        hourly['hour_start'] = pd.to_datetime(hourly['hour_start'])
+        daily['day'] = pd.to_datetime(daily['day'])
+        for column in ('emptied_at', 'full_at'):
+            cycles[column] = pd.to_datetime(cycles[column])
+
+        #Readings after the watermark, rolled up on the fly
+        if watermark < end:
+            tail = get_fill_readings(ids, watermark, end)
+            if not tail.empty:
+                last_fill, pending = _bin_state(conn, ids)
+                batch = roll_up(tail, last_fill, pending)
+                hourly = merge_rows([hourly, batch.hourly], ['bin_id', 'hour_start'])
+                daily = merge_rows([daily, batch.daily], ['bin_id', 'day'])
+                cycles = pd.concat([cycles, batch.cycles.dropna(subset=['full_at'])], ignore_index=True)
+
+    return {
+        "hourly": hourly.sort_values(['bin_id', 'hour_start']).reset_index(drop=True),
+        "daily": daily.sort_values(['bin_id', 'day']).reset_index(drop=True),
+        "cycles": cycles.sort_values(['bin_id', 'full_at']).reset_index(drop=True),
+    }
+
+
+###################################################################
+# Consistency check
+###################################################################
+
+#Compare the rollups of [start, end) with the same tables worked out from the readings
+#Returns a list of mismatch descriptions, empty when they agree
+def check(start, end):
+    watermark = get_watermark()
+    if watermark is None:
+        return ["Rollups aren't built yet"]
+    end = min(end, watermark)
+    if end <= start:
+        return []
+
+    bin_ids = pd.read_sql(
+        "SELECT DISTINCT bin_id FROM sensor_table WHERE timestamp >= %s AND timestamp < %s", engine, params=(start, end),
+    )['bin_id'].tolist()
+    if not bin_ids:
+        return []
+
+    raw = _raw_period(bin_ids, start, end)
+    rolled = _rollup_period(bin_ids, start, end, end) #no tail, only what's rolled up
+
+    problems = []
+    for name, keys in (("hourly", ['bin_id', 'hour_start']), ("daily", ['bin_id', 'day'])):
+        merged = raw[name].merge(rolled[name], on=keys, how='outer', suffixes=('_raw', '_rollup'), indicator=True)
+        for row in merged[merged['_merge'] != 'both'].head(20).itertuples():
+            problems.append(f"{name} {row.bin_id} {getattr(row, keys[1])}: only in {'readings' if row._merge == 'left_only' else 'rollups'}")
+        both = merged[merged['_merge'] == 'both']
+        for column in [column for column in raw[name].columns if column not in keys]:
+            differs = (both[f"{column}_raw"] - both[f"{column}_rollup"]).abs() > 1e-6 * both[f"{column}_raw"].abs().clip(lower=1)
+            differ = both[differs]
+            for row in differ.head(20).itertuples():
+                problems.append(f"{name} {row.bin_id} {getattr(row, keys[1])} {column}: readings {getattr(row, column + '_raw')}, rollups {getattr(row, column + '_rollup')}")
+
+    #Cycles that started in the period, earlier ones depend on readings before the lookback
+    keys = ['bin_id', 'emptied_at', 'full_at']
+    raw_cycles = raw["cycles"][raw["cycles"]['emptied_at'] >= start][keys]
+    rolled_cycles = rolled["cycles"][rolled["cycles"]['emptied_at'] >= start][keys]
+    merged = raw_cycles.merge(rolled_cycles, on=keys, how='outer', indicator=True)
+    for row in merged[merged['_merge'] != 'both'].head(20).itertuples():
+        problems.append(f"cycle {row.bin_id} {row.emptied_at} -> {row.full_at}: only in {'readings' if row._merge == 'left_only' else 'rollups'}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build, update and check the analytics rollup tables")
+    commands = parser.add_subparsers(dest="command", required=True)
+    backfill_parser = commands.add_parser("backfill", help="rebuild the rollups from the readings")
+    backfill_parser.add_argument("--since", type=lambda value: datetime.strptime(value, "%Y-%m-%d").date(), help="only rebuild from this day (YYYY-MM-DD)")
+    commands.add_parser("update", help="roll up the readings that arrived since the last update")
+    check_parser = commands.add_parser("check", help="compare the rollups with the readings")
+    check_parser.add_argument("--start", required=True, type=datetime.fromisoformat, help="YYYY-MM-DD")
+    check_parser.add_argument("--end", required=True, type=datetime.fromisoformat, help="YYYY-MM-DD, exclusive")
+    args = parser.parse_args()
+
+    if args.command == "backfill":
+        logger.info("Rollups up to %s", backfill(args.since))
+    elif args.command == "update":
+        ensure_tables()
+        logger.info("Rollups up to %s", update_rollups())
+    else:
+        problems = check(args.start, args.end)
+        for problem in problems:
+            logger.warning(problem)
+        logger.info("%d mismatches between the rollups and the readings", len(problems))
+        sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    main()
@@ -0,0 +1,195 @@
+#In-memory search index for the bin ID and address search dropdowns.
+#Values are matched by prefix (binary search over the sorted keys) and by substring
+#(trigram postings narrow down the candidates), ranked, and cut to the top K.
+#The indexes are built from the cached fleet metadata and only rebuilt when it changes,
+#so typing in a search box never runs a SQL query per character.
+import bisect
+import heapq
+import json
+import re
+import threading
+
+import pandas as pd
+from dash import dcc, callback, clientside_callback, Input, Output, State, exceptions
+
+from fleet_cache import get_fleet_metadata
+
+#Most options returned to a search dropdown
+SEARCH_LIMIT = 50
+
+
+#Lowercase and collapse whitespace so "12  Smith St" matches "12 smith st"
+def normalise(text):
+    return re.sub(r"\s+", " ", str(text)).strip().lower()
+
+def trigrams(key):
+    return {key[i:i + 3] for i in range(len(key) - 2)}
+
+
+class SearchIndex:
+    #values: the searchable values (bin IDs or addresses), duplicates and blanks are dropped
+    def __init__(self, values):
+        self.values = []
+        self.keys = []
+        for value in dict.fromkeys(values):
+            if value is None or (not isinstance(value, str) and pd.isna(value)):
+                continue
+            key = normalise(value)
+            if not key:
+                continue
+            self.values.append(value)
+            self.keys.append(key)
+
+        #Keys in sorted order (with their positions) for prefix lookups
+        order = sorted(range(len(self.keys)), key=self.keys.__getitem__)
+        self.sorted_keys = [self.keys[position] for position in order]
+        self.sorted_positions = order
+
+        #trigram -> set of positions whose key contains it, for substring lookups
+        self.postings = {}
+        for position, key in enumerate(self.keys):
+            for gram in trigrams(key):
+                self.postings.setdefault(gram, set()).add(position)
+
+    def __len__(self):
+        return len(self.values)
+
+    #First `limit` values in the order they were given
+    def first(self, limit=SEARCH_LIMIT):
+        return self.values[:limit]
+
+    #Lower is better: exact match, then prefix, then start of a word, then anywhere
+    @staticmethod
+    def _rank(key, query):
+        if key == query:
+            return 0
+        if key.startswith(query):
+            return 1
+        start = key.find(query)
+        while start != -1:
+            if not key[start - 1].isalnum():
+                return 2
+            start = key.find(query, start + 1)
+        return 3
+
+    def _prefix_positions(self, query):
+        lo = bisect.bisect_left(self.sorted_keys, query)
+        hi = bisect.bisect_left(self.sorted_keys, query + "\uffff")
+        return self.sorted_positions[lo:hi]
+
+    def _substring_positions(self, query):
+        #Short queries have no trigrams, check every key
+        if len(query) < 3:
+            return [position for position, key in enumerate(self.keys) if query in key]
+
+        #Intersect the smallest posting sets first, then confirm the substring
+        postings = sorted((self.postings.get(gram, ()) for gram in trigrams(query)), key=len)
+        if not postings[0]:
+            return []
+        candidates = set(postings[0]).intersection(*postings[1:])
+        return [position for position in candidates if query in self.keys[position]]
+
+    #Best `limit` values containing query, ranked by _rank then shortest then alphabetical
+    def search(self, query, limit=SEARCH_LIMIT):
+        query = normalise(query)
+        if not query or limit <= 0:
+            return []
+
+        positions = self._prefix_positions(query)
+        #Prefix matches always outrank the rest, only look further if there aren't enough
+        if len(positions) < limit:
+            positions = self._substring_positions(query)
+
+        ranked = heapq.nsmallest(
+            limit, positions,
+            key=lambda position: (self._rank(self.keys[position], query), len(self.keys[position]), self.keys[position]),
+        )
+        return [self.values[position] for position in ranked]
+
+
+###################################################################
+# Shared indexes for the current bin metadata
+###################################################################
+_index_lock = threading.Lock()
+_indexes = None
+_indexes_version = None
+
+#Return the "bin_id" or "address" index, only rebuilt when the fleet metadata version changes
+def get_search_index(kind):
+    global _indexes, _indexes_version
+
+    metadata, version = get_fleet_metadata()
+    with _index_lock:
+        if _indexes is None or version != _indexes_version:
+            _indexes = {
+                "bin_id": SearchIndex(sorted(metadata['bin_id'].dropna().unique().tolist())),
+                "address": SearchIndex(metadata['bin_location'].dropna().tolist()),
+            }
+            _indexes_version = version
+        return _indexes[kind]
+
+def search_bin_ids(query, limit=SEARCH_LIMIT):
+    return get_search_index("bin_id").search(query, limit)
+
+def search_addresses(query, limit=SEARCH_LIMIT):
+    return get_search_index("address").search(query, limit)
+
+#Column of the browser's reference cache (reference_data.py) each search can run against
+search_bin_ids.reference_column = "bin_id"
+search_addresses.reference_column = "bin_location"
+
+#Lowest bin IDs, used as the starting options of the bin ID dropdowns
+def first_bin_ids(limit=SEARCH_LIMIT):
+    return get_search_index("bin_id").first(limit)
+
+
+###################################################################
+# Search dropdown wiring
+# When the browser has the fleet reference data cached, ui.debounce_search in
+# assets/clientside.js searches it and sets the dropdown's options directly. Otherwise
+# the dropdown's search_value is debounced into a "<dropdown id>-search" dcc.Store, and
+# only that store triggers the server side search.
+###################################################################
+
+#Put this next to the dropdown in the layout
+def search_store(dropdown_id):
+    return dcc.Store(id=f"{dropdown_id}-search")
+
+#Register the callbacks that fill dropdown_id's options from search(query, limit)
+#as_text: option values are str (for filters that compare against bin_id.astype(str))
+def register_search_dropdown(dropdown_id, search, as_text=False):
+    #Tell the browser which cached reference column to search (if any) and the option value type
+    column = getattr(search, "reference_column", None)
+    clientside_callback(
+        f"""function(search_value, selected) {{
+            return window.dash_clientside.ui.debounce_search(search_value, selected, {json.dumps(column)}, {json.dumps(as_text)});
+        }}""",
+        Output(f"{dropdown_id}-search", "data"),
+        Input(dropdown_id, "search_value"),
+        State(dropdown_id, "value"),
+        prevent_initial_call=True,
+    )
+
+    @callback(
+        Output(dropdown_id, "options"),
+        Input(f"{dropdown_id}-search", "data"),
+        State(dropdown_id, "value"),
+        prevent_initial_call=True,
+    )
+    def update_search_options(search_value, selected):
+        #If search field is empty or if it's just spaces then don't update dropdown options
+        if not search_value or not search_value.strip():
+            raise exceptions.PreventUpdate
+
+        values = search(search_value)
+        if as_text:
+            values = [str(value) for value in values]
+
+        #Keep the selected value(s) in the options so the dropdown can still show them
+        for value in (selected if isinstance(selected, list) else [selected]):
+            if value is not None and value not in values:
+                values.append(value)
+
+        return [{"label": str(value), "value": value} for value in values]
+
+    return update_search_options
@@ -0,0 +1,130 @@
+#JSON serializer for the callback responses.
+#Dash turns every callback response (figures, DataTable rows, map component trees) and the
+#layout into JSON with plotly.io.json.to_json_plotly. Its standard engine walks the whole
+#response in Python and is a large share of the time of the callbacks with big outputs,
+#e.g. update_bin_data_table and the map updates. Plotly's own "orjson" engine doesn't help
+#the component trees: it cleans the whole tree in Python before handing it to orjson.
+#
+#The "orjson" serializer below hands the response straight to orjson, which writes dicts,
+#lists, strings, numbers, datetimes and NumPy arrays and scalars natively. Python is only
+#called back (_default) for the objects orjson doesn't know: Dash components and figures
+#(to_plotly_json), pandas values and anything else plotly's encoder supports. The output
+#is the same JSON as plotly's, with the same escaping of <, > and / for inline scripts.
+#
+#The serializer is picked with JSON_SERIALIZER:
+#- "orjson" (default): falls back to "plotly" with a warning when orjson isn't installed
+#- "plotly": plotly's standard engine, as before
+#
+#Dash looks up plotly.io.json.to_json_plotly on every call, so use_serializer() installs
+#the serializer there. That is done on the first request of each worker rather than at
+#import, so plotly isn't imported while the app starts (see lazy_imports.py). Compare the
+#serializers on our largest responses with:  python benchmarks/serialization_benchmark.py
+import datetime
+import decimal
+import importlib.util
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+#Serializer for the callback responses
+JSON_SERIALIZER = os.getenv("JSON_SERIALIZER", "orjson")
+
+#Characters escaped in the JSON text, like plotly does, so it is safe inside a <script>
+SAFE_SWAPS = (
+    ("<", "\\u003c"),
+    (">", "\\u003e"),
+    ("/", "\\u002f"),
+    ("\u2028", "\\u2028"),
+    ("\u2029", "\\u2029"),
+)
+
+_plotly_to_json = None #plotly's own to_json_plotly, before use_serializer replaced it
+_configured = None
+
+
+###################################################################
+# Serializers: to_json_plotly(value, pretty=False, engine=None) -> str
+###################################################################
+
+#Plotly's standard engine
+def to_json_plotly(value, pretty=False, engine=None):
+    from plotly.io import json as plotly_json
+    return (_plotly_to_json or plotly_json.to_json_plotly)(value, pretty=pretty, engine=engine or "json")
+
+#Objects orjson can't write itself, converted the way plotly's encoder does
+def _default(obj):
+    import pandas as pd
+
+    if hasattr(obj, "to_plotly_json"): #Dash components, figures
+        return obj.to_plotly_json()
+    if obj is pd.NA or obj is pd.NaT:
+        return None
+    if isinstance(obj, (datetime.datetime, datetime.date)):
+        return obj.isoformat()
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if hasattr(obj, "tolist"): #arrays orjson doesn't write natively, pandas Series/Index
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def to_json_orjson(value, pretty=False, engine=None):
+    import orjson
+
+    #Explicit requests for plotly's engines (and pretty printing) keep plotly's behaviour
+    if pretty or engine not in (None, "orjson", "auto"):
+        return to_json_plotly(value, pretty=pretty, engine=engine)
+
+    try:
+        text = orjson.dumps(value, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode()
+    except TypeError:
+        #Something only plotly's encoder knows (e.g. images), let it write the whole response
+        return to_json_plotly(value)
+    for unsafe, safe in SAFE_SWAPS:
+        if unsafe in text:
+            text = text.replace(unsafe, safe)
+    return text
+
+
+SERIALIZERS = {
+    "orjson": to_json_orjson,
+    "plotly": to_json_plotly,
+}
+
+
+###################################################################
+# Installing the serializer
+###################################################################
+
+#The serializer that will actually be used for name (orjson is only used when it is installed)
+def resolve_serializer(name=JSON_SERIALIZER):
+    if name not in SERIALIZERS:
+        raise ValueError(f"Unknown JSON serializer {name!r}, use one of: {', '.join(SERIALIZERS)}")
+    if name == "orjson" and importlib.util.find_spec("orjson") is None:
+        logger.warning("orjson is not installed, callback responses use plotly's JSON encoder")
+        return "plotly"
+    return name
+
+#Encode everything Dash serializes (callback responses, figures, the layout) with this serializer
+#Returns the name of the serializer in use
+def use_serializer(name=JSON_SERIALIZER):
+    global _plotly_to_json, _configured
+    from plotly.io import json as plotly_json
+
+    if _plotly_to_json is None:
+        _plotly_to_json = plotly_json.to_json_plotly
+    name = resolve_serializer(name)
+    plotly_json.to_json_plotly = SERIALIZERS[name]
+    _configured = name
+    return name
+
+#JSON text of a value with this serializer, without installing it
+def dumps(value, name=JSON_SERIALIZER):
+    return SERIALIZERS[resolve_serializer(name)](value)
+
+#Install the serializer in each worker before it serves its first request
+def register_serializer(server, name=JSON_SERIALIZER):
+    @server.before_request
+    def ensure_serializer():
+        if _configured is None:
+            use_serializer(name)
@@ -0,0 +1,385 @@
+#Cache shared by every worker process on this machine.
+#Under gunicorn each worker has its own memory, so caching inside a worker means one
+#copy of each dataset (and one set of database queries) per worker. Instead, datasets
+#are published as snapshots into a local SQLite file (WAL mode, so readers never block
+#the writer) that all workers read.
+#
+#- Publishing a snapshot replaces the old one in a single transaction, readers see
+#  either the old or the new snapshot, never a mix.
+#- Every publish of changed data bumps the dataset's version, which only ever goes up.
+#- When a snapshot is too old, one worker takes a lease and recomputes it while the
+#  others keep serving the previous snapshot.
+#- Each worker also keeps the last snapshot it unpickled, and only re-reads the payload
+#  when the version in the file has changed.
+#
+#Payloads are pickled, so the cache file must only be writable by the app's user
+#(it is created in a 0700 directory). If the cache file can't be used the datasets
+#are just computed directly, like before.
+import functools
+import hashlib
+import inspect
+import logging
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+SHARED_CACHE_PATH = os.getenv(
+    "SHARED_CACHE_PATH",
+    os.path.join(tempfile.gettempdir(), "smart-bin-dashboard-cache", "shared_cache.sqlite3"),
+)
+#A worker recomputing a dataset holds its lease this long (seconds) before others may take over
+LEASE_SECONDS = 120
+#How long a worker with nothing to serve waits for another worker's first snapshot
+FIRST_SNAPSHOT_WAIT_SECONDS = 30
+#Requests only compute a dataset themselves once this many background refreshes were missed
+MISSED_REFRESHES = 3
+
+Snapshot = namedtuple("Snapshot", ["version", "published_at", "value"])
+
+#Unique ID of this process for leases
+_pid = os.getpid()
+_holder_id = f"{_pid}-{uuid.uuid4().hex[:8]}"
+_local = threading.local() #one SQLite connection per thread
+_memo_lock = threading.Lock()
+_memo = {} #name -> Snapshot last read by this process
+
+
+###################################################################
+# SQLite connection
+###################################################################
+def _connect():
+    directory = os.path.dirname(SHARED_CACHE_PATH)
+    if directory:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    conn = sqlite3.connect(SHARED_CACHE_PATH, timeout=10, isolation_level=None) #autocommit, transactions are explicit
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS snapshots (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL,
+            published_at REAL NOT NULL,
+            payload BLOB NOT NULL
+        )
+    """)
+    #digest of the payload, so republishing identical data doesn't bump the version
+    try:
+        conn.execute("ALTER TABLE snapshots ADD COLUMN digest TEXT")
+    except sqlite3.OperationalError:
+        pass #already there
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS leases (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS states (
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            used_at REAL NOT NULL,
+            payload BLOB NOT NULL,
+            PRIMARY KEY (kind, key)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_id TEXT PRIMARY KEY,
+            state TEXT NOT NULL,
+            seen_at REAL NOT NULL
+        )
+    """)
+    return conn
+
+#Connection for this thread
+def _connection():
+    global _pid, _holder_id, _local
+    if os.getpid() != _pid:
+        #Forked (gunicorn --preload), SQLite connections and leases can't be shared with the parent
+        _pid = os.getpid()
+        _holder_id = f"{_pid}-{uuid.uuid4().hex[:8]}"
+        _local = threading.local()
+
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = _connect()
+    return conn
+
+
+###################################################################
+# Snapshots
+###################################################################
+
+#Atomically replace the snapshot for name, returns its version
+#If the data is identical to the current snapshot only its publish time is updated, so the
+#version only changes when the data does
+def publish(name, value):
+    payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    digest = hashlib.blake2b(payload, digest_size=16).hexdigest()
+    published_at = time.time()
+
+    conn = _connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT version, digest FROM snapshots WHERE name = ?", (name,)).fetchone()
+        if row is not None and row[1] == digest:
+            version = row[0]
+            conn.execute("UPDATE snapshots SET published_at = ? WHERE name = ?", (published_at, name))
+        else:
+            version = (row[0] if row else 0) + 1
+            conn.execute(
+                "INSERT OR REPLACE INTO snapshots (name, version, published_at, payload, digest) VALUES (?, ?, ?, ?, ?)",
+                (name, version, published_at, payload, digest),
+            )
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+    with _memo_lock:
+        _memo[name] = Snapshot(version, published_at, value)
+    return version
+
+#Current version of name, or None if it has never been published
+def get_version(name):
+    row = _connection().execute("SELECT version FROM snapshots WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else None
+
+#Version of each dataset name, covering all of its argument variants (e.g. both weeks of weekly stats)
+#Each variant's version only goes up, so their sum does too. Datasets never published are 0
+def dataset_versions(names):
+    versions = {}
+    conn = _connection()
+    for name in names:
+        row = conn.execute(
+            "SELECT COALESCE(SUM(version), 0) FROM snapshots WHERE name = ? OR substr(name, 1, ?) = ?",
+            (name, len(name) + 1, name + "("),
+        ).fetchone()
+        versions[name] = row[0]
+    return versions
+
+#Latest Snapshot for name, or None. The payload is only unpickled when the version changed
+def read(name):
+    conn = _connection()
+    row = conn.execute("SELECT version, published_at FROM snapshots WHERE name = ?", (name,)).fetchone()
+    if row is None:
+        return None
+
+    version, published_at = row
+    with _memo_lock:
+        memo = _memo.get(name)
+    if memo is not None and memo.version == version:
+        #Same payload, but published_at can still change (see expire)
+        return memo._replace(published_at=published_at)
+
+    row = conn.execute("SELECT version, published_at, payload FROM snapshots WHERE name = ?", (name,)).fetchone()
+    if row is None:
+        return None
+    snapshot = Snapshot(row[0], row[1], pickle.loads(row[2]))
+    with _memo_lock:
+        _memo[name] = snapshot
+    return snapshot
+
+#Mark a snapshot as out of date (e.g. after the data behind it was edited), the next read recomputes it
+def expire(name):
+    try:
+        _connection().execute("UPDATE snapshots SET published_at = 0 WHERE name = ?", (name,))
+    except sqlite3.Error:
+        logger.exception("Could not expire shared cache entry %s", name)
+
+
+###################################################################
+# Leases: only one worker recomputes a dataset at a time
+###################################################################
+
+#Lease holder ID for this process and thread
+def _holder():
+    return f"{_holder_id}-{threading.get_ident()}"
+
+def _acquire_lease(name, seconds=LEASE_SECONDS):
+    now = time.time()
+    conn = _connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT holder, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+        acquired = row is None or row[0] == _holder() or row[1] < now
+        if acquired:
+            conn.execute(
+                "INSERT OR REPLACE INTO leases (name, holder, expires_at) VALUES (?, ?, ?)",
+                (name, _holder(), now + seconds),
+            )
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return acquired
+
+def _release_lease(name):
+    _connection().execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, _holder()))
+
+
+###################################################################
+# Read-through access
+###################################################################
+
+#Return the value of dataset name, computing and publishing it with compute() when the
+#snapshot is missing or older than max_age seconds
+def get_or_compute(name, compute, max_age):
+    try:
+        snapshot = read(name)
+        if snapshot is not None and time.time() - snapshot.published_at <= max_age:
+            return snapshot.value
+
+        if _acquire_lease(name):
+            try:
+                value = compute()
+                try:
+                    publish(name, value)
+                except sqlite3.Error:
+                    logger.exception("Could not publish %s to the shared cache", name)
+            finally:
+                _release_lease(name)
+            return value
+
+        #Another worker is recomputing it, serve the previous snapshot meanwhile
+        if snapshot is not None:
+            return snapshot.value
+
+        #Nothing published yet, wait for the other worker's first snapshot
+        deadline = time.monotonic() + FIRST_SNAPSHOT_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(0.1)
+            snapshot = read(name)
+            if snapshot is not None:
+                return snapshot.value
+    except sqlite3.Error:
+        logger.exception("Shared cache unavailable, computing %s directly", name)
+
+    return compute()
+
+#Shared cache key of a dataset called with args, e.g. "weekly_collection_stats(-1,)"
+def dataset_key(name, args=()):
+    return f"{name}{args!r}" if args else name
+
+#Seconds since the snapshot for key was published, or None if it has never been published
+def snapshot_age(key):
+    row = _connection().execute("SELECT published_at FROM snapshots WHERE name = ?", (key,)).fetchone()
+    return time.time() - row[0] if row else None
+
+#Recompute and publish a snapshot now, unless another worker is already doing it
+#Returns True if this worker refreshed it
+def refresh(key, compute):
+    if not _acquire_lease(key):
+        return False
+    try:
+        publish(key, compute())
+    finally:
+        _release_lease(key)
+    return True
+
+###################################################################
+# Small keyed states shared by every worker and background job (e.g. which markers each map
+# marker version holds, see map_markers.py), so the next request can use them wherever it runs
+###################################################################
+
+#Save value as the state key of kind, keeping only the keep most recently used states of that kind
+def save_state(kind, key, value, keep):
+    payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    conn = _connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            "INSERT OR REPLACE INTO states (kind, key, used_at, payload) VALUES (?, ?, ?, ?)",
+            (kind, key, time.time(), payload),
+        )
+        conn.execute(
+            "DELETE FROM states WHERE kind = ? AND key NOT IN "
+            "(SELECT key FROM states WHERE kind = ? ORDER BY used_at DESC LIMIT ?)",
+            (kind, kind, keep),
+        )
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+#The state key of kind, or None if it was never saved or has been dropped
+def load_state(kind, key):
+    conn = _connection()
+    row = conn.execute("SELECT payload FROM states WHERE kind = ? AND key = ?", (kind, key)).fetchone()
+    if row is None:
+        return None
+    conn.execute("UPDATE states SET used_at = ? WHERE kind = ? AND key = ?", (time.time(), kind, key))
+    return pickle.loads(row[0])
+
+
+###################################################################
+# Session activity: browser tabs report whether they are active, idle or hidden
+# (see live_updates.py), counted across all workers
+###################################################################
+
+def record_session(session_id, state):
+    conn = _connection()
+    now = time.time()
+    conn.execute(
+        "INSERT OR REPLACE INTO sessions (session_id, state, seen_at) VALUES (?, ?, ?)",
+        (session_id, state, now),
+    )
+
+#{state: number of sessions} for the sessions that reported in the last timeout seconds
+#Older sessions (closed tabs) are deleted
+def session_counts(timeout):
+    conn = _connection()
+    cutoff = time.time() - timeout
+    conn.execute("DELETE FROM sessions WHERE seen_at < ?", (cutoff,))
+    rows = conn.execute("SELECT state, COUNT(*) FROM sessions GROUP BY state").fetchall()
+    return dict(rows)
+
+
+#name -> decorated data function, used by the background refresher (refresher.py)
+DATASETS = {}
+
+#Copy of a dataset value, also of the DataFrames inside a tuple (e.g. (df, week_start, week_end)),
+#so callers never modify the snapshot this process keeps in _memo
+def _own_copy(value):
+    if isinstance(value, tuple):
+        return tuple(_own_copy(item) for item in value)
+    return value.copy() if hasattr(value, "copy") else value
+
+#Decorator for a data function whose results are shared by all workers
+#refresh_every: seconds between background refreshes of the snapshot (see refresher.py)
+#max_age: oldest snapshot a request will use before computing it itself, by default a few missed refreshes
+#refresh_args: the argument tuples the refresher keeps fresh, e.g. [(0,), (-1,)]
+#Callers get their own copy so they can modify it freely
+def shared_dataset(name, refresh_every, max_age=None, refresh_args=((),)):
+    if max_age is None:
+        max_age = MISSED_REFRESHES * refresh_every
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            #All the arguments as one positional tuple with the defaults filled in, so
+            #f(), f(0) and f(week=0) share a snapshot (and match refresh_args)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            args = bound.args
+            value = get_or_compute(dataset_key(name, args), lambda: func(*args), max_age)
+            return _own_copy(value)
+
+        wrapper.dataset_name = name
+        wrapper.refresh_every = refresh_every
+        wrapper.refresh_args = list(refresh_args)
+        wrapper.uncached = func #the original function, always queries
+        DATASETS[name] = wrapper
+        return wrapper
+    return decorator
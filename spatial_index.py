@@ -0,0 +1,178 @@
+#In-process spatial index over bin coordinates for the map pages.
+#Bins are bucketed into a fixed grid of lat/lon cells so bounding box, radius
+#and nearest-N queries only look at the cells around the query point instead of
+#scanning every row of the bin DataFrame.
+import heapq
+import math
+import threading
+
+import pandas as pd
+
+#Mean earth radius in metres, used for haversine distances
+EARTH_RADIUS_M = 6371008.8
+#Metres per degree of latitude (roughly constant everywhere)
+METRES_PER_DEGREE = 111195.0
+#Grid cell size in degrees, about 550m x 440m around Maribyrnong
+CELL_SIZE_DEG = 0.005
+
+
+#Great-circle distance in metres between two lat/lon points
+def haversine_m(lat1, lon1, lat2, lon2):
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+class BinSpatialIndex:
+    #Build the grid from parallel sequences of bin IDs and coordinates
+    #Bins with missing coordinates are skipped since they can't be placed on the map
+    def __init__(self, bin_ids, latitudes, longitudes, cell_size=CELL_SIZE_DEG):
+        self.cell_size = cell_size
+        self.bin_ids = []
+        self.latitudes = []
+        self.longitudes = []
+        self.cells = {} #(row, col) -> list of positions into the lists above
+
+        for bin_id, lat, lon in zip(bin_ids, latitudes, longitudes):
+            if lat is None or lon is None or pd.isna(lat) or pd.isna(lon):
+                continue
+            lat, lon = float(lat), float(lon)
+            position = len(self.bin_ids)
+            self.bin_ids.append(bin_id)
+            self.latitudes.append(lat)
+            self.longitudes.append(lon)
+            self.cells.setdefault(self._cell(lat, lon), []).append(position)
+
+        #Extent of occupied cells, lets nearest() know when it has searched everything
+        if self.cells:
+            rows = [cell[0] for cell in self.cells]
+            cols = [cell[1] for cell in self.cells]
+            self.row_range = (min(rows), max(rows))
+            self.col_range = (min(cols), max(cols))
+        else:
+            self.row_range = self.col_range = (0, -1)
+
+    def __len__(self):
+        return len(self.bin_ids)
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.cell_size), math.floor(lon / self.cell_size))
+
+    #Yields the positions of every bin in the cells overlapping the given box
+    def _candidates(self, south, west, north, east):
+        row_min, col_min = self._cell(south, west)
+        row_max, col_max = self._cell(north, east)
+
+        #If the box covers more cells than are occupied, walk the occupied cells instead
+        if (row_max - row_min + 1) * (col_max - col_min + 1) > len(self.cells):
+            for (row, col), positions in self.cells.items():
+                if row_min <= row <= row_max and col_min <= col <= col_max:
+                    yield from positions
+            return
+
+        for row in range(row_min, row_max + 1):
+            for col in range(col_min, col_max + 1):
+                yield from self.cells.get((row, col), ())
+
+    #Bin IDs inside a bounding box, in the order they were indexed
+    def in_bounds(self, south, west, north, east):
+        matches = [
+            position for position in self._candidates(south, west, north, east)
+            if south <= self.latitudes[position] <= north and west <= self.longitudes[position] <= east
+        ]
+        matches.sort()
+        return [self.bin_ids[position] for position in matches]
+
+    #List of (bin_id, distance in metres) within radius_m of a point, closest first
+    def within_radius(self, lat, lon, radius_m):
+        d_lat = radius_m / METRES_PER_DEGREE
+        #Longitude degrees shrink with latitude, guard against the poles
+        d_lon = radius_m / (METRES_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+
+        results = []
+        for position in self._candidates(lat - d_lat, lon - d_lon, lat + d_lat, lon + d_lon):
+            distance = haversine_m(lat, lon, self.latitudes[position], self.longitudes[position])
+            if distance <= radius_m:
+                results.append((distance, position))
+
+        results.sort()
+        return [(self.bin_ids[position], distance) for distance, position in results]
+
+    #List of the n closest (bin_id, distance in metres) to a point, closest first
+    #Searches outwards one ring of cells at a time and stops once no unvisited
+    #cell can hold anything closer than the current n-th best bin
+    def nearest(self, lat, lon, n=10):
+        if n <= 0 or not self.bin_ids:
+            return []
+
+        centre_row, centre_col = self._cell(lat, lon)
+        row_lo, row_hi = self.row_range
+        col_lo, col_hi = self.col_range
+        #Rings closer than the occupied area are empty, rings past it don't exist
+        min_ring = max(row_lo - centre_row, centre_row - row_hi, col_lo - centre_col, centre_col - col_hi, 0)
+        max_ring = max(
+            abs(centre_row - row_lo), abs(centre_row - row_hi),
+            abs(centre_col - col_lo), abs(centre_col - col_hi),
+        )
+        #Smallest width of a cell in metres, so ring distances are never overestimated
+        cell_m = self.cell_size * METRES_PER_DEGREE * max(math.cos(math.radians(min(abs(lat) + 1.0, 90.0))), 1e-6)
+
+        best = [] #max-heap of (-distance, position) holding the n closest so far
+
+        def consider(positions):
+            for position in positions:
+                distance = haversine_m(lat, lon, self.latitudes[position], self.longitudes[position])
+                if len(best) < n:
+                    heapq.heappush(best, (-distance, position))
+                elif distance < -best[0][0]:
+                    heapq.heapreplace(best, (-distance, position))
+
+        for ring in range(min_ring, max_ring + 1):
+            #Anything in this ring is at least (ring - 1) whole cells away
+            if len(best) == n and (ring - 1) * cell_m > -best[0][0]:
+                break
+
+            #Once a ring is wider than the number of occupied cells, finish with one pass over them
+            if 8 * ring > len(self.cells):
+                for (row, col), positions in self.cells.items():
+                    if max(abs(row - centre_row), abs(col - centre_col)) >= ring:
+                        consider(positions)
+                break
+
+            for row in range(max(centre_row - ring, row_lo), min(centre_row + ring, row_hi) + 1):
+                #Inner rows only need the two edge cells of the ring
+                if abs(row - centre_row) == ring:
+                    cols = range(max(centre_col - ring, col_lo), min(centre_col + ring, col_hi) + 1)
+                else:
+                    cols = (centre_col - ring, centre_col + ring)
+                for col in cols:
+                    consider(self.cells.get((row, col), ()))
+
+        return [(self.bin_ids[position], -neg_distance) for neg_distance, position in sorted(best, reverse=True)]
+
+
+###################################################################
+# Shared index for the current bin metadata
+###################################################################
+_index_lock = threading.Lock()
+_cached_index = None
+_cached_version = None
+
+#Return the spatial index for bin_data, only rebuilding it when its version changes
+#version: shared dataset version bin_data was read at (live_updates.current_version),
+#None when it isn't known, which always rebuilds
+def get_spatial_index(bin_data, version):
+    global _cached_index, _cached_version
+
+    with _index_lock:
+        if _cached_index is None or version is None or version != _cached_version:
+            _cached_index = BinSpatialIndex(
+                bin_data['bin_id'].tolist(),
+                bin_data['latitude'].tolist(),
+                bin_data['longitude'].tolist(),
+            )
+            _cached_version = version
+        return _cached_index